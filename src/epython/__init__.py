@@ -10,4 +10,5 @@ Date:
     3/20/21
 """
 
-from epython import errors, poke, environment, handlers, logger, network, ssh
+from epython import (errors, poke, environment, handlers, logger, network, output, channels, sftp,
+                     tarball, timing, ssh, aiossh, shell)
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains the asyncio flavor of the ssh util, so a single event loop can drive a whole
+    fleet of hosts.
+
+    Connections are borrowed from the same pool as the blocking ssh helpers. Command output is read
+    by watching the channel from the event loop, so an in-flight command doesn't tie up a thread.
+
+    NOTE: paramiko has no non-blocking handshake, so connecting and opening channels are handed to a
+          small, bounded thread pool. Once a pooled connection is warm those calls return right away.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import asyncio
+import functools
+import shlex
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from scp import SCPClient
+
+from epython import channels
+from epython import errors
+from epython import handlers
+from epython import ssh
+from epython.output import CommandResult
+from epython.environment import (_LOG, EPYTHON_SSH_RETRIES, EPYTHON_SSH_RETRY_INTERVAL,
+                                 EPYTHON_SSH_MAX_WORKERS)
+
+# The threads that run the blocking parts of paramiko (connects, channel opens and scp transfers)
+_EXECUTOR = ThreadPoolExecutor(max_workers=EPYTHON_SSH_MAX_WORKERS, thread_name_prefix="epython-aiossh")
+
+# How often a channel is polled on event loops that can't watch it (e.g. the Windows proactor loop)
+CHANNEL_POLL_INTERVAL = .05
+
+
+async def _run_blocking(func, *args, **kwargs):
+    """ Run a blocking call on the aiossh thread pool without blocking the event loop.
+
+    Args:
+        func (func): The blocking callable
+
+    Returns:
+        (object): Whatever the callable returns
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+async def _with_timeout(coro, timeout, msg):
+    """ Await a coroutine, converting a timeout into an SSHTimeoutError.
+
+    Args:
+        coro (coroutine): The coroutine to await
+        timeout (float): The number of seconds to wait (None waits forever)
+        msg (str): The message for the SSHTimeoutError
+
+    Returns:
+        (object): Whatever the coroutine returns
+    """
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError as exp:
+        raise errors.ssh.SSHTimeoutError(msg) from exp
+
+
+def _close_later(client):
+    """ Close an ssh client on the aiossh thread pool, without waiting for it.
+
+    Args:
+        client (paramiko.SSHClient): The client to close
+    """
+    asyncio.get_running_loop().run_in_executor(_EXECUTOR, ssh._close_quietly, client)  # pylint: disable=W0212
+
+
+async def _checkout(pool, key):
+    """ Reserve a pooled connection slot, waiting for one on the event loop rather than in a thread.
+
+    A thread blocked on the pool would hold on to an aiossh worker, which the calls handing
+    connections back might be queued behind.
+
+    Args:
+        pool (SSHConnectionPool): The pool to borrow the connection from
+        key (tuple): The key the connection is pooled under
+
+    Returns:
+        (paramiko.SSHClient): An idle client to reuse, or None if the caller should connect
+    """
+    loop = asyncio.get_running_loop()
+    freed = asyncio.Event()
+    deadline = None if pool.acquire_timeout is None else loop.time() + pool.acquire_timeout
+
+    def listener():
+        loop.call_soon_threadsafe(freed.set)
+
+    pool.add_listener(listener)
+    try:
+        while True:
+            # Cleared ahead of the attempt, so a slot freed in between isn't missed
+            freed.clear()
+            reserved, client = pool.try_checkout(key, close=_close_later)
+            if reserved:
+                return client
+
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                raise errors.ssh.SSHTimeoutError(f"Timed out waiting for a pooled ssh connection to "
+                                                 f"'{key[0]}' on port '{key[1]}'")
+            try:
+                await asyncio.wait_for(freed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        pool.remove_listener(listener)
+
+
+class AsyncSSHConnect:
+    """ The async context manager counterpart of ssh.SSHConnect.
+
+    Waiting for a pooled connection happens on the event loop, and handing it back never waits on a
+    thread, so any number of concurrent callers can share a pool with a small per host limit.
+    """
+
+    def __init__(self, host, username, password, port=22, pkey=None, pool=None, jump=None):
+        """ Constructor for the AsyncSSHConnect
+
+        Args:
+            host (str): The host that is being logged into
+            username (str): The username to use to log into the host
+            password (str): The password for the provided username
+            port (int): The port to connect ssh over
+            pkey (str): The path to the ssh key to use
+            pool (SSHConnectionPool): Borrow the connection from this pool instead of opening a new one
+            jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+        """
+        self._conn = ssh.SSHConnect(host, username, password, port=port, pkey=pkey, pool=pool, jump=jump)
+
+    async def __aenter__(self):
+        conn = self._conn
+        if conn.pool is None:
+            connect = conn.connect
+        else:
+            client = await _checkout(conn.pool, conn.pool_key)
+            connect = functools.partial(conn.pool.ready, conn.pool_key, client, conn.connect)
+
+        future = asyncio.get_running_loop().run_in_executor(_EXECUTOR, connect)
+        try:
+            conn.client = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The connect keeps going in its thread, so give the connection back once it lands
+            future.add_done_callback(self._release_abandoned)
+            raise
+        return conn.client
+
+    def _release_abandoned(self, future):
+        """ Hand back a connection whose caller was cancelled while it was being established. """
+        if not future.cancelled() and future.exception() is None:
+            self._conn.client = future.result()
+            self._conn.release(close=_close_later)
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        # Straight from the loop, so there's nothing for a cancel to interrupt and no thread to wait on
+        self._conn.release(exc_type, close=_close_later)
+
+
+async def _wait_for_channel(channel, timeout=1.0):
+    """ Wait from the event loop until a channel has output to read, or the timeout expires.
+
+    Loops that can't watch file descriptors (the proactor loop on Windows has no add_reader) get a
+    short sleep instead, so the channel is polled.
+
+    Args:
+        channel (paramiko.Channel): The channel to wait on
+        timeout (float): The maximum number of seconds to wait
+    """
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fileno = channel.fileno()
+
+    try:
+        loop.add_reader(fileno, lambda: ready.done() or ready.set_result(None))
+    except NotImplementedError:
+        await asyncio.sleep(min(timeout, CHANNEL_POLL_INTERVAL))
+        return
+    try:
+        await asyncio.wait_for(ready, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(fileno)
+
+
+async def _aiter_channel(channel):
+    """ The async counterpart of channels.iter_channel.
+
+    Args:
+        channel (paramiko.Channel): A channel a command has been executed on
+
+    Yields:
+        (tuple): (STREAM_STDOUT or STREAM_STDERR, bytes) for every chunk read
+    """
+    while True:
+        got_data = False
+        if channel.recv_ready():
+            got_data = True
+            yield channels.STREAM_STDOUT, channel.recv(channels.CHANNEL_READ_SIZE)
+        if channel.recv_stderr_ready():
+            got_data = True
+            yield channels.STREAM_STDERR, channel.recv_stderr(channels.CHANNEL_READ_SIZE)
+
+        if not got_data:
+            if channels.channel_drained(channel):
+                return
+            await _wait_for_channel(channel)
+
+
+async def _run_on_channel(transport, cmd):
+    """ The async counterpart of channels.run_on_channel, leaving the output undecoded.
+
+    Args:
+        transport (paramiko.Transport): The transport to open the channel on
+        cmd (str): The command to execute
+
+    Returns:
+        (tuple): RC, Standard Out (bytes), Standard Error (bytes)
+    """
+    output = {channels.STREAM_STDOUT: bytearray(), channels.STREAM_STDERR: bytearray()}
+
+    channel = await _run_blocking(transport.open_session)
+    try:
+        await _run_blocking(channel.exec_command, cmd)
+        async for stream, data in _aiter_channel(channel):
+            output[stream] += data
+        # The EOF may land before the exit status, so this can still block for a moment
+        ret_code = await _run_blocking(channel.recv_exit_status)
+    finally:
+        # Closing the channel also stops the remote command when the caller was cancelled
+        channel.close()
+
+    return ret_code, bytes(output[channels.STREAM_STDOUT]), bytes(output[channels.STREAM_STDERR])
+
+
+# pylint: disable=R0913
+@handlers.async_retry_handler(ssh.SSH_CONN_EXCEPTIONS,
+                              retries=EPYTHON_SSH_RETRIES,
+                              interval=EPYTHON_SSH_RETRY_INTERVAL)
+async def _execute_command(host, username, password, cmd, port, pkey, banner, pooled, jump, encoding,
+                           decode_errors):
+    """ Execute a command on a host over ssh, retrying on connection errors. """
+    async with AsyncSSHConnect(host, username, password, port=port, pkey=pkey,
+                               pool=ssh.SSH_POOL if pooled else None, jump=jump) as client:
+        ret_code, stdout, stderr = await _run_on_channel(client.get_transport(), cmd)
+
+    ssh._log_results(host, cmd, ret_code, stdout, stderr, banner=banner)  # pylint: disable=W0212
+
+    return CommandResult(ret_code, stdout, stderr, host=host, cmd=cmd, encoding=encoding,
+                         decode_errors=decode_errors)
+
+
+async def execute_command(host, username, password, cmd, port=22, pkey=None, banner=False, pooled=True,
+                          timeout=None, jump=None, encoding="utf-8", decode_errors="strict"):
+    """Execute a given command on a host over ssh.
+
+    Args:
+        host (str): The host that is being logged into
+        username (str): The username to use to log into the host
+        password (str): The password for the provided username
+        cmd (str): The command to execute on the host
+        port (int): The port to connect ssh over
+        pkey (str): The path to the ssh key to use
+        banner (bool): Whether or not to display the results in an info statement (as opposed to debug)
+        pooled (bool): Whether or not to reuse a connection from the shared ssh connection pool
+        timeout (float): The number of seconds to allow for the whole call, including retries
+        jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+        encoding (str): The encoding the output is decoded with (when it's first used)
+        decode_errors (str): The codecs error policy the output is decoded with (e.g. "replace")
+
+    Returns:
+        (CommandResult): The RC and output, which also unpacks as RC, Standard Out, Standard Error
+    """
+    coro = _execute_command(host, username, password, cmd, port, pkey, banner, pooled, jump, encoding,
+                            decode_errors)
+    return await _with_timeout(coro, timeout, f"Timed out executing '{cmd}' on '{host}'")
+# pylint: enable=R0913
+
+
+async def remote_file_exists(host, username, password, remote_file_path, port=22, pkey=None, pooled=True,
+                             timeout=None, jump=None):
+    """ Check to see if a remote file exists
+
+    Args:
+        host (str): The ip or FQDN of the host to check file existence on
+        username (str): The username for the host
+        password (str): The password for the username
+        remote_file_path (str): The remote file to check exists
+        port (int): The port to connect ssh over
+        pkey (str): The path to the ssh key to use
+        pooled (bool): Whether or not to reuse a connection from the shared ssh connection pool
+        timeout (float): The number of seconds to allow for the whole call
+        jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+
+    Returns:
+        (bool): Whether or not the file exists
+    """
+    cmd = f"[[ -e {shlex.quote(remote_file_path)} ]]"
+    ret_code, _, _ = await execute_command(host, username, password, cmd, port=port, pkey=pkey,
+                                           pooled=pooled, timeout=timeout, jump=jump)
+    return ret_code == 0
+
+
+async def _transfer(host, username, password, port, pkey, pooled, jump, transfer):
+    """ Run an scp transfer on the aiossh thread pool, over a connection borrowed for it.
+
+    When the caller is cancelled (or times out) the transfer itself is stopped at its next chunk, and
+    its channel is closed in case it's stuck waiting on the remote end. The connection is only handed
+    back once the transfer thread is done with it.
+
+    Args:
+        transfer (func): Runs the transfer, given the SCPClient
+
+    Returns:
+        (object): Whatever the transfer returns
+    """
+    cancelled = threading.Event()
+    scp_clients = []
+
+    def progress(_filename, _size, _sent):
+        # scp reports progress between chunks, which is where the transfer finds out it was cancelled
+        if cancelled.is_set():
+            raise errors.ssh.SSHError(f"The transfer with '{host}' was cancelled")
+
+    def run(client):
+        with SCPClient(client.get_transport(), progress=progress) as scp:
+            scp_clients.append(scp)
+            return transfer(scp)
+
+    async with AsyncSSHConnect(host, username, password, port=port, pkey=pkey,
+                               pool=ssh.SSH_POOL if pooled else None, jump=jump) as client:
+        future = asyncio.get_running_loop().run_in_executor(_EXECUTOR, run, client)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancelled.set()
+            for scp in scp_clients:
+                if scp.channel is not None:
+                    scp.channel.close()
+            await asyncio.wait([future])
+            if not future.cancelled():
+                # The transfer failing is expected here, so only mark its error as seen
+                future.exception()
+            raise
+
+
+async def get(host, username, password, remote_file, local_path, port=22, pkey=None, pooled=True,
+              timeout=None, jump=None):
+    """ SCP a remote file to a local file
+
+    NOTE: The transfer runs on the aiossh thread pool. A timeout or cancellation stops it as well.
+
+    Args:
+        host (str): The ip or FQDN of the host to retrieve file from
+        username (str): The username for the host
+        password (str): The password for the username
+        remote_file (str): The remote file to retrieve
+        local_path (str): The local dir to store the remote file
+        port (int): The port to scp over
+        pkey (str): The path to the ssh key to use
+        pooled (bool): Whether or not to reuse a connection from the shared ssh connection pool
+        timeout (float): The number of seconds to wait for the transfer
+        jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+    """
+    coro = _transfer(host, username, password, port, pkey, pooled, jump,
+                     lambda scp: scp.get(remote_file, local_path=local_path))
+    return await _with_timeout(coro, timeout, f"Timed out retrieving '{remote_file}' from '{host}'")
+
+
+async def put(host, username, password, local_file, remote_path=b'.', port=22, pkey=None, pooled=True,
+              timeout=None, jump=None):
+    """ SCP a local file to a remote file
+
+    NOTE: The transfer runs on the aiossh thread pool. A timeout or cancellation stops it as well.
+
+    Args:
+        host (str): The ip or FQDN of the host to retrieve file from
+        username (str): The username for the host
+        password (str): The password for the username
+        local_file (str): The remote file's local filename
+        remote_path (str): The remote path to put the file into (default: .)
+        port (int): The port to scp over
+        pkey (str): The path to the ssh key to use
+        pooled (bool): Whether or not to reuse a connection from the shared ssh connection pool
+        timeout (float): The number of seconds to wait for the transfer
+        jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+    """
+    coro = _transfer(host, username, password, port, pkey, pooled, jump,
+                     lambda scp: scp.put(local_file, remote_path))
+    return await _with_timeout(coro, timeout, f"Timed out putting '{local_file}' on '{host}'")
+
+
+async def ssh_running(host, port=22, timeout=5):
+    """ Check if SSH is running
+
+    Args:
+        host (str): The FQDN or IP of the host to connect to
+        port (int): The port to connect on
+        timeout (float): The number of seconds to wait for the connection
+    """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+
+    writer.close()
+    return True
+
+
+async def wait_for_ssh(host, port=22, timeout=300, interval=1):
+    """ Wait for the ssh service to respond.
+
+    Args:
+        host (str): The FQDN or IP of the host to connect to
+        port (int): The port to connect on
+        timeout (int): The time to wait for SSH to become available in seconds (Default: 300)
+        interval (int): The time to sleep between checks in seconds (Default: 1)
+    """
+    _LOG.info("Waiting for SSH to become available on %s at port: %s", host, port)
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    while not await ssh_running(host, port=port):
+        if loop.time() - start_time > timeout:
+            raise errors.ssh.SSHTimeoutError(f"Timed out waiting for ssh to '{host}' on port '{port}'")
+        await asyncio.sleep(interval)
+    _LOG.info("SSH is available on %s at port: %s", host, port)
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains the helpers that run commands on the channels of an already authenticated
+    ssh transport and read their output. Connection handling (pooling, retries, jump hosts) stays in
+    the ssh module.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import codecs
+import select
+
+import paramiko
+
+from epython import errors
+from epython import handlers
+from epython import timing
+from epython.environment import EPYTHON_SSH_RETRIES, EPYTHON_SSH_RETRY_INTERVAL
+from epython.output import CapturedOutput
+
+# The tags used to label the output of a streamed command
+STREAM_STDOUT = "stdout"
+STREAM_STDERR = "stderr"
+STREAM_RC = "rc"
+
+# The number of bytes read off of a channel at a time
+CHANNEL_READ_SIZE = 32768
+
+# The number of seconds to wait for the channel window to open back up while writing standard in
+STDIN_POLL_INTERVAL = .01
+
+
+def wait_for_channel(channel, timeout=1.0):
+    """ Block until a channel has output to read, or the timeout expires.
+
+    Args:
+        channel (paramiko.Channel): The channel to wait on
+        timeout (float): The maximum number of seconds to wait
+    """
+    select.select([channel], [], [], timeout)
+
+
+def channel_drained(channel):
+    """ Check whether all of the output of a channel has been read.
+
+    sshd may send the exit status ahead of the last of the output, so only the EOF (or a close) means
+    everything has been buffered. The streams are checked after it, since they may have filled up just
+    before it arrived.
+
+    Args:
+        channel (paramiko.Channel): A channel a command has been executed on
+
+    Returns:
+        (bool): Whether the output is all in and both streams are empty
+    """
+    return (channel.eof_received or channel.closed) and not (channel.recv_ready()
+                                                             or channel.recv_stderr_ready())
+
+
+def _feed_channel(channel, stdin):
+    """ Write as much of standard in as the channel window takes right now, without blocking.
+
+    Args:
+        channel (paramiko.Channel): A channel a command has been executed on
+        stdin (memoryview): What's left to send
+
+    Returns:
+        (memoryview): What's still left to send, or None once it's all sent and standard in is closed
+    """
+    if stdin:
+        try:
+            stdin = stdin[channel.send(stdin[:CHANNEL_READ_SIZE]):]
+        except OSError:
+            # The command went away without reading all of it, its RC and output tell why
+            stdin = None
+    if not stdin:
+        channel.shutdown_write()
+        return None
+    return stdin
+
+
+def iter_channel(channel, stdin=None):
+    """ Read both output streams of a channel as the data arrives, until the remote end sends EOF.
+
+    Reading stdout and stderr together keeps either stream from filling the channel window and
+    stalling the remote command. Standard in is written on the same loop, a window at a time, so a
+    command that answers while it's still reading (e.g. xargs) can't leave both ends waiting on each
+    other.
+
+    Args:
+        channel (paramiko.Channel): A channel a command has been executed on
+        stdin (bytes): Data to feed to the command on standard in, which is closed once it's all sent
+
+    Yields:
+        (tuple): (STREAM_STDOUT or STREAM_STDERR, bytes) for every chunk read
+    """
+    stdin = None if stdin is None else memoryview(stdin)
+    while True:
+        got_data = False
+        if stdin is not None and (channel.closed or channel.send_ready()):
+            got_data = True
+            stdin = _feed_channel(channel, stdin)
+        if channel.recv_ready():
+            got_data = True
+            yield STREAM_STDOUT, channel.recv(CHANNEL_READ_SIZE)
+        if channel.recv_stderr_ready():
+            got_data = True
+            yield STREAM_STDERR, channel.recv_stderr(CHANNEL_READ_SIZE)
+
+        if not got_data:
+            if channel_drained(channel):
+                return
+            # The window opening back up for standard in doesn't wake the select, so poll while sending
+            wait_for_channel(channel, timeout=1.0 if stdin is None else STDIN_POLL_INTERVAL)
+
+
+def iter_channel_lines(channel, encoding="utf-8", decode_errors="strict"):
+    """ Decode the output of a channel into lines as it arrives.
+
+    Args:
+        channel (paramiko.Channel): A channel a command has been executed on
+        encoding (str): The encoding to decode the output with
+        decode_errors (str): The codecs error policy to decode with
+
+    Yields:
+        (tuple): (STREAM_STDOUT or STREAM_STDERR, line) for every line, then (STREAM_RC, return code)
+    """
+    decoders = {stream: codecs.getincrementaldecoder(encoding)(decode_errors)
+                for stream in (STREAM_STDOUT, STREAM_STDERR)}
+    partial = {STREAM_STDOUT: "", STREAM_STDERR: ""}
+
+    try:
+        for stream, data in iter_channel(channel):
+            lines = (partial[stream] + decoders[stream].decode(data)).split("\n")
+            partial[stream] = lines.pop()
+            for line in lines:
+                yield stream, line.rstrip("\r")
+
+        for stream, decoder in decoders.items():
+            tail = partial[stream] + decoder.decode(b"", final=True)
+            if tail:
+                yield stream, tail.rstrip("\r")
+    except UnicodeDecodeError as exp:
+        raise errors.ssh.SSHStreamDecodeError(f"Failed decoding {stream} stream!") from exp
+
+    yield STREAM_RC, channel.recv_exit_status()
+
+
+@handlers.basic_retry_handler((paramiko.ssh_exception.ChannelException,),
+                              retries=EPYTHON_SSH_RETRIES,
+                              interval=EPYTHON_SSH_RETRY_INTERVAL)
+def open_channel(transport):
+    """ Open a session channel on a transport, retrying when the server turns it down (e.g. when the
+    connection already has MaxSessions channels open). Nothing has run on a channel that failed to
+    open, so this is always safe to retry.
+
+    Args:
+        transport (paramiko.Transport): The transport to open the channel on
+
+    Returns:
+        (paramiko.Channel): The new channel
+    """
+    return transport.open_session()
+
+
+def collect_channel(transport, cmd, data=None):
+    """ Run a command on its own channel of an already authenticated transport and collect its output.
+
+    Args:
+        transport (paramiko.Transport): The transport to open the channel on
+        cmd (str): The command to execute
+        data (bytes): Data to feed to the command on standard in (it's left open when None)
+
+    Returns:
+        (tuple): RC, raw Standard Out bytes, raw Standard Error bytes
+    """
+    output = {STREAM_STDOUT: bytearray(), STREAM_STDERR: bytearray()}
+
+    channel = open_channel(transport)
+    try:
+        channel.exec_command(cmd)
+        for stream, chunk in iter_channel(channel, stdin=data):
+            output[stream] += chunk
+        ret_code = channel.recv_exit_status()
+    finally:
+        channel.close()
+
+    return ret_code, bytes(output[STREAM_STDOUT]), bytes(output[STREAM_STDERR])
+
+
+def run_on_channel(transport, cmd):
+    """ Run a command on its own channel of an already authenticated transport.
+
+    Args:
+        transport (paramiko.Transport): The transport to open the channel on
+        cmd (str): The command to execute
+
+    Returns:
+        (tuple): RC, Standard Out, Standard Error
+    """
+    ret_code, stdout, stderr = collect_channel(transport, cmd)
+    try:
+        return ret_code, stdout.decode().strip(), stderr.decode().strip()
+    except UnicodeDecodeError as exp:
+        raise errors.ssh.SSHStreamDecodeError(f"Failed decoding the output of '{cmd}'!") from exp
+
+
+def capture_command(client, cmd, capture_limit, timings=timing.NO_TIMINGS):
+    """ Run a command, capturing its output into memory-capped buffers that spill to disk.
+
+    NOTE: The output is drained while the command runs, so it all lands in the command phase.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        cmd (str): The command to execute
+        capture_limit (int): The number of bytes per stream to keep in memory
+        timings (SSHTimings): The breakdown to record the channel_open and command phases into
+
+    Returns:
+        (tuple): RC, Standard Out (CapturedOutput), Standard Error (CapturedOutput)
+    """
+    output = {STREAM_STDOUT: CapturedOutput(capture_limit), STREAM_STDERR: CapturedOutput(capture_limit)}
+
+    with timings.phase("channel_open"):
+        channel = client.get_transport().open_session()
+    try:
+        with timings.phase("channel_open"):
+            channel.exec_command(cmd)
+        with timings.phase("command"):
+            for stream, data in iter_channel(channel):
+                output[stream].write(data)
+            ret_code = channel.recv_exit_status()
+    except BaseException:
+        for captured in output.values():
+            captured.close()
+        raise
+    finally:
+        channel.close()
+
+    for captured in output.values():
+        captured.seek(0)
+    return ret_code, output[STREAM_STDOUT], output[STREAM_STDERR]
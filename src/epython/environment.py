@@ -33,11 +33,25 @@ EPYTHON_SSH_RETRY_INTERVAL = os.getenv("EPYTHON_SSH_RETRY_INTERVAL") or 5
 EPYTHON_REQUEST_ID = os.getenv("EPYTHON_REQUEST_ID", "epython-poke")
 EPYTHON_REQUEST_INTERVAL = os.getenv("EPYTHON_REQUEST_INTERVAL") or 5
 EPYTHON_REQUEST_RETRIES = os.getenv("EPYTHON_REQUEST_RETRIES") or 5
+EPYTHON_REQUEST_POOL_CONNECTIONS = int(os.getenv("EPYTHON_REQUEST_POOL_CONNECTIONS") or 10)
+EPYTHON_REQUEST_POOL_MAXSIZE = int(os.getenv("EPYTHON_REQUEST_POOL_MAXSIZE") or 10)
+EPYTHON_REQUEST_MAX_RETRY_AFTER = float(os.getenv("EPYTHON_REQUEST_MAX_RETRY_AFTER") or 120)
+EPYTHON_REQUEST_BREAKER_THRESHOLD = int(os.getenv("EPYTHON_REQUEST_BREAKER_THRESHOLD") or 0)
+EPYTHON_REQUEST_BREAKER_COOLDOWN = float(os.getenv("EPYTHON_REQUEST_BREAKER_COOLDOWN") or 30)
+EPYTHON_REQUEST_CACHE_SIZE = int(os.getenv("EPYTHON_REQUEST_CACHE_SIZE") or 256)
+EPYTHON_REQUEST_CACHE_TTL = float(os.getenv("EPYTHON_REQUEST_CACHE_TTL") or 60)
 
 #########################################################################################################
 # SSH Components                                                                                        #
 #########################################################################################################
 EPYTHON_SSH_KEY = os.getenv("EPYTHON_SSH_KEY")
+EPYTHON_SSH_POOL_MAX_PER_HOST = int(os.getenv("EPYTHON_SSH_POOL_MAX_PER_HOST") or 4)
+EPYTHON_SSH_POOL_IDLE_TIMEOUT = float(os.getenv("EPYTHON_SSH_POOL_IDLE_TIMEOUT") or 300)
+EPYTHON_SSH_KEEPALIVE = int(os.getenv("EPYTHON_SSH_KEEPALIVE") or 30)
+EPYTHON_SSH_MAX_WORKERS = int(os.getenv("EPYTHON_SSH_MAX_WORKERS") or 32)
+EPYTHON_SSH_MAX_CHANNELS = int(os.getenv("EPYTHON_SSH_MAX_CHANNELS") or 8)
+EPYTHON_SSH_LOG_PREVIEW = int(os.getenv("EPYTHON_SSH_LOG_PREVIEW") or 4096)
+EPYTHON_SSH_TIMING_LOG = int(os.getenv("EPYTHON_SSH_TIMING_LOG") or 0)
 
 #########################################################################################################
 # Setup logging for the library                                                                         #
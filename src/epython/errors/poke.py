@@ -19,3 +19,26 @@ class PokeException(EPythonException):
 
 class JsonProcessorException(PokeException):
     """ Raise when an exception occurs during JSON Processing. """
+
+    def __init__(self, msg, position=None, line=None, column=None):
+        super().__init__(msg)
+        self.position = position
+        self.line = line
+        self.column = column
+
+
+class ResponseValidationException(PokeException):
+    """ Raise when a response fails its validation, with every failure that was found. """
+
+    def __init__(self, msg, failures=None):
+        super().__init__(msg)
+        self.failures = failures or []
+
+
+class CircuitOpenException(PokeException):
+    """ Raise when a request is failed fast, because the circuit of its host is open. """
+
+    def __init__(self, msg, host=None, retry_in=None):
+        super().__init__(msg)
+        self.host = host
+        self.retry_in = retry_in
@@ -27,3 +27,15 @@ class SSHStreamDecodeError(SSHError):
 
 class SSHTimeoutError(SSHError):
     """ Failure when an SSH Connection times out. """
+
+
+class SSHSessionClosed(SSHError):
+    """ Failure when a shell session is used after it (or its remote shell) has gone away. """
+
+
+class SSHCommandError(SSHError):
+    """ Failure when a remote command returns a nonzero return code. """
+
+    def __init__(self, msg, result=None):
+        super().__init__(msg)
+        self.result = result
@@ -10,6 +10,8 @@ Date:
     12/7/20
 """
 
+import asyncio
+import functools
 import time
 from abc import ABC, abstractmethod
 
@@ -112,3 +114,61 @@ def basic_retry_handler(exceptions, retries=3, interval=30, callback=None):
         return wrapper
 
     return inner
+
+
+def async_retry_handler(exceptions, retries=3, interval=30, callback=None):
+    """The coroutine flavor of the basic_retry_handler. Waits between retries never block the event loop.
+
+    Args:
+        exceptions (tuple): The exceptions to retry on in tuple form
+        retries (int): The number of retries to issue
+        interval (int): The interval to retry on
+        callback (RetryCallBack): A defined callback
+
+    Returns:
+        (func): A decorated coroutine function that retries using the provided interval and the
+                requested exceptions
+    """
+
+    def inner(func):
+        """Encapsulates the coroutine function for decoration
+
+        Args:
+            func (func): The coroutine function being decorated
+
+        Returns:
+            (func): The decorated coroutine function
+        """
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            """ Wraps the executed coroutine to provide the retry logic."""
+            f_retries = retries
+
+            while True:
+                try:
+                    return_val = await func(*args, **kwargs)
+
+                    if callback and isinstance(callback, CallbackHandler):
+                        callback.run_after_function(return_val)
+
+                    return return_val
+
+                except exceptions as exp:
+                    _LOG.error("Function '%s' failed to execute due to:\n%s", func, exp)
+
+                    if callback and isinstance(callback, CallbackHandler):
+                        callback.run_after_exception(exp)
+
+                    # When no more retries are left, raise the last hit exception
+                    f_retries -= 1
+                    if f_retries <= 0:
+                        raise
+
+                _LOG.debug("Waiting for %s seconds and then retrying up to %s more "
+                           "times...", interval, f_retries)
+                await asyncio.sleep(interval)
+
+        return wrapper
+
+    return inner
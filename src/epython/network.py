@@ -9,6 +9,8 @@ Author:
 Date:
     12/7/20
 """
+import errno
+import selectors
 import socket
 import time
 
@@ -19,6 +21,9 @@ from epython.environment import _LOG
 
 VALID_PORT_STATES = ["UP", "DOWN"]
 
+# Give up on a banner check when this much has been read without finding the banner
+MAX_BANNER_BYTES = 8192
+
 
 def wait_for_http_status_code(url, status_code=200, interval=1, timeout=90):
     """ Wait for a specific HTTP Status code from a given url
@@ -64,16 +69,18 @@ def is_port_listening(host, port, wait_interval=2):
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     try:
-        socket.setdefaulttimeout(wait_interval)
+        # Only this socket gets the timeout, the process wide default is left alone
+        sock.settimeout(wait_interval)
         result = sock.connect_ex((host, port))
         if result == 0:
             return True
         return False
     # pylint: disable=W0703
     except Exception:
-        sock.close()
         return False
     # pylint: enable=W0703
+    finally:
+        sock.close()
 
 
 def wait_for_port_down(host, port, max_wait=300, check_interval=10):
@@ -142,3 +149,194 @@ def wait_for_port_up(host, port, max_wait=300, check_interval=10):
         check_interval (int): The interval to wait before determining a port is down
     """
     wait_for_port_state(host, port, "UP", max_wait=max_wait, check_interval=check_interval)
+
+
+def banner_matches(received, banner):
+    """ Check whether data read from a service contains a line starting with the expected banner.
+
+    Args:
+        received (bytes): The data read from the service so far
+        banner (bytes|tuple): The banner prefix (or prefixes) to look for at the start of a line
+
+    Returns:
+        (bool): Whether or not the banner was found
+    """
+    return any(line.startswith(banner) for line in received.split(b"\n"))
+
+
+class _PortProbe:
+    """ One host/port being watched by iter_ports_listening, along with its in-flight connection. """
+
+    def __init__(self, target, selector, interval):
+        """ Constructor for the _PortProbe
+
+        Args:
+            target (tuple): The (host, port) to watch
+            selector (selectors.BaseSelector): The selector the connection is registered with
+            interval (float): The time to wait between connection attempts in seconds
+        """
+        self.target = target
+        self.selector = selector
+        self.interval = interval
+        self.sock = None
+        self.connected = False
+        self.received = b""
+        self.wake_at = 0
+
+    def tick(self, now, connect_timeout):
+        """ Start a connection attempt when one is due, or give up on one that is taking too long. """
+        if self.wake_at > now:
+            return
+        if self.sock is None:
+            self.start(now, connect_timeout)
+        else:
+            self.retry(now)
+
+    def start(self, now, connect_timeout):
+        """ Start a non-blocking connection attempt. """
+        try:
+            addr_info = socket.getaddrinfo(*self.target, type=socket.SOCK_STREAM)
+            family, sock_type, proto, _, address = addr_info[0]
+            self.sock = socket.socket(family, sock_type, proto)
+            self.sock.setblocking(False)
+            result = self.sock.connect_ex(address)
+        except OSError:
+            self.retry(now)
+            return
+
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self.retry(now)
+            return
+        self.selector.register(self.sock, selectors.EVENT_WRITE, self)
+        self.wake_at = now + connect_timeout
+
+    def advance(self, banner):
+        """ Handle the connection becoming writable or readable.
+
+        Args:
+            banner (bytes|tuple): The banner prefix (or prefixes) to wait for (None to skip the check)
+
+        Returns:
+            (bool): Whether or not the target is ready
+        """
+        now = time.monotonic()
+        if not self.connected:
+            if self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                self.retry(now)
+                return False
+            if banner is None:
+                return True
+            self.connected = True
+            self.selector.modify(self.sock, selectors.EVENT_READ, self)
+            return False
+
+        try:
+            data = self.sock.recv(256)
+        except BlockingIOError:
+            return False
+        except OSError:
+            data = b""
+
+        self.received += data
+        if banner_matches(self.received, banner):
+            return True
+
+        # The service hung up or is talking something else, so try again later
+        if not data or len(self.received) > MAX_BANNER_BYTES:
+            self.retry(now)
+        return False
+
+    def retry(self, now):
+        """ Drop the current connection attempt and schedule the next one. """
+        self.close()
+        self.wake_at = now + self.interval
+
+    def close(self):
+        """ Close the current connection attempt, if any. """
+        if self.sock is not None:
+            if self.sock.fileno() in self.selector.get_map():
+                self.selector.unregister(self.sock)
+            self.sock.close()
+        self.sock = None
+        self.connected = False
+        self.received = b""
+
+
+def iter_ports_listening(targets, timeout=300, interval=1, connect_timeout=5, banner=None):
+    """ Watch many host/port pairs at once, yielding each one as soon as it accepts connections.
+
+    All connection attempts are non-blocking and multiplexed with selectors on the calling thread, so
+    a fleet of hosts takes as long as the slowest host instead of the sum of all of them.
+
+    NOTE: Host names are resolved with a regular (blocking) lookup before each connection attempt.
+
+    Args:
+        targets (list): The (host, port) pairs to watch
+        timeout (float): The time to wait for all of the targets in seconds (Default: 300)
+        interval (float): The time to wait between attempts on the same target in seconds (Default: 1)
+        connect_timeout (float): The time to allow each connection attempt in seconds (Default: 5)
+        banner (bytes|tuple): Only count a target as ready once it sends a line starting with
+                              this prefix (or one of these prefixes)
+
+    Yields:
+        (tuple): The (host, port) of each target as it becomes ready. Targets that never become ready
+                 before the timeout are not yielded.
+    """
+    selector = selectors.DefaultSelector()
+    pending = {}
+    for target in targets:
+        pending[tuple(target)] = _PortProbe(tuple(target), selector, interval)
+
+    deadline = time.monotonic() + timeout
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+
+            for probe in pending.values():
+                probe.tick(now, connect_timeout)
+
+            wait = max(min([probe.wake_at for probe in pending.values()] + [deadline]) - now, 0)
+            if selector.get_map():
+                events = selector.select(wait)
+            else:
+                time.sleep(wait)
+                events = []
+
+            for key, _ in events:
+                probe = key.data
+                if probe.target in pending and probe.advance(banner):
+                    probe.close()
+                    del pending[probe.target]
+                    _LOG.debug("Host '%s' is ready on port '%s'", *probe.target)
+                    yield probe.target
+    finally:
+        for probe in pending.values():
+            probe.close()
+        selector.close()
+
+
+def wait_for_ports_listening(targets, timeout=300, interval=1, connect_timeout=5, banner=None,
+                             callback=None):
+    """ Wait for many host/port pairs at once to accept connections.
+
+    Args:
+        targets (list): The (host, port) pairs to wait for
+        timeout (float): The time to wait for all of the targets in seconds (Default: 300)
+        interval (float): The time to wait between attempts on the same target in seconds (Default: 1)
+        connect_timeout (float): The time to allow each connection attempt in seconds (Default: 5)
+        banner (bytes|tuple): Only count a target as ready once it sends a line starting with this
+                              prefix (or one of these prefixes)
+        callback (func): Called with the (host, port) of each target as it becomes ready
+
+    Returns:
+        (list): The (host, port) pairs that were still not ready at the timeout
+    """
+    stragglers = [tuple(target) for target in targets]
+    for target in iter_ports_listening(stragglers, timeout=timeout, interval=interval,
+                                       connect_timeout=connect_timeout, banner=banner):
+        stragglers.remove(target)
+        if callback:
+            callback(target)
+    return stragglers
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains the containers that hold the output of remote commands.
+
+    CommandResult is what ssh.execute_command returns. It keeps the raw output and only decodes it when
+    asked, so collectors that only look at the return code (or want the bytes) never pay for decoding.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import mmap
+import os
+import tempfile
+
+from epython import errors
+from epython.environment import EPYTHON_SSH_LOG_PREVIEW
+
+STDOUT = "stdout"
+STDERR = "stderr"
+
+
+class CapturedOutput:
+    """ Command output that is kept in memory up to a limit, and spills over to a temp file beyond it.
+
+    The output is exposed as a read-only file-like object. It can also be memory mapped, so very large
+    output can be searched without ever being loaded into memory in full.
+    """
+
+    def __init__(self, max_memory):
+        """ Constructor for the CapturedOutput
+
+        Args:
+            max_memory (int): The number of bytes to keep in memory before spilling to disk (0 or less
+                              writes everything to disk straight away)
+        """
+        self.max_memory = max(0, max_memory)
+        self.size = 0
+        # pylint: disable=R1732
+        if self.max_memory:
+            self._file = tempfile.SpooledTemporaryFile(max_size=self.max_memory)
+        else:
+            # A SpooledTemporaryFile with a max_size of 0 never rolls over, it would all stay in memory
+            self._file = tempfile.TemporaryFile()
+        # pylint: enable=R1732
+
+    @property
+    def spilled(self):
+        """ (bool): Whether or not the output outgrew memory and was moved to disk """
+        return self.size > self.max_memory
+
+    def write(self, data):
+        """ Append output. Only meant to be used while the command is running.
+
+        Args:
+            data (bytes): The output to append
+        """
+        self._file.seek(0, os.SEEK_END)
+        self._file.write(data)
+        self.size += len(data)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """ Move the read position, like a regular file. """
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        """ (int): The current read position """
+        return self._file.tell()
+
+    def read(self, size=-1):
+        """ Read output from the current position, like a regular file.
+
+        Args:
+            size (int): The number of bytes to read (-1 reads everything that is left)
+
+        Returns:
+            (bytes): The output read
+        """
+        return self._file.read(size)
+
+    def __iter__(self):
+        """ Iterate over the output line by line (as bytes) without loading all of it. """
+        self._file.seek(0)
+        return iter(self._file.readline, b"")
+
+    def text(self, encoding="utf-8", decode_errors="strict"):
+        """ Decode all of the output.
+
+        NOTE: This loads the whole output into memory, prefer iterating or mmap() for large output.
+
+        Args:
+            encoding (str): The encoding to decode with
+            decode_errors (str): The codecs error policy to decode with
+
+        Returns:
+            (str): The decoded and stripped output
+        """
+        self._file.seek(0)
+        return self._file.read().decode(encoding, decode_errors).strip()
+
+    def preview(self, max_chars=EPYTHON_SSH_LOG_PREVIEW):
+        """ A short, decoded preview of the start of the output, meant for log messages.
+
+        Args:
+            max_chars (int): The number of bytes of output to include
+
+        Returns:
+            (str): The preview
+        """
+        position = self._file.tell()
+        self._file.seek(0)
+        head = self._file.read(max_chars).decode("utf-8", "replace")
+        self._file.seek(position)
+        if self.size > max_chars:
+            return f"{head}... [{self.size - max_chars} more bytes]"
+        return head.strip()
+
+    def mmap(self):
+        """ Memory map the output, moving it to disk first if it is still in memory.
+
+        Returns:
+            (mmap.mmap): A read-only map of the output (bytes for empty output, which can't be mapped)
+        """
+        if not self.size:
+            return b""
+        if isinstance(self._file, tempfile.SpooledTemporaryFile):
+            self._file.rollover()
+        self._file.flush()
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        """ Release the memory or temp file holding the output. """
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"CapturedOutput(size={self.size}, spilled={self.spilled})"
+
+
+# pylint: disable=R0902
+class CommandResult:
+    """ The result of a remote command, holding the raw output and decoding it on first use.
+
+    It unpacks, indexes, compares and hashes like the (rc, stdout, stderr) tuple execute_command used to
+    return, where stdout and stderr are decoded and stripped. It isn't a tuple subclass though (that
+    would mean decoding up front), so isinstance(result, tuple) checks need updating.
+
+    Output that was captured into CapturedOutputs (see execute_command's capture_limit) is never decoded
+    as a whole behind the caller's back: stdout and stderr hand out the CapturedOutputs themselves.
+    """
+
+    __slots__ = ("rc", "raw_stdout", "raw_stderr", "host", "cmd", "encoding", "decode_errors",
+                 "_decoded")
+
+    def __init__(self, rc, stdout, stderr, host=None, cmd=None, encoding="utf-8",
+                 decode_errors="strict"):
+        """ Constructor for the CommandResult
+
+        Args:
+            rc (int): The return code of the command
+            stdout (bytes|CapturedOutput): The raw standard out of the command
+            stderr (bytes|CapturedOutput): The raw standard error of the command
+            host (str): The host the command ran on
+            cmd (str): The command that was executed
+            encoding (str): The encoding to decode the output with
+            decode_errors (str): The codecs error policy to decode the output with
+        """
+        self.rc = rc
+        self.raw_stdout = stdout
+        self.raw_stderr = stderr
+        self.host = host
+        self.cmd = cmd
+        self.encoding = encoding
+        self.decode_errors = decode_errors
+        self._decoded = {}
+
+    def _raw(self, stream):
+        """ (bytes|CapturedOutput): The raw output of a stream (STDOUT or STDERR) """
+        if stream not in (STDOUT, STDERR):
+            raise errors.ssh.SSHError(f"Unknown stream '{stream}', please use '{STDOUT}' or '{STDERR}'")
+        return self.raw_stdout if stream == STDOUT else self.raw_stderr
+
+    @property
+    def captured(self):
+        """ (bool): Whether or not the output was captured into CapturedOutputs """
+        return isinstance(self.raw_stdout, CapturedOutput)
+
+    def text(self, stream=STDOUT, encoding=None, decode_errors=None):
+        """ Decode the output of a stream.
+
+        Args:
+            stream (str): STDOUT or STDERR
+            encoding (str): The encoding to decode with (default: the result's encoding)
+            decode_errors (str): The codecs error policy to decode with (default: the result's policy)
+
+        Returns:
+            (str): The decoded and stripped output
+        """
+        raw = self._raw(stream)
+        # pylint: disable=W0703
+        try:
+            if isinstance(raw, CapturedOutput):
+                return raw.text(encoding or self.encoding, decode_errors or self.decode_errors)
+            return raw.decode(encoding or self.encoding, decode_errors or self.decode_errors).strip()
+        except Exception as exp:
+            raise errors.ssh.SSHStreamDecodeError(f"Failed decoding the {stream} of "
+                                                  f"'{self.cmd}'!") from exp
+        # pylint: enable=W0703
+
+    def _cached_text(self, stream):
+        """ (str): The output of a stream decoded with the result's settings, decoding it only once """
+        if stream not in self._decoded:
+            self._decoded[stream] = self.text(stream)
+        return self._decoded[stream]
+
+    @property
+    def stdout(self):
+        """ (str|CapturedOutput): The decoded and stripped standard out (or the captured one) """
+        return self.raw_stdout if self.captured else self._cached_text(STDOUT)
+
+    @property
+    def stderr(self):
+        """ (str|CapturedOutput): The decoded and stripped standard error (or the captured one) """
+        return self.raw_stderr if self.captured else self._cached_text(STDERR)
+
+    @property
+    def ok(self):
+        """ (bool): Whether or not the command returned 0 """
+        return self.rc == 0
+
+    def lines(self, stream=STDOUT, keepends=False):
+        """ Iterate over the lines of a stream, decoding them one at a time.
+
+        Args:
+            stream (str): STDOUT or STDERR
+            keepends (bool): Whether or not to keep the line endings
+
+        Yields:
+            (str): Every line of the output
+        """
+        raw = self._raw(stream)
+        if isinstance(raw, CapturedOutput):
+            # Captured output is read a line at a time, rather than loaded whole
+            raw_lines = (line if keepends else line.rstrip(b"\r\n") for line in raw)
+        else:
+            raw_lines = raw.splitlines(keepends)
+        for line in raw_lines:
+            try:
+                yield line.decode(self.encoding, self.decode_errors)
+            except UnicodeError as exp:
+                raise errors.ssh.SSHStreamDecodeError(f"Failed decoding the {stream} of "
+                                                      f"'{self.cmd}'!") from exp
+
+    def check(self):
+        """ Raise if the command didn't return 0.
+
+        Returns:
+            (CommandResult): This result, so a call can be chained
+        """
+        if self.rc != 0:
+            stderr = self.text(STDERR, decode_errors="replace")
+            raise errors.ssh.SSHCommandError(f"'{self.cmd}' on '{self.host}' returned {self.rc}: "
+                                             f"{stderr}", result=self)
+        return self
+
+    def __iter__(self):
+        return iter((self.rc, self.stdout, self.stderr))
+
+    def __len__(self):
+        return 3
+
+    def __getitem__(self, index):
+        return tuple(self)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, CommandResult)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return f"CommandResult(rc={self.rc}, stdout={len(self.raw_stdout)} bytes, " \
+               f"stderr={len(self.raw_stderr)} bytes)"
+# pylint: enable=R0902
@@ -10,4 +10,10 @@ Date:
     3/16/21
 """
 
-from epython.poke.eprequests import get, post, put, delete, COMMON_REQUEST_EXCEPTIONS, POKE_HEADERS
+from epython.poke.eprequests import (get, post, put, delete, default_session, PokeSession,
+                                    COMMON_REQUEST_EXCEPTIONS, POKE_HEADERS)
+from epython.poke.retry import RetryPolicy
+from epython.poke.breaker import CircuitBreaker, default_breaker
+from epython.poke.cache import ResponseCache, default_cache
+from epython.poke.batch import map, gather, RequestResult  # pylint: disable=W0622
+from epython.poke import aiopoke
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    The asyncio flavor of the poke request helpers, so a single event loop can keep thousands of
+    requests in flight without a thread per request.
+
+    Requests go over the pooled, kept-alive connections of an AsyncPokeSession, retries wait with
+    asyncio.sleep, and cancelling a request hands its connection back right away.
+
+    The module level helpers share one AsyncPokeSession per event loop. Nothing closes it when its loop
+    goes away (loops have no close hook), so await close_default_session() before the loop is closed,
+    e.g. at the end of the coroutine handed to asyncio.run. A session that wasn't closed is only dropped
+    the next time a default session is handed out, and aiohttp warns about its unclosed connections.
+
+    NOTE: This needs the optional aiohttp package (pip install elibs-epython[aiohttp]).
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import asyncio
+import json
+
+from epython import errors
+from epython.environment import (EPYTHON_REQUEST_RETRIES, EPYTHON_REQUEST_INTERVAL,
+                                 EPYTHON_REQUEST_POOL_MAXSIZE)
+from epython.poke.eprequests import POKE_HEADERS
+from epython.poke import retry
+from epython.poke.breaker import default_breaker
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# The async counterpart of COMMON_REQUEST_EXCEPTIONS (connection failures and timeouts)
+ASYNC_REQUEST_EXCEPTIONS = (asyncio.TimeoutError,) + ((aiohttp.ClientError,) if aiohttp else ())
+
+
+def _never_sent(exp):
+    """ (bool): Whether an aiohttp exception means the request never reached the server """
+    return isinstance(exp, aiohttp.ClientConnectorError)
+
+
+# The default session of each event loop (a session can't be shared between loops)
+_DEFAULT_SESSIONS = {}
+
+
+class AsyncPokeResponse:
+    """ A fully read response, with the requests.Response attributes poke callers rely on. """
+
+    def __init__(self, url, status_code, reason, headers, content, encoding=None):
+        """ Constructor for the AsyncPokeResponse
+
+        Args:
+            url (str): The final URL of the response
+            status_code (int): The HTTP status code
+            reason (str): The HTTP reason phrase
+            headers (dict): The response headers (case-insensitive)
+            content (bytes): The response body
+            encoding (str): The encoding of the body, if the server gave one
+        """
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def ok(self):
+        """ (bool): Whether the status code is below 400 """
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        """ (str): The decoded response body """
+        return self.content.decode(self.encoding or "utf-8", "replace")
+
+    def json(self, **kwargs):
+        """ (object): The response body parsed as JSON """
+        return json.loads(self.text, **kwargs)
+
+    def __repr__(self):
+        return f"<AsyncPokeResponse [{self.status_code}]>"
+
+
+def _check_aiohttp():
+    """ Make sure the optional aiohttp package is installed. """
+    if aiohttp is None:
+        raise errors.poke.PokeException("The async poke client needs the aiohttp package, please "
+                                        "install it with: pip install elibs-epython[aiohttp]")
+
+
+class AsyncPokeSession:
+    """ The asyncio counterpart of PokeSession, backed by a pooled aiohttp.ClientSession.
+
+    The aiohttp session is created on first use, so an AsyncPokeSession can be built outside of the
+    event loop it's used on. It must only be used from that one loop.
+    """
+
+    def __init__(self, limit=100, limit_per_host=EPYTHON_REQUEST_POOL_MAXSIZE, headers=None,
+                 cookies=False, breaker=None):
+        """ Constructor for the AsyncPokeSession
+
+        Args:
+            limit (int): The maximum number of connections open at once (0 for no limit)
+            limit_per_host (int): The maximum number of connections open at once to a single host (0
+                                  for no limit), requests past it wait for a free connection
+            headers (dict): The HTTP headers to send when a request doesn't give any (default:
+                            POKE_HEADERS)
+            cookies (bool): Keep cookies between requests
+            breaker (CircuitBreaker): The per-host circuit breaker guarding the requests (default: the
+                                      shared one when EPYTHON_REQUEST_BREAKER_THRESHOLD is set, False
+                                      for none)
+        """
+        _check_aiohttp()
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.headers = POKE_HEADERS if headers is None else headers
+        self.cookies = cookies
+        self.breaker = default_breaker() if breaker is None else (breaker or None)
+        self.session = None
+
+    def _session(self):
+        """ (aiohttp.ClientSession): The pooled session, created on first use """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host)
+            cookie_jar = None if self.cookies else aiohttp.DummyCookieJar()
+            self.session = aiohttp.ClientSession(connector=connector, cookie_jar=cookie_jar)
+        return self.session
+
+    async def _send(self, method, url, **options):
+        """ Send one request attempt and read the whole response. """
+        async with self._session().request(method, url, **options) as response:
+            content = await response.read()
+            return AsyncPokeResponse(str(response.url), response.status, response.reason,
+                                     response.headers, content, encoding=response.charset)
+
+    # pylint: disable=R0913,R0914
+    async def request(self, method, url, params=None, data=None, auth=None, headers=None, timeout=None,
+                      verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+                      policy=None, idempotency_key=None, **kwargs):
+        """ Issue an HTTP request over a pooled connection
+
+        Args:
+            method (str): The HTTP method (GET, POST, PUT, DELETE, ...)
+            url (str): The URL for the request
+            params (dict): The parameters to send in the query string for a request
+            data (obj): dict, list of tuples, bytes, or file-like object to send in the body of request
+            auth (tuple): Auth tuple (username, password) to enable Basic HTTP Auth
+            headers (dict): HTTP Headers to send with the request
+            timeout (int): How many seconds to allow each attempt, from connecting to reading the body
+            verify (bool): Whether to verify the server's TLS certificate or not
+            retries (int): The number of times to retry a request
+            interval (int): The interval of wait time between each retry
+            policy (RetryPolicy): When and how to retry (default: one with the retries and interval,
+                                  that retries on no status)
+            idempotency_key (bool|str): Send an idempotency key (True for a random one), so the request
+                                        is retried like a GET whatever its method
+
+        Returns:
+            (AsyncPokeResponse): The response
+        """
+        policy, headers = retry.resolve(policy, retries, interval,
+                                        self.headers if headers is None else headers, idempotency_key)
+        if isinstance(auth, tuple):
+            auth = aiohttp.BasicAuth(*auth)
+        if verify is False:
+            kwargs["ssl"] = False
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        async def send():
+            return await self._send(method, url, params=params, data=data, auth=auth, headers=headers,
+                                    **kwargs)
+
+        async def guarded_send():
+            return await self.breaker.call_async(url, send, ASYNC_REQUEST_EXCEPTIONS)
+
+        return await policy.call_async(send if self.breaker is None else guarded_send, method, headers,
+                                       ASYNC_REQUEST_EXCEPTIONS, _never_sent)
+    # pylint: enable=R0913,R0914
+
+    async def get(self, url, **kwargs):
+        """ Issue an HTTP GET request, see AsyncPokeSession.request """
+        return await self.request("GET", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        """ Issue an HTTP PUT request, see AsyncPokeSession.request """
+        return await self.request("PUT", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        """ Issue an HTTP POST request, see AsyncPokeSession.request """
+        return await self.request("POST", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        """ Issue an HTTP DELETE request, see AsyncPokeSession.request """
+        return await self.request("DELETE", url, **kwargs)
+
+    async def close(self):
+        """ Close every pooled connection. """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+def default_session():
+    """ Get the AsyncPokeSession shared by the module level helpers on the running event loop.
+
+    NOTE: It's only ever closed by close_default_session, see the module header.
+
+    Returns:
+        (AsyncPokeSession): The shared session of the loop
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _DEFAULT_SESSIONS:
+        # The sessions hold on to their loops, so the ones left behind by closed loops are dropped here
+        for closed in [other for other in _DEFAULT_SESSIONS if other.is_closed()]:
+            del _DEFAULT_SESSIONS[closed]
+        _DEFAULT_SESSIONS[loop] = AsyncPokeSession()
+    return _DEFAULT_SESSIONS[loop]
+
+
+async def close_default_session():
+    """ Close the shared session of the running event loop (call it before the loop is closed). """
+    session = _DEFAULT_SESSIONS.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def get(url, params=None, data=None, auth=None, headers=None, timeout=None,
+              verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+              session=None, **kwargs):
+    """ Issue an HTTP GET request, see AsyncPokeSession.request
+
+    Args:
+        url (str): The URL for the request
+        session (AsyncPokeSession): The session to send the request over (default: the shared session)
+
+    Returns:
+        (AsyncPokeResponse): The response
+    """
+    session = default_session() if session is None else session
+    return await session.request("GET", url, params=params, data=data, auth=auth, headers=headers,
+                                 timeout=timeout, verify=verify, retries=retries, interval=interval,
+                                 **kwargs)
+
+
+async def put(url, params=None, data=None, auth=None, headers=None, timeout=None,
+              verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+              session=None, **kwargs):
+    """ Issue an HTTP PUT request, see AsyncPokeSession.request
+
+    Args:
+        url (str): The URL for the request
+        session (AsyncPokeSession): The session to send the request over (default: the shared session)
+
+    Returns:
+        (AsyncPokeResponse): The response
+    """
+    session = default_session() if session is None else session
+    return await session.request("PUT", url, params=params, data=data, auth=auth, headers=headers,
+                                 timeout=timeout, verify=verify, retries=retries, interval=interval,
+                                 **kwargs)
+
+
+async def post(url, params=None, data=None, auth=None, headers=None, timeout=None,
+               verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+               session=None, **kwargs):
+    """ Issue an HTTP POST request, see AsyncPokeSession.request
+
+    Args:
+        url (str): The URL for the request
+        session (AsyncPokeSession): The session to send the request over (default: the shared session)
+
+    Returns:
+        (AsyncPokeResponse): The response
+    """
+    session = default_session() if session is None else session
+    return await session.request("POST", url, params=params, data=data, auth=auth, headers=headers,
+                                 timeout=timeout, verify=verify, retries=retries, interval=interval,
+                                 **kwargs)
+
+
+async def delete(url, params=None, data=None, auth=None, headers=None, timeout=None,
+                 verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+                 session=None, **kwargs):
+    """ Issue an HTTP DELETE request, see AsyncPokeSession.request
+
+    Args:
+        url (str): The URL for the request
+        session (AsyncPokeSession): The session to send the request over (default: the shared session)
+
+    Returns:
+        (AsyncPokeResponse): The response
+    """
+    session = default_session() if session is None else session
+    return await session.request("DELETE", url, params=params, data=data, auth=auth, headers=headers,
+                                 timeout=timeout, verify=verify, retries=retries, interval=interval,
+                                 **kwargs)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Batched requests for the Poke module. Many requests are sent at once over the pooled connections of
+    a PokeSession, with a cap on how many are in flight.
+
+    A request is given as a spec, which is one of:
+        "https://host/api/1"                                   (a GET)
+        ("DELETE", "https://host/api/1")
+        ("POST", "https://host/api", {"data": "{}"})
+        {"method": "PUT", "url": "https://host/api/1", "data": "{}", "timeout": 5}
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from epython import errors
+from epython.environment import _LOG, EPYTHON_REQUEST_POOL_MAXSIZE
+from epython.poke.eprequests import default_session
+
+
+class RequestResult:
+    """ The outcome of a single request sent as part of a batch. """
+
+    def __init__(self, index, method, url, response=None, elapsed=None, exception=None):
+        """ Constructor for the RequestResult
+
+        Args:
+            index (int): The position of the request in the batch
+            method (str): The HTTP method of the request
+            url (str): The URL of the request
+            response (requests.Response): The response, None if the request never completed
+            elapsed (float): The wall time in seconds spent on the request, including retries
+            exception (Exception): The exception that stopped the request, if there was one
+        """
+        self.index = index
+        self.method = method
+        self.url = url
+        self.response = response
+        self.elapsed = elapsed
+        self.exception = exception
+
+    @property
+    def ok(self):
+        """ (bool): Whether the request completed with a status code below 400 """
+        return self.exception is None and self.response.ok
+
+    def __repr__(self):
+        status = self.response.status_code if self.response is not None else None
+        return (f"RequestResult(method={self.method!r}, url={self.url!r}, status={status!r}, "
+                f"elapsed={self.elapsed!r}, exception={self.exception!r})")
+
+
+def _parse_spec(spec):
+    """ Split a request spec into its method, URL and request options.
+
+    Args:
+        spec (str|tuple|dict): The request spec (see the module description)
+
+    Returns:
+        (tuple): The method, the URL and a dict of options for PokeSession.request
+    """
+    if isinstance(spec, str):
+        return "GET", spec, {}
+    if isinstance(spec, dict) and "url" in spec:
+        options = dict(spec)
+        return options.pop("method", "GET"), options.pop("url"), options
+    if isinstance(spec, (tuple, list)) and len(spec) in (2, 3):
+        return spec[0], spec[1], dict(spec[2]) if len(spec) == 3 else {}
+    raise errors.poke.PokeException(f"Invalid request spec: {spec!r}")
+
+
+def _send(session, index, spec, defaults):
+    """ Send one request of a batch, capturing any failure in the result instead of raising it.
+
+    Returns:
+        (RequestResult): The outcome of the request
+    """
+    method, url = None, None
+    start_time = time.time()
+    try:
+        method, url, options = _parse_spec(spec)
+        response = session.request(method, url, **dict(defaults, **options))
+        return RequestResult(index, method, url, response=response, elapsed=time.time() - start_time)
+    # One bad request must never take the rest of the batch down with it
+    # pylint: disable=W0703
+    except Exception as exp:
+        _LOG.error("Failed to %s '%s' due to:\n%s", method, url, exp)
+        return RequestResult(index, method, url, elapsed=time.time() - start_time, exception=exp)
+    # pylint: enable=W0703
+
+
+# pylint: disable=W0622
+def map(specs, max_workers=EPYTHON_REQUEST_POOL_MAXSIZE, ordered=True, session=None, **defaults):
+    """ Send many requests at once, yielding the results as they come in.
+
+    Specs are pulled from the iterable as room frees up, so a huge (or endless) batch never has more
+    than a couple of requests per worker queued up. Each request keeps the retry behavior of
+    PokeSession.request, and a failing request is reported through its result rather than aborting
+    the batch.
+
+    Args:
+        specs (iterable): The request specs (see the module description)
+        max_workers (int): The maximum number of requests in flight (keep it at or below the pool size
+                           of the session, so every worker gets a kept-alive connection)
+        ordered (bool): Yield the results in the order of the specs, instead of as they complete
+        session (PokeSession): The session to send the requests over (default: the shared session)
+        defaults (dict): Request options applied to every request (e.g. timeout, headers, retries),
+                         the options of a spec win over these
+
+    Yields:
+        (RequestResult): The result for each request
+    """
+    session = default_session() if session is None else session
+    specs = iter(enumerate(specs))
+    max_workers = max(1, max_workers)
+    window = max_workers * 2
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="epython-poke") as executor:
+        pending = deque()
+
+        def fill():
+            for index, spec in specs:
+                pending.append(executor.submit(_send, session, index, spec, defaults))
+                if len(pending) >= window:
+                    return
+
+        try:
+            fill()
+            while pending:
+                if ordered:
+                    yield pending.popleft().result()
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        yield future.result()
+                fill()
+        finally:
+            # Don't send requests nobody is waiting on anymore if the caller stopped iterating early
+            for future in pending:
+                future.cancel()
+# pylint: enable=W0622
+
+
+def gather(specs, max_workers=EPYTHON_REQUEST_POOL_MAXSIZE, session=None, **defaults):
+    """ Send many requests at once and wait for all of them to finish.
+
+    Args:
+        specs (iterable): The request specs (see the module description)
+        max_workers (int): The maximum number of requests in flight
+        session (PokeSession): The session to send the requests over (default: the shared session)
+        defaults (dict): Request options applied to every request (e.g. timeout, headers, retries)
+
+    Returns:
+        (list): The RequestResult of each request, in the order of the specs
+    """
+    return list(map(specs, max_workers=max_workers, ordered=True, session=session, **defaults))
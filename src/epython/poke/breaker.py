@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    A per-host circuit breaker for the Poke module, so a host that went down costs a few failed
+    requests instead of every request waiting through all of its retries.
+
+    Each host has a circuit:
+        closed      Requests go through. Enough failures in a row open the circuit.
+        open        Requests fail fast with a CircuitOpenException until the cool-down is over.
+        half-open   One request is let through to probe the host. It closes the circuit if it
+                    succeeds, and opens it again for another cool-down if it fails.
+
+    A failure is a connection failure or timeout, or a response with one of the failure statuses.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+from epython import errors
+from epython.environment import (_LOG, EPYTHON_REQUEST_BREAKER_THRESHOLD,
+                                 EPYTHON_REQUEST_BREAKER_COOLDOWN)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# The statuses that mean a host is down (or overloaded), rather than a bad request
+FAILURE_STATUSES = frozenset((502, 503, 504))
+
+
+# pylint: disable=R0903
+class _Circuit:
+    """ The state of the circuit of one host. """
+
+    __slots__ = ("state", "failures", "opened_at", "probing", "trips")
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+# pylint: enable=R0903
+
+
+class CircuitBreaker:
+    """ Per-host circuits guarding the requests of a session. Thread safe, and usable from asyncio. """
+
+    def __init__(self, failure_threshold=EPYTHON_REQUEST_BREAKER_THRESHOLD or 5,
+                 cooldown=EPYTHON_REQUEST_BREAKER_COOLDOWN, statuses=FAILURE_STATUSES):
+        """ Constructor for the CircuitBreaker
+
+        Args:
+            failure_threshold (int): The number of failures in a row that open the circuit of a host
+            cooldown (float): Seconds an open circuit fails fast before it lets a probe through
+            statuses (iterable): The response statuses that count as failures
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.statuses = frozenset(statuses)
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host(url):
+        """ (str): The host a URL's circuit is kept for, as scheme://host:port """
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def state(self, url):
+        """ (str): The state of the circuit of a URL's host (closed, open or half-open) """
+        with self._lock:
+            circuit = self._circuits.get(self.host(url))
+            return CLOSED if circuit is None else circuit.state
+
+    def snapshot(self):
+        """ The state of every circuit, for diagnostics.
+
+        Returns:
+            (dict): Each host, mapped to its state, its failures in a row, the number of times its
+                    circuit opened, and the seconds left before an open circuit lets a probe through
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {host: {"state": circuit.state, "failures": circuit.failures, "trips": circuit.trips,
+                           "retry_in": max(0.0, circuit.opened_at + self.cooldown - now)
+                                       if circuit.state == OPEN else 0.0}
+                    for host, circuit in self._circuits.items()}
+
+    def reset(self, url=None):
+        """ Close the circuit of a URL's host, or every circuit when no URL is given. """
+        with self._lock:
+            if url is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(self.host(url), None)
+
+    def allow(self, host):
+        """ Let a request to a host through, or fail it fast.
+
+        Args:
+            host (str): The host (see CircuitBreaker.host)
+
+        Raises:
+            CircuitOpenException: When the circuit of the host is open, or already being probed
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            retry_in = circuit.opened_at + self.cooldown - time.monotonic()
+            if circuit.state == OPEN and retry_in <= 0:
+                circuit.state = HALF_OPEN
+            if circuit.state == HALF_OPEN and not circuit.probing:
+                circuit.probing = True
+                _LOG.info("The circuit for '%s' is half-open, probing the host", host)
+                return
+            failures = circuit.failures
+
+        retry_in = max(0.0, retry_in)
+        raise errors.poke.CircuitOpenException(
+            f"The circuit for '{host}' is open after {failures} failures in a row, failing fast for "
+            f"another {retry_in:.1f} seconds", host=host, retry_in=retry_in)
+
+    def record(self, host, success):
+        """ Record the outcome of a request that was let through.
+
+        Args:
+            host (str): The host (see CircuitBreaker.host)
+            success (bool): Whether the request succeeded
+        """
+        with self._lock:
+            circuit = self._circuits.setdefault(host, _Circuit())
+            circuit.probing = False
+            if success:
+                if circuit.state != CLOSED:
+                    _LOG.info("The circuit for '%s' is closed again", host)
+                circuit.state, circuit.failures = CLOSED, 0
+                return
+
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN or (circuit.state == CLOSED
+                                              and circuit.failures >= self.failure_threshold):
+                circuit.state, circuit.opened_at = OPEN, time.monotonic()
+                circuit.trips += 1
+                _LOG.warning("The circuit for '%s' is open after %s failures in a row, failing fast for "
+                             "%s seconds", host, circuit.failures, self.cooldown)
+
+    def _release(self, host):
+        """ Let another probe through, when a probe ended without telling whether the host is up. """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None:
+                circuit.probing = False
+
+    def call(self, url, send, exceptions):
+        """ Send a request through the circuit of its host.
+
+        Args:
+            url (str): The URL of the request
+            send (func): Sends the request, returning the response
+            exceptions (tuple): The exceptions that count as failures
+
+        Returns:
+            (requests.Response): The response
+        """
+        host = self.host(url)
+        self.allow(host)
+        try:
+            response = send()
+        except exceptions:
+            self.record(host, False)
+            raise
+        except BaseException:
+            self._release(host)
+            raise
+        self.record(host, response.status_code not in self.statuses)
+        return response
+
+    async def call_async(self, url, send, exceptions):
+        """ The coroutine flavor of CircuitBreaker.call, send being a coroutine function. """
+        host = self.host(url)
+        self.allow(host)
+        try:
+            response = await send()
+        except exceptions:
+            self.record(host, False)
+            raise
+        except BaseException:
+            self._release(host)
+            raise
+        self.record(host, response.status_code not in self.statuses)
+        return response
+
+    def __repr__(self):
+        return (f"CircuitBreaker(failure_threshold={self.failure_threshold}, cooldown={self.cooldown}, "
+                f"circuits={self.snapshot()!r})")
+
+
+_DEFAULT_BREAKER = None
+_DEFAULT_BREAKER_LOCK = threading.Lock()
+
+
+def default_breaker():
+    """ Get the CircuitBreaker shared by the sessions that aren't given one, creating it on first use.
+
+    Returns:
+        (CircuitBreaker): The shared breaker, None unless EPYTHON_REQUEST_BREAKER_THRESHOLD is set
+    """
+    global _DEFAULT_BREAKER  # pylint: disable=W0603
+    if not EPYTHON_REQUEST_BREAKER_THRESHOLD:
+        return None
+    if _DEFAULT_BREAKER is None:
+        with _DEFAULT_BREAKER_LOCK:
+            if _DEFAULT_BREAKER is None:
+                _DEFAULT_BREAKER = CircuitBreaker()
+    return _DEFAULT_BREAKER
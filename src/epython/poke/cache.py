@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    An opt-in response cache for poke.get, for the config and inventory endpoints that get fetched over
+    and over again during a run.
+
+    Responses are kept in an LRU with a size and a TTL limit, keyed by the URL, the query parameters,
+    the auth and the request headers that change what a server answers with. A fresh entry is served
+    without touching the network. A stale entry with an ETag or Last-Modified is revalidated with a
+    conditional GET, and a 304 answer serves the cached response again.
+
+    Usage:
+        poke.get(url, cache=True)                      (the shared cache)
+        poke.get(url, cache=ResponseCache(ttl=5))     (a cache of your own)
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from epython.environment import _LOG, EPYTHON_REQUEST_CACHE_SIZE, EPYTHON_REQUEST_CACHE_TTL
+
+# The request headers that make up the cache key by default, since they change what a server answers
+VARY_HEADERS = ("Accept", "Accept-Encoding", "Accept-Language", "Authorization", "Cookie")
+
+# The response headers a 304 answer refreshes on the cached response
+_REFRESHED_HEADERS = ("Cache-Control", "Date", "ETag", "Expires", "Last-Modified")
+
+
+def _cache_control(headers):
+    """ Parse the Cache-Control header of a response.
+
+    Args:
+        headers (dict): The response headers
+
+    Returns:
+        (dict): The lowercased directives, mapped to their value (None when they have no value)
+    """
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"') or None
+    return directives
+
+
+class _CacheEntry:
+    """ A cached response, with when it goes stale. """
+
+    __slots__ = ("response", "expires")
+
+    def __init__(self, response, ttl):
+        self.response = response
+        self.expires = time.monotonic() + ttl
+
+    @property
+    def fresh(self):
+        """ (bool): Whether the response can still be served without asking the server """
+        return time.monotonic() < self.expires
+
+    @property
+    def validators(self):
+        """ (dict): The conditional request headers that revalidate the response """
+        headers = {}
+        if "ETag" in self.response.headers:
+            headers["If-None-Match"] = self.response.headers["ETag"]
+        if "Last-Modified" in self.response.headers:
+            headers["If-Modified-Since"] = self.response.headers["Last-Modified"]
+        return headers
+
+
+# pylint: disable=R0902
+class ResponseCache:
+    """ A thread safe LRU of GET responses, revalidated with ETag/Last-Modified once they go stale.
+
+    Every hit hands back the same requests.Response object, so treat cached responses as read-only.
+    """
+
+    def __init__(self, maxsize=EPYTHON_REQUEST_CACHE_SIZE, ttl=EPYTHON_REQUEST_CACHE_TTL,
+                 vary=VARY_HEADERS):
+        """ Constructor for the ResponseCache
+
+        Args:
+            maxsize (int): The number of responses to keep, the least recently used go first
+            ttl (float): Seconds a response is served before it's revalidated (a shorter max-age from
+                         the server wins, and no-cache always revalidates)
+            vary (tuple): The request headers that make up the cache key along with the URL, the
+                          params and the auth
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.vary = tuple(header.lower() for header in vary)
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, url, params, headers, auth):
+        """ (tuple): The cache key of a request, None if the request can't be cached """
+        if isinstance(params, dict):
+            params = tuple(sorted(((name, tuple(value) if isinstance(value, list) else value)
+                                  for name, value in params.items()), key=repr))
+        elif isinstance(params, list):
+            params = tuple(params)
+        headers = {name.lower(): value for name, value in headers.items()}
+        key = url, params, auth, tuple(headers.get(name) for name in self.vary)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _ttl(self, response):
+        """ (float): How long a response stays fresh, None if it must not be stored at all """
+        directives = _cache_control(response.headers)
+        if "no-store" in directives or response.headers.get("Vary") == "*":
+            return None
+        if "no-cache" in directives:
+            return 0
+        try:
+            return min(self.ttl, float(directives["max-age"]))
+        except (KeyError, TypeError, ValueError):
+            return self.ttl
+
+    def _store(self, key, response):
+        """ Cache a response, evicting the least recently used ones past maxsize. """
+        ttl = self._ttl(response)
+        if response.status_code != 200 or ttl is None:
+            return
+        with self._lock:
+            self._entries[key] = _CacheEntry(response, ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def fetch(self, session, url, params=None, headers=None, auth=None, **kwargs):
+        """ Issue an HTTP GET request through the cache
+
+        Requests with a body, streamed responses, unhashable params and auth that isn't a plain tuple
+        skip the cache.
+
+        Args:
+            session (PokeSession): The session to send the request over, when it has to be sent
+            url (str): The URL for the request
+            params (dict): The parameters to send in the query string for a request
+            headers (dict): HTTP Headers to send with the request (default: the session headers)
+            auth (tuple): Auth tuple to enable Basic/Digest/Custom HTTP Auth
+            kwargs (dict): The rest of the PokeSession.request options
+
+        Returns:
+            (obj): The vanilla response object (the cached one on a hit or a 304)
+        """
+        headers = session.headers if headers is None else headers
+        key = self._key(url, params, headers, auth)
+        if key is None or kwargs.get("data") is not None or kwargs.get("stream") or \
+                not (auth is None or isinstance(auth, tuple)):
+            return session.request("GET", url, params=params, headers=headers, auth=auth, **kwargs)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry.fresh:
+                    self.hits += 1
+                    return entry.response
+
+        send_headers = dict(headers, **entry.validators) if entry is not None else headers
+        response = session.request("GET", url, params=params, headers=send_headers, auth=auth, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            _LOG.debug("Revalidated the cached response of '%s'", url)
+            cached = entry.response
+            for name in _REFRESHED_HEADERS:
+                if name in response.headers:
+                    cached.headers[name] = response.headers[name]
+            with self._lock:
+                self.revalidated += 1
+            self._store(key, cached)
+            return cached
+
+        with self._lock:
+            self.misses += 1
+        self._store(key, response)
+        return response
+
+    def clear(self):
+        """ Drop every cached response. """
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return (f"ResponseCache(size={len(self)}/{self.maxsize}, ttl={self.ttl}, hits={self.hits}, "
+                f"misses={self.misses}, revalidated={self.revalidated})")
+# pylint: enable=R0902
+
+
+_DEFAULT_CACHE = None
+_DEFAULT_CACHE_LOCK = threading.Lock()
+
+
+def default_cache():
+    """ Get the ResponseCache used by poke.get(cache=True), creating it on first use.
+
+    Returns:
+        (ResponseCache): The shared cache
+    """
+    global _DEFAULT_CACHE  # pylint: disable=W0603
+    if _DEFAULT_CACHE is None:
+        with _DEFAULT_CACHE_LOCK:
+            if _DEFAULT_CACHE is None:
+                _DEFAULT_CACHE = ResponseCache()
+    return _DEFAULT_CACHE
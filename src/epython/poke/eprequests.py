@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 """
 Description:
-    This module houses the Poke class, and the wrapped requests methods.
+    This module houses the PokeSession class, and the wrapped requests methods.
+
+    The wrapped methods all go through a shared PokeSession, so connections to a host are kept alive
+    and reused instead of paying for a new TCP (and TLS) handshake on every request.
 
 Author:
     Ray Gomez
@@ -10,10 +13,18 @@ Date:
     3/16/21
 """
 
+import threading
+from http.cookiejar import DefaultCookiePolicy
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
 
-from epython.environment import EPYTHON_REQUEST_ID, EPYTHON_REQUEST_RETRIES, EPYTHON_REQUEST_INTERVAL
-from epython.handlers import basic_retry_handler
+from epython.environment import (EPYTHON_REQUEST_ID, EPYTHON_REQUEST_RETRIES, EPYTHON_REQUEST_INTERVAL,
+                                 EPYTHON_REQUEST_POOL_CONNECTIONS, EPYTHON_REQUEST_POOL_MAXSIZE)
+from epython.poke.cache import default_cache
+from epython.poke import retry
+from epython.poke.breaker import default_breaker
 
 POKE_HEADERS = {
     "Content-Type": "application/json",
@@ -31,8 +42,143 @@ COMMON_REQUEST_EXCEPTIONS = (requests.exceptions.RequestException,
                              requests.exceptions.ReadTimeout)
 
 
+def _never_sent(exp):
+    """ (bool): Whether a requests exception means the request never reached the server """
+    if isinstance(exp, requests.exceptions.ConnectTimeout):
+        return True
+    # Connection refused, unreachable or unresolved hosts all fail before a byte was sent
+    reason = getattr(exp.args[0], "reason", None) if exp.args else None
+    return isinstance(exp, requests.exceptions.ConnectionError) and \
+        isinstance(reason, ConnectTimeoutError)
+
+
+class PokeSession:
+    """ A requests.Session with a tunable keep-alive connection pool, and the poke retry behavior.
+
+    A PokeSession can be shared between threads, each request borrows a connection from the pool of
+    its host. Keep pool_maxsize at (or above) the number of threads hitting one host, otherwise the
+    connections past it are thrown away after each request (or waited on, with pool_block).
+    """
+
+    def __init__(self, pool_connections=EPYTHON_REQUEST_POOL_CONNECTIONS,
+                 pool_maxsize=EPYTHON_REQUEST_POOL_MAXSIZE, pool_block=False, headers=None,
+                 cookies=False, breaker=None):
+        """ Constructor for the PokeSession
+
+        Args:
+            pool_connections (int): The number of hosts to keep a connection pool for
+            pool_maxsize (int): The number of connections to keep alive per host
+            pool_block (bool): Wait for a free connection instead of opening one past pool_maxsize
+            headers (dict): The HTTP headers to send when a request doesn't give any (default:
+                            POKE_HEADERS)
+            cookies (bool): Keep cookies between requests (off by default, so requests stay as
+                            independent of each other as they are with the plain requests helpers)
+            breaker (CircuitBreaker): The per-host circuit breaker guarding the requests (default: the
+                                      shared one when EPYTHON_REQUEST_BREAKER_THRESHOLD is set, False
+                                      for none)
+        """
+        self.headers = POKE_HEADERS if headers is None else headers
+        self.breaker = default_breaker() if breaker is None else (breaker or None)
+        self.session = requests.Session()
+
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              pool_block=pool_block)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        if not cookies:
+            # Allowing no domains at all means no cookie is ever stored (or sent)
+            self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    # pylint: disable=R0913,R0914
+    def request(self, method, url, params=None, data=None, auth=None, headers=None, timeout=None,
+                verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL,
+                policy=None, idempotency_key=None, **kwargs):
+        """ Issue an HTTP request over a pooled connection, retrying it as the retry policy allows
+
+        Args:
+            method (str): The HTTP method (GET, POST, PUT, DELETE, ...)
+            url (str): The URL for the request
+            params (dict): The parameters to send in the query string for a request
+            data (obj): dict, list of tuples, bytes, or file-like object to send in the body of request
+            auth (tuple): Auth tuple to enable Basic/Digest/Custom HTTP Auth
+            headers (dict): HTTP Headers to send with the request
+            timeout (int): How many seconds to wait for the server to send data
+            verify (bool): Whether to verify the server's TLS certificate or not
+            retries (int): The number of times to retry a request
+            interval (int): The interval of wait time between each retry
+            policy (RetryPolicy): When and how to retry (default: one with the retries and interval,
+                                  that retries on no status)
+            idempotency_key (bool|str): Send an idempotency key (True for a random one), so the request
+                                        is retried like a GET whatever its method (the key is the same
+                                        on every attempt)
+
+        Returns:
+            (obj): The vanilla response object
+        """
+        policy, headers = retry.resolve(policy, retries, interval,
+                                        self.headers if headers is None else headers, idempotency_key)
+
+        def send():
+            return self.session.request(method, url, params=params, data=data, auth=auth,
+                                        headers=headers, timeout=timeout, verify=verify, **kwargs)
+
+        def guarded_send():
+            return self.breaker.call(url, send, COMMON_REQUEST_EXCEPTIONS)
+
+        return policy.call(send if self.breaker is None else guarded_send, method, headers,
+                           COMMON_REQUEST_EXCEPTIONS, _never_sent)
+    # pylint: enable=R0913,R0914
+
+    def get(self, url, **kwargs):
+        """ Issue an HTTP GET request, see PokeSession.request """
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        """ Issue an HTTP PUT request, see PokeSession.request """
+        return self.request("PUT", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """ Issue an HTTP POST request, see PokeSession.request """
+        return self.request("POST", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        """ Issue an HTTP DELETE request, see PokeSession.request """
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        """ Close every pooled connection. """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_DEFAULT_SESSION = None
+_DEFAULT_SESSION_LOCK = threading.Lock()
+
+
+def default_session():
+    """ Get the PokeSession shared by the module level helpers, creating it on first use.
+
+    Returns:
+        (PokeSession): The shared session
+    """
+    global _DEFAULT_SESSION  # pylint: disable=W0603
+    if _DEFAULT_SESSION is None:
+        with _DEFAULT_SESSION_LOCK:
+            if _DEFAULT_SESSION is None:
+                _DEFAULT_SESSION = PokeSession()
+    return _DEFAULT_SESSION
+
+
+# pylint: disable=R0913
 def get(url, params=None, data=None, auth=None, headers=None, timeout=None,
-        verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, **kwargs):
+        verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, session=None,
+        cache=None, **kwargs):
     """ Issue an HTTP GET request
 
     Args:
@@ -45,22 +191,27 @@ def get(url, params=None, data=None, auth=None, headers=None, timeout=None,
         verify (bool): Whether to verify the server's TLS certificate or not
         retries (int): The number of times to retry a request
         interval (int): The interval of wait time between each retry
+        session (PokeSession): The session to send the request over (default: the shared session)
+        cache (bool|ResponseCache): Serve the response from a cache, True for the shared cache (the
+                                    cached response object is shared, so treat it as read-only)
 
     Returns:
         (obj): The vanilla response object, or a ResponseProcessor if one was requested.
     """
-    if headers is None:
-        headers = POKE_HEADERS
-
-    @basic_retry_handler(COMMON_REQUEST_EXCEPTIONS, retries=retries, interval=interval)
-    def __req():
-        return requests.get(url, params=params, data=data, auth=auth, headers=headers, timeout=timeout,
-                            verify=verify, **kwargs)
-    return __req()
+    if session is None:
+        session = default_session()
+    if cache is not None and cache is not False:
+        cache = default_cache() if cache is True else cache
+        return cache.fetch(session, url, params=params, data=data, auth=auth, headers=headers,
+                           timeout=timeout, verify=verify, retries=retries, interval=interval, **kwargs)
+    return session.request("GET", url, params=params, data=data, auth=auth, headers=headers,
+                           timeout=timeout, verify=verify, retries=retries, interval=interval, **kwargs)
+# pylint: enable=R0913
 
 
 def put(url, params=None, data=None, auth=None, headers=None, timeout=None,
-        verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, **kwargs):
+        verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, session=None,
+        **kwargs):
     """ Issue an HTTP PUT request
 
     Args:
@@ -73,23 +224,20 @@ def put(url, params=None, data=None, auth=None, headers=None, timeout=None,
         verify (bool): Whether to verify the server's TLS certificate or not
         retries (int): The number of times to retry a request
         interval (int): The interval of wait time between each retry
+        session (PokeSession): The session to send the request over (default: the shared session)
 
     Returns:
         (obj): The vanilla response object, or a ResponseProcessor if one was requested.
     """
-
-    if headers is None:
-        headers = POKE_HEADERS
-
-    @basic_retry_handler(COMMON_REQUEST_EXCEPTIONS, retries=retries, interval=interval)
-    def __req():
-        return requests.put(url, params=params, data=data, auth=auth, headers=headers, timeout=timeout,
-                            verify=verify, **kwargs)
-    return __req()
+    if session is None:
+        session = default_session()
+    return session.request("PUT", url, params=params, data=data, auth=auth, headers=headers,
+                           timeout=timeout, verify=verify, retries=retries, interval=interval, **kwargs)
 
 
 def post(url, params=None, data=None, auth=None, headers=None, timeout=None,
-         verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, **kwargs):
+         verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, session=None,
+         **kwargs):
     """ Issue an HTTP POST request
 
     Args:
@@ -102,23 +250,20 @@ def post(url, params=None, data=None, auth=None, headers=None, timeout=None,
         verify (bool): Whether to verify the server's TLS certificate or not
         retries (int): The number of times to retry a request
         interval (int): The interval of wait time between each retry
+        session (PokeSession): The session to send the request over (default: the shared session)
 
     Returns:
         (obj): The vanilla response object, or a ResponseProcessor if one was requested.
     """
-
-    if headers is None:
-        headers = POKE_HEADERS
-
-    @basic_retry_handler(COMMON_REQUEST_EXCEPTIONS, retries=retries, interval=interval)
-    def __req():
-        return requests.post(url, params=params, data=data, auth=auth, headers=headers, timeout=timeout,
-                             verify=verify, **kwargs)
-    return __req()
+    if session is None:
+        session = default_session()
+    return session.request("POST", url, params=params, data=data, auth=auth, headers=headers,
+                           timeout=timeout, verify=verify, retries=retries, interval=interval, **kwargs)
 
 
 def delete(url, params=None, data=None, auth=None, headers=None, timeout=None,
-           verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, **kwargs):
+           verify=None, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, session=None,
+           **kwargs):
     """ Issue an HTTP DELETE request
 
     Args:
@@ -131,16 +276,12 @@ def delete(url, params=None, data=None, auth=None, headers=None, timeout=None,
         verify (bool): Whether to verify the server's TLS certificate or not
         retries (int): The number of times to retry a request
         interval (int): The interval of wait time between each retry
+        session (PokeSession): The session to send the request over (default: the shared session)
 
     Returns:
         (obj): The vanilla response object, or a ResponseProcessor if one was requested.
     """
-
-    if headers is None:
-        headers = POKE_HEADERS
-
-    @basic_retry_handler(COMMON_REQUEST_EXCEPTIONS, retries=retries, interval=interval)
-    def __req():
-        return requests.delete(url, params=params, data=data, auth=auth, headers=headers,
-                               timeout=timeout, verify=verify, **kwargs)
-    return __req()
+    if session is None:
+        session = default_session()
+    return session.request("DELETE", url, params=params, data=data, auth=auth, headers=headers,
+                           timeout=timeout, verify=verify, retries=retries, interval=interval, **kwargs)
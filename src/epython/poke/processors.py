@@ -4,18 +4,41 @@ Description:
      Post Processors for the Poke module. The intention is to have helper methods that
      speed up the testing of an API.
 
+     Responses can be checked with a ResponseValidator, which compiles its checks once and reports
+     every failure of a response in one pass.
+
+     Large JSON bodies can be walked incrementally with iter_json, which holds a single item in
+     memory at a time instead of the whole document:
+
+        response = PokeResponse(poke.get(url, stream=True))
+        for item in response.iter_json(path=["results"]):
+            ...
+
 Author:
     Ray Gomez
 
-Todo:
-    * Add callback processors that would help with API validation
-
 Date:
     3/16/21
 """
 
+import codecs
+import hashlib
+import json
+import re
+
 from requests import Response
 
+from epython import errors
+from epython.poke.batch import RequestResult
+
+# The number of bytes read from the body at a time
+JSON_CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+_LITERALS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+# What's left of a number cut off at the end of the buffer (e.g. the "1e" of "1e5")
+_NUMBER_TAIL = re.compile(r"[0-9.eE+-]*\Z")
+
 
 class PokeResponse(Response):
     """ A subclassed version of requests.Response, wrapped to help with ease of use."""
@@ -28,6 +51,577 @@ class PokeResponse(Response):
         for key, val in response.__dict__.items():
             self.__dict__[key] = val
 
+    def iter_json(self, path=None, chunk_size=JSON_CHUNK_SIZE, encoding="utf-8"):
+        """ Walk the JSON body incrementally, see iter_json
+
+        NOTE: Send the request with stream=True, otherwise the whole body was already read into memory.
+        """
+        return iter_json(self.iter_content(chunk_size), path=path, encoding=encoding)
+
+    def validate(self, validator):
+        """ Run the checks of a ResponseValidator on the response
+
+        Args:
+            validator (ResponseValidator): The validator
+
+        Returns:
+            (ValidationResult): The failures found
+        """
+        return validator.validate(self)
+
+
+# pylint: disable=R0902
+class _JsonStream:
+    """ A JSON document read a chunk at a time, and parsed a value at a time. """
+
+    def __init__(self, chunks, encoding):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        self.decode = json.JSONDecoder().raw_decode
+        self.exhausted = False
+        self.buffer = ""
+        self.idx = 0
+        # Where the buffer starts in the document, to report positions from the start of the document
+        self.offset = 0
+        self.lines = 1
+        self.last_newline = -1
+        # Whether the walk reached the container at its path
+        self.found = False
+
+    def _read(self):
+        """ (str): The next decoded chunk, empty once the body is exhausted """
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                try:
+                    chunk = self.decoder.decode(chunk)
+                except UnicodeDecodeError as exp:
+                    raise self.error(f"Invalid {exp.encoding} in the body", len(self.buffer)) from exp
+            if chunk:
+                return chunk
+        self.exhausted = True
+        try:
+            return self.decoder.decode(b"", final=True)
+        except UnicodeDecodeError as exp:
+            raise self.error(f"Truncated {exp.encoding} at the end of the body",
+                             len(self.buffer)) from exp
+
+    def fill(self):
+        """ Drop what was parsed from the buffer, then read at least as much as is left in it.
+
+        Growing the buffer geometrically keeps re-parsing a value that spans many chunks linear.
+        """
+        dropped = self.buffer[:self.idx]
+        newlines = dropped.count("\n")
+        if newlines:
+            self.lines += newlines
+            self.last_newline = self.offset + dropped.rfind("\n")
+        self.offset += self.idx
+        self.buffer, self.idx = self.buffer[self.idx:], 0
+
+        wanted = max(len(self.buffer), 1)
+        read = []
+        while wanted > 0 and not self.exhausted:
+            chunk = self._read()
+            read.append(chunk)
+            wanted -= len(chunk)
+        self.buffer += "".join(read)
+
+    def error(self, msg, pos):
+        """ (JsonProcessorException): An exception locating pos (a buffer index) in the document """
+        position = self.offset + pos
+        line = self.lines + self.buffer.count("\n", 0, pos)
+        newline = self.buffer.rfind("\n", 0, pos)
+        column = pos - newline if newline >= 0 else position - self.last_newline
+        return errors.poke.JsonProcessorException(
+            f"{msg}: line {line} column {column} (char {position})", position=position, line=line,
+            column=column)
+
+    def peek(self):
+        """ (str): The next character past any whitespace, empty at the end of the body """
+        while True:
+            while self.idx < len(self.buffer) and self.buffer[self.idx] in _WHITESPACE:
+                self.idx += 1
+            if self.idx < len(self.buffer):
+                return self.buffer[self.idx]
+            if self.exhausted:
+                return ""
+            self.fill()
+
+    def expect(self, *chars):
+        """ (str): Consume the next character, which must be one of chars """
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(f"Expecting {' or '.join(repr(c) for c in chars)}", self.idx)
+        self.idx += 1
+        return char
+
+    def _incomplete(self, exp):
+        """ (bool): Whether a decoding error is only the end of the buffer cutting a value off """
+        rest = self.buffer[exp.pos:].strip(_WHITESPACE)
+        return (exp.msg.startswith("Unterminated string") or _NUMBER_TAIL.match(rest) is not None
+                or any(literal.startswith(rest) for literal in _LITERALS)
+                or ("escape" in exp.msg and len(self.buffer) - exp.pos < 6))
+
+    def value(self):
+        """ (object): Parse the next complete JSON value """
+        if not self.peek():
+            raise self.error("Expecting value", self.idx)
+        while True:
+            try:
+                value, end = self.decode(self.buffer, self.idx)
+            except json.JSONDecodeError as exp:
+                if self.exhausted or not self._incomplete(exp):
+                    raise self.error(exp.msg, exp.pos) from None
+            else:
+                # A number at the end of the buffer may go on in the next chunk
+                if self.exhausted or not _NUMBER_TAIL.match(self.buffer, end):
+                    self.idx = end
+                    return value
+            self.fill()
+
+    def walk(self, path):
+        """ Yield the items of the container at path, parsing (and dropping) everything around it. """
+        opener = self.peek()
+        if opener not in ("[", "{"):
+            raise self.error("Expecting an array or an object", self.idx)
+        self.found = self.found or not path
+        closer = "]" if opener == "[" else "}"
+        self.idx += 1
+        if self.peek() == closer:
+            self.idx += 1
+            return
+
+        index = 0
+        while True:
+            if opener == "{":
+                if self.peek() != '"':
+                    raise self.error("Expecting property name enclosed in double quotes", self.idx)
+                key = self.value()
+                self.expect(":")
+            else:
+                key = index
+
+            if path and path[0] == key:
+                yield from self.walk(path[1:])
+            elif path:
+                self.value()
+            else:
+                item = self.value()
+                yield (key, item) if opener == "{" else item
+
+            index += 1
+            if self.expect(",", closer) == closer:
+                return
+# pylint: enable=R0902
+
+
+def iter_json(chunks, path=None, encoding="utf-8"):
+    """ Walk a large JSON array or object incrementally, holding only one item in memory at a time.
+
+    Args:
+        chunks (iterable): The body, as chunks of bytes or str (e.g. response.iter_content())
+        path (list): The keys (and array indexes) leading to the container to walk, when it isn't the
+                     top level of the document (e.g. ["results"] for {"count": 2, "results": [...]})
+        encoding (str): The encoding of byte chunks
+
+    Yields:
+        (object): Each item of an array, or a (key, value) tuple for each member of an object
+
+    Raises:
+        JsonProcessorException: When the body isn't valid JSON, with the position of the problem
+    """
+    stream = _JsonStream(chunks, encoding)
+    yield from stream.walk(list(path or []))
+
+    if stream.peek():
+        raise stream.error("Extra data", stream.idx)
+    if not stream.found:
+        raise errors.poke.JsonProcessorException(f"Path {path!r} was not found in the body")
+
+
 ##############################################################
 # Generic mechanism that allows easy validation of api calls #
 ##############################################################
+_PATTERN_TYPE = type(re.compile(""))
+
+_SCHEMA_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+}
+
+
+def _format_path(path):
+    """ (str): A JSON path tuple as $.results[0].id """
+    return "$" + "".join(f"[{key}]" if isinstance(key, int) else f".{key}" for key in path)
+
+
+def _matcher(expected):
+    """ Compile an expected value into a predicate.
+
+    Args:
+        expected (object): A compiled regex (searched for), a type or tuple of types (isinstance), a
+                           callable (called with the value), or a plain value (compared with ==)
+
+    Returns:
+        (tuple): The predicate, and how to describe it in a failure
+    """
+    if isinstance(expected, _PATTERN_TYPE):
+        return (lambda value: isinstance(value, str) and expected.search(value) is not None,
+                f"to match {expected.pattern!r}")
+    if isinstance(expected, type) or (isinstance(expected, tuple) and expected
+                                      and all(isinstance(item, type) for item in expected)):
+        return lambda value: isinstance(value, expected), f"to be a {expected!r}"
+    if callable(expected):
+        def passes(value):
+            # A predicate raising on a value of the wrong shape fails the check, not the validation
+            try:
+                return expected(value)
+            # pylint: disable=W0703
+            except Exception:
+                return False
+            # pylint: enable=W0703
+        return passes, f"to pass {getattr(expected, '__name__', expected)!r}"
+    return lambda value: value == expected, f"{expected!r}"
+
+
+def _is_type(value, name):
+    """ (bool): Whether value is of the named schema type (bools are not integers or numbers) """
+    if isinstance(value, bool) and name in ("integer", "number"):
+        return False
+    return isinstance(value, _SCHEMA_TYPES[name])
+
+
+def _compile_value_checks(schema):
+    """ (list): The checks of the type, enum/const, pattern and bound keywords of a schema """
+    checks = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        unknown = [name for name in names if name not in _SCHEMA_TYPES]
+        if unknown:
+            raise errors.poke.PokeException(f"Unknown schema types: {unknown}")
+
+        def check_type(value, path, failures):
+            if not any(_is_type(value, name) for name in names):
+                failures.append(f"schema {_format_path(path)}: expected type {'|'.join(names)}, "
+                                f"got {type(value).__name__}")
+                return False
+            return True
+        checks.append(check_type)
+
+    if "enum" in schema or "const" in schema:
+        allowed = schema["enum"] if "enum" in schema else [schema["const"]]
+
+        def check_enum(value, path, failures):
+            if value not in allowed:
+                failures.append(f"schema {_format_path(path)}: expected one of {allowed!r}, "
+                                f"got {value!r}")
+            return True
+        checks.append(check_enum)
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+
+        def check_pattern(value, path, failures):
+            if isinstance(value, str) and pattern.search(value) is None:
+                failures.append(f"schema {_format_path(path)}: {value!r} doesn't match "
+                                f"{pattern.pattern!r}")
+            return True
+        checks.append(check_pattern)
+
+    bounds = [(name, schema[name]) for name in ("minimum", "maximum", "minLength", "maxLength",
+                                                "minItems", "maxItems") if name in schema]
+    if bounds:
+        def check_bounds(value, path, failures):
+            for name, bound in bounds:
+                if name in ("minimum", "maximum"):
+                    if not isinstance(value, (int, float)) or isinstance(value, bool):
+                        continue
+                    measured = value
+                elif isinstance(value, str if name.endswith("Length") else list):
+                    measured = len(value)
+                else:
+                    continue
+                if measured < bound if name.startswith("min") else measured > bound:
+                    failures.append(f"schema {_format_path(path)}: {measured} breaks {name} {bound}")
+            return True
+        checks.append(check_bounds)
+
+    return checks
+
+
+def _compile_container_checks(schema):
+    """ (list): The checks of the required, properties, additionalProperties and items keywords """
+    checks = []
+
+    required = schema.get("required", [])
+    properties = {key: _compile_schema(sub) for key, sub in schema.get("properties", {}).items()}
+    closed = schema.get("additionalProperties", True) is False
+    if required or properties or closed:
+        def check_object(value, path, failures):
+            if not isinstance(value, dict):
+                return True
+            for key in required:
+                if key not in value:
+                    failures.append(f"schema {_format_path(path)}: missing required key {key!r}")
+            for key, check in properties.items():
+                if key in value:
+                    check(value[key], path + (key,), failures)
+            if closed:
+                extra = [key for key in value if key not in properties]
+                if extra:
+                    failures.append(f"schema {_format_path(path)}: unexpected keys {extra!r}")
+            return True
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_check = _compile_schema(schema["items"])
+
+        def check_items(value, path, failures):
+            if isinstance(value, list):
+                for idx, item in enumerate(value):
+                    item_check(item, path + (idx,), failures)
+            return True
+        checks.append(check_items)
+
+    return checks
+
+
+def _compile_schema(schema):
+    """ Compile a schema into a check, so no schema is interpreted per response.
+
+    The schema is the commonly used subset of JSON Schema: type, enum, const, required, properties,
+    additionalProperties (true/false), items, minItems, maxItems, minLength, maxLength, pattern,
+    minimum and maximum.
+
+    Args:
+        schema (dict): The schema
+
+    Returns:
+        (function): A check(value, path, failures) appending a message for each failure to failures
+    """
+    checks = _compile_value_checks(schema) + _compile_container_checks(schema)
+
+    def check_schema(value, path, failures):
+        # A value of the wrong type fails once, instead of once per keyword that can't apply to it
+        for check in checks:
+            if not check(value, path, failures):
+                return
+    return check_schema
+
+
+def _compile_json_path(path):
+    """ Split a dotted JSON path (e.g. "results.*.id") into keys, with array indexes as ints.
+
+    An int key still matches the same string key of an object, so "m.0" finds {"m": {"0": 1}} too.
+    """
+    if not isinstance(path, str):
+        return tuple(path)
+    return tuple(int(key) if key.lstrip("-").isdigit() else key for key in path.split(".") if key)
+
+
+def _resolve(body, keys):
+    """ Walk a JSON path, with a "*" key walking every member.
+
+    Returns:
+        (tuple): The paths that lead nowhere, and the (path, value) pairs the JSON path leads to
+    """
+    found, missing = [((), body)], []
+    for key in keys:
+        walked = []
+        for path, value in found:
+            if key == "*" and isinstance(value, (list, dict)):
+                members = enumerate(value) if isinstance(value, list) else value.items()
+                walked.extend((path + (member,), item) for member, item in members)
+            elif isinstance(value, dict) and (key in value or str(key) in value):
+                member = key if key in value else str(key)
+                walked.append((path + (member,), value[member]))
+            elif isinstance(value, list) and isinstance(key, int) and -len(value) <= key < len(value):
+                walked.append((path + (key,), value[key]))
+            else:
+                missing.append(path + (key,))
+        found = walked
+    return missing, found
+
+
+class ValidationResult:
+    """ The failures found validating one response. """
+
+    __slots__ = ("response", "failures")
+
+    def __init__(self, response, failures):
+        """ Constructor for the ValidationResult
+
+        Args:
+            response (requests.Response): The response that was validated
+            failures (list): A message for each failure found
+        """
+        self.response = response
+        self.failures = failures
+
+    @property
+    def ok(self):
+        """ (bool): Whether the response passed every check """
+        return not self.failures
+
+    def check(self):
+        """ Raise if the response failed any check.
+
+        Returns:
+            (ValidationResult): This result, so a call can be chained
+        """
+        if self.failures:
+            url = getattr(self.response, "url", None)
+            raise errors.poke.ResponseValidationException(
+                f"'{url}' failed validation:\n  " + "\n  ".join(self.failures), failures=self.failures)
+        return self
+
+    def __repr__(self):
+        return f"ValidationResult(ok={self.ok!r}, failures={self.failures!r})"
+
+
+class ResponseValidator:
+    """ Declarative checks on responses, compiled once when the validator is built.
+
+    Every check runs on every response, so a single pass reports all of its failures.
+
+        validator = ResponseValidator(status=200, headers={"Content-Type": re.compile("json")},
+                                      json={"count": int, "results.*.id": lambda id: id > 0},
+                                      schema={"type": "object", "required": ["results"]})
+        validator.validate(response).check()
+        failed = [result for result in validator.validate_many(responses) if not result.ok]
+    """
+
+    def __init__(self, status=None, headers=None, json=None, schema=None):
+        """ Constructor for the ResponseValidator
+
+        Args:
+            status (int|iterable): The allowed status code(s)
+            headers (dict): Header names, mapped to what their value must be (see json), True when the
+                            header must be there with any value, or False when it must not be there
+            json (dict): JSON paths (e.g. "results.0.id", with "*" for every member), mapped to what the
+                         value must be: a compiled regex (searched for), a type or tuple of types, a
+                         callable (passed the value), or a plain value (compared with ==)
+            schema (dict): A schema the JSON body must match (see _compile_schema for the keywords)
+        """
+        # pylint: disable=W0621
+        self.status = None
+        if status is not None:
+            self.status = frozenset([status] if isinstance(status, int) else status)
+
+        self.header_checks = []
+        for name, expected in (headers or {}).items():
+            if expected is True or expected is False:
+                self.header_checks.append((name, expected, None, None))
+            else:
+                self.header_checks.append((name, None) + _matcher(expected))
+
+        self.json_checks = [(path, _compile_json_path(path)) + _matcher(expected)
+                            for path, expected in (json or {}).items()]
+        self.schema_check = _compile_schema(schema) if schema is not None else None
+        # pylint: enable=W0621
+
+    def _check_status(self, response, failures):
+        if self.status is not None and response.status_code not in self.status:
+            failures.append(f"status: expected {sorted(self.status)}, got {response.status_code}")
+
+    def _check_headers(self, response, failures):
+        for name, presence, predicate, description in self.header_checks:
+            value = response.headers.get(name)
+            if presence is not None:
+                if (value is not None) is not presence:
+                    failures.append(f"header {name!r}: expected it to be "
+                                    f"{'there' if presence else 'absent'}")
+            elif value is None or not predicate(value):
+                failures.append(f"header {name!r}: expected {description}, got {value!r}")
+
+    def _body_failures(self, response):
+        """ (list): The failures of the JSON path and schema checks on the body of a response """
+        failures = []
+        try:
+            # json.loads detects the UTF encoding of bytes itself, skipping the guessing of .json()
+            content = getattr(response, "content", None)
+            body = json.loads(content) if isinstance(content, bytes) else response.json()
+        # pylint: disable=W0703
+        except Exception as exp:
+            return [f"body: expected JSON, failed parsing it: {exp}"]
+        # pylint: enable=W0703
+
+        for path, keys, predicate, description in self.json_checks:
+            missing, found = _resolve(body, keys)
+            for where in missing:
+                failures.append(f"json {path!r}: {_format_path(where)} is missing")
+            for where, value in found:
+                if not predicate(value):
+                    failures.append(f"json {_format_path(where)}: expected {description}, got {value!r}")
+        if self.schema_check is not None:
+            self.schema_check(body, (), failures)
+        return failures
+
+    def validate(self, response):
+        """ Run every check on a response
+
+        Args:
+            response (requests.Response): The response (or PokeResponse, or AsyncPokeResponse)
+
+        Returns:
+            (ValidationResult): The failures found
+        """
+        failures = []
+        self._check_status(response, failures)
+        self._check_headers(response, failures)
+        if self.json_checks or self.schema_check is not None:
+            failures.extend(self._body_failures(response))
+        return ValidationResult(response, failures)
+
+    def validate_many(self, responses):
+        """ Run every check on a whole batch of responses
+
+        Every response goes through the same checks as with validate, except that the body checks only
+        run once per distinct body (identical bodies are told apart by their SHA-256). Items of a
+        poke.gather/poke.map batch are accepted too, a request that never got a response fails with the
+        exception that stopped it.
+
+        Args:
+            responses (iterable): The responses, or the RequestResults of a batch
+
+        Returns:
+            (list): The ValidationResult of each response, in order
+        """
+        items, responses, failures = responses, [], []
+        for item in items:
+            if isinstance(item, RequestResult):
+                responses.append(item.response)
+                failures.append([f"request: failed with {item.exception!r}"] if item.exception else [])
+            else:
+                responses.append(item)
+                failures.append([])
+        live = [idx for idx, response in enumerate(responses) if response is not None]
+
+        if self.status is not None:
+            allowed = self.status
+            for idx in [idx for idx in live if responses[idx].status_code not in allowed]:
+                failures[idx].append(f"status: expected {sorted(allowed)}, "
+                                     f"got {responses[idx].status_code}")
+        if self.header_checks:
+            for idx in live:
+                self._check_headers(responses[idx], failures[idx])
+        if self.json_checks or self.schema_check is not None:
+            # The body checks only depend on the body, so identical bodies are parsed and checked once
+            checked = {}
+            for idx in live:
+                content = getattr(responses[idx], "content", None)
+                if not isinstance(content, bytes):
+                    failures[idx].extend(self._body_failures(responses[idx]))
+                    continue
+                digest = hashlib.sha256(content).digest()
+                if digest not in checked:
+                    checked[digest] = self._body_failures(responses[idx])
+                failures[idx].extend(checked[digest])
+
+        return [ValidationResult(response, failed) for response, failed in zip(responses, failures)]
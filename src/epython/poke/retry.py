@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    The retry policy of the Poke module. It decides whether a failed request is retried, and how
+    long to wait first, from the method, the exception or status code, and the Retry-After header.
+
+    Requests that are safe to send twice (GET, PUT, DELETE, ... or a request carrying an idempotency
+    key) are retried on any connection failure or timeout, and on the retry statuses. Anything else
+    (e.g. a plain POST) is only retried when the server can't have acted on it: the connection was
+    never made, or the server turned it away with a 429 (or a 503 with a Retry-After).
+
+    Status retries are opt-in: a request given no policy only retries failed connections and timeouts,
+    and returns whatever status the server answered with. Pass a RetryPolicy to retry on statuses too.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from epython.environment import (_LOG, EPYTHON_REQUEST_RETRIES, EPYTHON_REQUEST_INTERVAL,
+                                 EPYTHON_REQUEST_MAX_RETRY_AFTER)
+
+# The methods a server must treat the same way however many times they're sent (RFC 9110)
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "TRACE", "PUT", "DELETE"))
+
+# The statuses a RetryPolicy retries on by default (requests given no policy retry on none)
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+
+def _discard(response):
+    """ Hand the connection of a response that is about to be retried back to the pool, instead of
+    holding on to it through the wait (AsyncPokeResponses are already read, and have nothing to close).
+
+    Args:
+        response (requests.Response): The response being retried
+    """
+    close = getattr(response, "close", None)
+    if close is not None:
+        close()
+
+
+# pylint: disable=R0902
+class RetryPolicy:
+    """ When, and after how long, a poke request is retried. """
+
+    def __init__(self, retries=EPYTHON_REQUEST_RETRIES, interval=EPYTHON_REQUEST_INTERVAL, backoff=1,
+                 max_interval=None, statuses=RETRY_STATUSES, methods=IDEMPOTENT_METHODS,
+                 max_retry_after=EPYTHON_REQUEST_MAX_RETRY_AFTER, idempotency_header="Idempotency-Key"):
+        """ Constructor for the RetryPolicy
+
+        Args:
+            retries (int): The number of times to send a request, at most
+            interval (float): The wait before the first retry, when the server gave no Retry-After
+            backoff (float): What the wait is multiplied by after each retry (1 keeps it fixed)
+            max_interval (float): The longest wait between two retries (default: no limit)
+            statuses (iterable): The status codes to retry on
+            methods (iterable): The methods that are safe to retry on any failure
+            max_retry_after (float): The longest Retry-After to wait for, a response asking for longer
+                                     is returned as is instead of retried
+            idempotency_header (str): The header carrying an idempotency key, a request with it is safe
+                                      to retry whatever its method
+        """
+        self.retries = int(retries)
+        self.interval = float(interval)
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(method.upper() for method in methods)
+        self.max_retry_after = max_retry_after
+        self.idempotency_header = idempotency_header
+
+    def __repr__(self):
+        return (f"RetryPolicy(retries={self.retries}, interval={self.interval}, backoff={self.backoff}, "
+                f"statuses={sorted(self.statuses)}, methods={sorted(self.methods)})")
+
+    def with_idempotency_key(self, headers, key=True):
+        """ Add an idempotency key to the request headers, so a POST can be retried safely.
+
+        Args:
+            headers (dict): The request headers (left untouched)
+            key (bool|str): The key, or True for a random one
+
+        Returns:
+            (dict): A copy of the headers carrying the key
+        """
+        headers = dict(headers or {})
+        headers[self.idempotency_header] = str(uuid.uuid4()) if key is True else key
+        return headers
+
+    def is_idempotent(self, method, headers):
+        """ (bool): Whether a request is safe to send more than once """
+        if method.upper() in self.methods:
+            return True
+        return bool(headers) and any(name.lower() == self.idempotency_header.lower() for name in headers)
+
+    def _backoff(self, attempt):
+        """ (float): The wait before the retry after the given attempt (1 based) """
+        wait = self.interval * self.backoff ** (attempt - 1)
+        return wait if self.max_interval is None else min(wait, self.max_interval)
+
+    @staticmethod
+    def retry_after(response):
+        """ Parse the Retry-After header of a response.
+
+        Args:
+            response (requests.Response): The response
+
+        Returns:
+            (float): The seconds the server asked to wait for, None if it didn't (or the header is bogus)
+        """
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        value = value.strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+    def wait_after_response(self, attempt, method, headers, response):
+        """ Decide whether to retry a request the server answered.
+
+        Args:
+            attempt (int): The attempt that got the response (1 based)
+            method (str): The HTTP method of the request
+            headers (dict): The headers of the request
+            response (requests.Response): The response
+
+        Returns:
+            (float): The seconds to wait before retrying, None to return the response as is
+        """
+        if attempt >= self.retries or response.status_code not in self.statuses:
+            return None
+        retry_after = self.retry_after(response)
+        # A 429 (or a 503 with a Retry-After) turned the request away without acting on it
+        refused = response.status_code == 429 or (
+            response.status_code == 503 and retry_after is not None)
+        if not (refused or self.is_idempotent(method, headers)):
+            return None
+        if retry_after is None:
+            return self._backoff(attempt)
+        if self.max_retry_after is not None and retry_after > self.max_retry_after:
+            _LOG.warning("Not retrying, the server asked to wait %s seconds (more than %s)", retry_after,
+                         self.max_retry_after)
+            return None
+        return retry_after
+
+    def wait_after_exception(self, attempt, method, headers, exp, never_sent=False):
+        """ Decide whether to retry a request that failed with a retryable exception.
+
+        Args:
+            attempt (int): The attempt that failed (1 based)
+            method (str): The HTTP method of the request
+            headers (dict): The headers of the request
+            exp (Exception): The exception
+            never_sent (bool): Whether the request surely never reached the server
+
+        Returns:
+            (float): The seconds to wait before retrying, None to raise the exception
+        """
+        if attempt >= self.retries:
+            return None
+        if not (never_sent or self.is_idempotent(method, headers)):
+            _LOG.warning("Not retrying %s, it may have reached the server before failing with: %s",
+                         method, exp)
+            return None
+        return self._backoff(attempt)
+
+    def call(self, send, method, headers, exceptions, never_sent):
+        """ Send a request, retrying it as the policy allows.
+
+        Args:
+            send (func): Sends one attempt, returning the response
+            method (str): The HTTP method of the request
+            headers (dict): The headers of the request
+            exceptions (tuple): The exceptions worth retrying on
+            never_sent (func): Tells whether an exception means the request never reached the server
+
+        Returns:
+            (requests.Response): The last response
+        """
+        attempt = 1
+        while True:
+            try:
+                response = send()
+            except exceptions as exp:
+                _LOG.error("%s request failed to execute due to:\n%s", method, exp)
+                wait = self.wait_after_exception(attempt, method, headers, exp, never_sent(exp))
+                if wait is None:
+                    raise
+            else:
+                wait = self.wait_after_response(attempt, method, headers, response)
+                if wait is None:
+                    return response
+                _LOG.error("%s request got a %s", method, response.status_code)
+                _discard(response)
+
+            _LOG.debug("Waiting for %s seconds and then retrying up to %s more times...", wait,
+                       self.retries - attempt)
+            time.sleep(wait)
+            attempt += 1
+
+    async def call_async(self, send, method, headers, exceptions, never_sent):
+        """ The coroutine flavor of RetryPolicy.call, where waits between retries use asyncio.sleep """
+        attempt = 1
+        while True:
+            try:
+                response = await send()
+            except exceptions as exp:
+                _LOG.error("%s request failed to execute due to:\n%s", method, exp)
+                wait = self.wait_after_exception(attempt, method, headers, exp, never_sent(exp))
+                if wait is None:
+                    raise
+            else:
+                wait = self.wait_after_response(attempt, method, headers, response)
+                if wait is None:
+                    return response
+                _LOG.error("%s request got a %s", method, response.status_code)
+                _discard(response)
+
+            _LOG.debug("Waiting for %s seconds and then retrying up to %s more times...", wait,
+                       self.retries - attempt)
+            await asyncio.sleep(wait)
+            attempt += 1
+# pylint: enable=R0902
+
+
+def resolve(policy, retries, interval, headers, idempotency_key=None):
+    """ Pick the retry policy of a request, and add its idempotency key to its headers.
+
+    Args:
+        policy (RetryPolicy): The policy given to the request, if any (else one that retries on no
+                              status)
+        retries (int): The number of times to send the request, when no policy was given
+        interval (float): The wait between retries, when no policy was given
+        headers (dict): The request headers
+        idempotency_key (bool|str): The idempotency key to send (True for a random one), if any
+
+    Returns:
+        (tuple): The RetryPolicy, and the headers to send
+    """
+    if policy is None:
+        policy = RetryPolicy(retries=retries, interval=interval, statuses=())
+    if idempotency_key:
+        headers = policy.with_idempotency_key(headers, idempotency_key)
+    return policy, headers
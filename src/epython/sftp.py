@@ -0,0 +1,660 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains the SFTP transfer engine used by the ssh util. Every helper works on an
+    already connected paramiko.SSHClient, so connection handling (pooling, retries) stays in the ssh
+    module.
+
+    Reads and writes are pipelined, so throughput isn't capped at one chunk per round trip. Large
+    downloads are split into ranges that are fetched in parallel over their own SFTP channels, and an
+    interrupted transfer can pick up where it left off. Directory trees can be kept in sync by only
+    transferring the files that changed.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import hashlib
+import os
+import posixpath
+import shlex
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from epython import channels
+from epython import errors
+from epython.environment import _LOG
+
+# The number of bytes handed to each read/write call
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Files at least this big are downloaded as parallel ranges
+DEFAULT_PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# The number of SFTP channels a parallel download is spread over
+DEFAULT_MAX_WORKERS = 4
+
+# The directions a directory can be synced in
+SYNC_DIRECTIONS = ("get", "put")
+
+# Quick checks for the GNU find, sha256sum and xargs options the batched sync commands rely on
+GNU_FIND_PROBE = "find / -maxdepth 0 -printf ''"
+GNU_HASH_PROBE = "sha256sum -z /dev/null && printf '' | xargs -0 -r true"
+
+# The RC a batched sync command exits with when its probe failed
+NO_GNU_TOOLS_RC = 99
+
+
+class TransferProgress:
+    """ Thread-safe byte counter that reports transfer progress to an optional callback. """
+
+    def __init__(self, total, transferred=0, callback=None):
+        """ Constructor for the TransferProgress
+
+        Args:
+            total (int): The total number of bytes the transfer will have moved when done
+            transferred (int): The number of bytes that were already in place (e.g. when resuming)
+            callback (func): Called as callback(transferred, total, bytes_per_second) after every chunk
+        """
+        self.total = total
+        self.transferred = transferred
+        self.callback = callback
+        self._start_bytes = transferred
+        self._start_time = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self):
+        """ (float): The throughput of this transfer in bytes per second """
+        elapsed = time.time() - self._start_time
+        return (self.transferred - self._start_bytes) / elapsed if elapsed > 0 else 0.0
+
+    def add(self, num_bytes):
+        """ Record that more bytes were moved.
+
+        Args:
+            num_bytes (int): The number of bytes moved since the last call
+        """
+        with self._lock:
+            self.transferred += num_bytes
+            transferred = self.transferred
+        if self.callback:
+            self.callback(transferred, self.total, self.rate)
+
+
+def _is_remote_dir(session, path):
+    """ Check whether a remote path is an existing directory.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        path (str): The remote path
+
+    Returns:
+        (bool): Whether or not the path is a directory
+    """
+    try:
+        return stat.S_ISDIR(session.stat(path).st_mode)
+    except IOError:
+        return False
+
+
+def _remote_size(session, path):
+    """ The size of a remote file, or None when it doesn't exist.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        path (str): The remote path
+
+    Returns:
+        (int): The size in bytes
+    """
+    try:
+        return session.stat(path).st_size
+    except IOError:
+        return None
+
+
+def _split_ranges(start, end, parts):
+    """ Split [start, end) into contiguous ranges of roughly equal size.
+
+    Args:
+        start (int): The first byte
+        end (int): One past the last byte
+        parts (int): The number of ranges to split into
+
+    Returns:
+        (list): (offset, length) tuples in order
+    """
+    size = end - start
+    step = -(-size // parts)
+    return [(offset, min(step, end - offset)) for offset in range(start, end, step)]
+
+
+def _local_resume_offset(local_path, size):
+    """ Work out where a download can pick up from a partial local file.
+
+    Args:
+        local_path (str): The local file
+        size (int): The size of the remote file
+
+    Returns:
+        (int): The offset to resume from
+    """
+    if not os.path.exists(local_path):
+        return 0
+
+    start = os.path.getsize(local_path)
+    if start > size:
+        _LOG.debug("Local file %s is larger than the remote file, starting over", local_path)
+        return 0
+    return start
+
+
+def _fetch_range(client, remote_file, local_file, byte_range, chunk_size, done, progress):
+    """ Download one byte range of a remote file over its own SFTP channel.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        remote_file (str): The remote file
+        local_file (str): The local file to write the range into
+        byte_range (tuple): The (offset, length) of the range
+        chunk_size (int): The number of bytes per read request
+        done (list): A single item list the number of bytes written so far is kept in
+        progress (TransferProgress): The progress of the whole download
+    """
+    offset, length = byte_range
+    end = offset + length
+    chunks = [(pos, min(chunk_size, end - pos)) for pos in range(offset, end, chunk_size)]
+
+    with client.open_sftp() as session:
+        with session.open(remote_file, "rb") as remote, open(local_file, "r+b") as local:
+            local.seek(offset)
+            # readv pipelines every request of the range instead of waiting on each chunk
+            for data in remote.readv(chunks):
+                local.write(data)
+                done[0] += len(data)
+                progress.add(len(data))
+
+
+def _fetch_sequential(session, remote_file, local_file, start, chunk_size, progress):
+    """ Download a remote file from an offset onwards over a single, prefetching SFTP channel.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        remote_file (str): The remote file
+        local_file (str): The local file to write into
+        start (int): The offset to start at
+        chunk_size (int): The number of bytes per read
+        progress (TransferProgress): The progress of the download
+    """
+    with session.open(remote_file, "rb") as remote, open(local_file, "r+b") as local:
+        remote.seek(start)
+        local.seek(start)
+        remote.prefetch(progress.total)
+        while True:
+            data = remote.read(chunk_size)
+            if not data:
+                break
+            local.write(data)
+            progress.add(len(data))
+
+
+def _unbroken_prefix(ranges, done):
+    """ Count the bytes of a parallel download that were written without a gap from the start.
+
+    Args:
+        ranges (list): The (offset, length) of each range, in order
+        done (list): The number of bytes written for each range
+
+    Returns:
+        (int): The number of contiguous bytes written
+    """
+    complete = 0
+    for (_, length), range_done in zip(ranges, done):
+        complete += range_done
+        if range_done < length:
+            break
+    return complete
+
+
+def _fetch_parallel(client, remote_file, local_file, start, chunk_size, max_workers, progress):
+    """ Download a remote file from an offset onwards as ranges fetched in parallel.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        remote_file (str): The remote file
+        local_file (str): The local file to write into
+        start (int): The offset to start at
+        chunk_size (int): The number of bytes per read request
+        max_workers (int): The number of ranges (and SFTP channels) to split the download into
+        progress (TransferProgress): The progress of the download
+    """
+    ranges = _split_ranges(start, progress.total, max_workers)
+    done = [[0] for _ in ranges]
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_fetch_range, client, remote_file, local_file, byte_range,
+                                       chunk_size, range_done, progress)
+                       for byte_range, range_done in zip(ranges, done)]
+            for future in futures:
+                future.result()
+    except BaseException:
+        # Only keep the unbroken prefix of what was written, so a resume can't skip over a hole
+        with open(local_file, "r+b") as local:
+            local.truncate(start + _unbroken_prefix(ranges, [range_done for range_done, in done]))
+        raise
+
+
+def download(client, remote_file, local_path, chunk_size=DEFAULT_CHUNK_SIZE,
+             max_workers=DEFAULT_MAX_WORKERS, parallel_threshold=DEFAULT_PARALLEL_THRESHOLD,
+             resume=False, progress=None):
+    """ Download a remote file over SFTP.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        remote_file (str): The remote file to retrieve
+        local_path (str): The local file, or an existing directory to put the file into
+        chunk_size (int): The number of bytes per read request
+        max_workers (int): The number of SFTP channels to spread a large download over
+        parallel_threshold (int): The number of bytes left to fetch at which the download goes parallel
+        resume (bool): Continue from a partially downloaded local file instead of starting over
+        progress (func): Called as progress(transferred, total, bytes_per_second) as data arrives
+
+    Returns:
+        (str): The path of the local file
+    """
+    if os.path.isdir(local_path):
+        local_path = os.path.join(local_path, posixpath.basename(remote_file))
+
+    with client.open_sftp() as session:
+        size = session.stat(remote_file).st_size
+
+        start = _local_resume_offset(local_path, size) if resume else 0
+
+        # Make sure the local file exists and holds nothing past what is being kept
+        with open(local_path, "r+b" if start else "wb") as local:
+            local.truncate(start)
+
+        tracker = TransferProgress(size, transferred=start, callback=progress)
+        if size - start < parallel_threshold or max_workers < 2:
+            _fetch_sequential(session, remote_file, local_path, start, chunk_size, tracker)
+            return local_path
+
+    _fetch_parallel(client, remote_file, local_path, start, chunk_size, max_workers, tracker)
+    return local_path
+
+
+def upload(client, local_file, remote_path=".", chunk_size=DEFAULT_CHUNK_SIZE, resume=False,
+           progress=None):
+    """ Upload a local file over SFTP with pipelined writes.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        local_file (str): The local file to send
+        remote_path (str): The remote file, or an existing remote directory to put the file into
+        chunk_size (int): The number of bytes per write request
+        resume (bool): Continue from a partially uploaded remote file instead of starting over
+        progress (func): Called as progress(transferred, total, bytes_per_second) as data is sent
+
+    Returns:
+        (str): The path of the remote file
+    """
+    if isinstance(remote_path, bytes):
+        remote_path = remote_path.decode()
+    size = os.path.getsize(local_file)
+
+    with client.open_sftp() as session:
+        if _is_remote_dir(session, remote_path):
+            remote_path = posixpath.join(remote_path, os.path.basename(local_file))
+
+        start = 0
+        if resume:
+            start = _remote_size(session, remote_path) or 0
+            if start > size:
+                raise errors.ssh.SSHError(f"Remote file {remote_path} is larger than {local_file}, "
+                                          f"refusing to resume")
+
+        tracker = TransferProgress(size, transferred=start, callback=progress)
+        with open(local_file, "rb") as local, \
+                session.open(remote_path, "ab" if start else "wb") as remote:
+            # Don't wait for the server to acknowledge each write before sending the next one
+            remote.set_pipelined(True)
+            local.seek(start)
+            while True:
+                data = local.read(chunk_size)
+                if not data:
+                    break
+                remote.write(data)
+                tracker.add(len(data))
+
+    return remote_path
+
+
+def _run_gnu(client, probe, cmd, data=b""):
+    """ Run a command on the remote host that relies on GNU tools, unless a probe shows they're missing.
+
+    A command that fails part way through (e.g. on an unreadable file) still hands back what it
+    managed, the failure is only logged.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        probe (str): A command that only succeeds when the tools are there
+        cmd (str): The command to run
+        data (bytes): Data to feed to the command on standard in
+
+    Returns:
+        (bytes): The standard out of the command, or None when the probe failed
+    """
+    ret_code, output, stderr = channels.collect_channel(
+        client.get_transport(), f"{{ {probe}; }} >/dev/null 2>&1 || exit {NO_GNU_TOOLS_RC}; {cmd}", data)
+    if ret_code == NO_GNU_TOOLS_RC:
+        return None
+    if ret_code != 0:
+        _LOG.warning("'%s' returned %s, going on with its partial output:\n%s", cmd, ret_code,
+                     stderr.decode(errors="replace").strip())
+    return output
+
+
+def _split_records(output, fields):
+    """ Split NUL delimited command output into records.
+
+    Args:
+        output (bytes): The raw command output
+        fields (int): The number of fields per record
+
+    Returns:
+        (list): A tuple of decoded fields per record
+    """
+    values = [value.decode("utf-8", "surrogateescape") for value in output.split(b"\0")[:-1]]
+    return [tuple(values[idx:idx + fields]) for idx in range(0, len(values), fields)]
+
+
+def _remote_tree(client, session, remote_dir):
+    """ List every file under a remote directory, with one command when the remote has GNU find.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        session (paramiko.SFTPClient): The SFTP session to walk the tree with when it doesn't
+        remote_dir (str): The remote directory
+
+    Returns:
+        (dict): A mapping of relative path to (size, mtime)
+    """
+    quoted = shlex.quote(remote_dir)
+    output = _run_gnu(client, GNU_FIND_PROBE,
+                      f"[ ! -d {quoted} ] || find {quoted} -type f -printf '%P\\0%s\\0%T@\\0'")
+    if output is None:
+        _LOG.debug("No GNU find on the remote host, listing '%s' over SFTP", remote_dir)
+        return _sftp_tree(session, remote_dir)
+    return {path: (int(size), int(float(mtime)))
+            for path, size, mtime in _split_records(output, 3)}
+
+
+def _sftp_tree(session, remote_dir):
+    """ List every file under a remote directory by walking it over SFTP, a round trip per directory.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        remote_dir (str): The remote directory
+
+    Returns:
+        (dict): A mapping of relative path to (size, mtime)
+    """
+    tree, pending = {}, [""]
+    while pending:
+        relpath = pending.pop()
+        try:
+            directory = posixpath.join(remote_dir, relpath) if relpath else remote_dir
+            entries = session.listdir_attr(directory)
+        except IOError as exp:
+            if relpath or not isinstance(exp, FileNotFoundError):
+                _LOG.warning("Failed to list '%s' under '%s', skipping it: %s", relpath, remote_dir, exp)
+            continue
+        for entry in entries:
+            path = f"{relpath}/{entry.filename}" if relpath else entry.filename
+            if stat.S_ISDIR(entry.st_mode):
+                pending.append(path)
+            elif stat.S_ISREG(entry.st_mode):
+                tree[path] = (entry.st_size, int(entry.st_mtime))
+    return tree
+
+
+def _local_tree(local_dir):
+    """ List every file under a local directory.
+
+    Args:
+        local_dir (str): The local directory
+
+    Returns:
+        (dict): A mapping of relative path (with / separators) to (size, mtime)
+    """
+    tree = {}
+    for root, _, files in os.walk(local_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            info = os.stat(path)
+            relpath = os.path.relpath(path, local_dir).replace(os.sep, "/")
+            tree[relpath] = (info.st_size, int(info.st_mtime))
+    return tree
+
+
+def _remote_hashes(client, session, remote_dir, paths):
+    """ Hash a batch of remote files, with one command when the remote has GNU sha256sum.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        session (paramiko.SFTPClient): The SFTP session to read the files through when it doesn't
+        remote_dir (str): The directory the paths are relative to
+        paths (list): The relative paths to hash
+
+    Returns:
+        (dict): A mapping of relative path to its sha256 hex digest (unreadable files are left out)
+    """
+    # The paths go over standard in, so odd file names never have to survive the shell
+    cmd = f"cd {shlex.quote(remote_dir)} && xargs -0 -r sha256sum -z --"
+    data = b"".join(path.encode("utf-8", "surrogateescape") + b"\0" for path in paths)
+    output = _run_gnu(client, GNU_HASH_PROBE, cmd, data=data)
+    if output is None:
+        _LOG.debug("No GNU sha256sum on the remote host, hashing under '%s' over SFTP", remote_dir)
+        return _sftp_hashes(session, remote_dir, paths)
+
+    hashes = {}
+    for line, in _split_records(output, 1):
+        digest, path = line.split("  ", 1)
+        hashes[path] = digest
+    return hashes
+
+
+def _sftp_hashes(session, remote_dir, paths):
+    """ Hash remote files by reading them over SFTP.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        remote_dir (str): The directory the paths are relative to
+        paths (list): The relative paths to hash
+
+    Returns:
+        (dict): A mapping of relative path to its sha256 hex digest (unreadable files are left out)
+    """
+    hashes = {}
+    for path in paths:
+        digest = hashlib.sha256()
+        try:
+            with session.open(posixpath.join(remote_dir, path), "rb") as remote:
+                remote.prefetch()
+                while True:
+                    data = remote.read(DEFAULT_CHUNK_SIZE)
+                    if not data:
+                        break
+                    digest.update(data)
+        except IOError as exp:
+            _LOG.warning("Failed to hash '%s' under '%s': %s", path, remote_dir, exp)
+            continue
+        hashes[path] = digest.hexdigest()
+    return hashes
+
+
+def _local_hash(path):
+    """ Hash a local file.
+
+    Args:
+        path (str): The local file
+
+    Returns:
+        (str): The sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as local:
+        for data in iter(lambda: local.read(DEFAULT_CHUNK_SIZE), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def _remote_makedirs(session, path, made):
+    """ Create a remote directory and any missing parents.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        path (str): The remote directory
+        made (set): The directories already known to exist, which is updated in place
+    """
+    if not path or path in made:
+        return
+    parent = posixpath.dirname(path)
+    if parent != path:
+        _remote_makedirs(session, parent, made)
+    if not _is_remote_dir(session, path):
+        session.mkdir(path)
+    made.add(path)
+
+
+def _changed_files(client, session, local_dir, remote_dir, direction, checksum):
+    """ Work out which files differ between the source and destination trees.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        session (paramiko.SFTPClient): The SFTP session
+        local_dir (str): The local directory
+        remote_dir (str): The remote directory
+        direction (str): "get" to mirror remote to local, "put" to mirror local to remote
+        checksum (bool): Confirm files that only differ in mtime by comparing their hashes
+
+    Returns:
+        (tuple): The relative paths to transfer, the ones whose content matched but mtime didn't, and
+                 the ones that couldn't be hashed on the remote host
+    """
+    source, destination = _remote_tree(client, session, remote_dir), _local_tree(local_dir)
+    if direction == "put":
+        source, destination = destination, source
+
+    changed, suspect = [], []
+    for path, (size, mtime) in sorted(source.items()):
+        if path not in destination or destination[path][0] != size:
+            changed.append(path)
+        elif destination[path][1] != mtime:
+            (suspect if checksum else changed).append(path)
+
+    touched, skipped = _compare_hashes(client, session, local_dir, remote_dir, suspect, changed)
+    return changed, touched, skipped
+
+
+def _compare_hashes(client, session, local_dir, remote_dir, paths, changed):
+    """ Compare the local and remote copies of files by their hashes.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        session (paramiko.SFTPClient): The SFTP session
+        local_dir (str): The local directory
+        remote_dir (str): The remote directory
+        paths (list): The relative paths to compare
+        changed (list): The paths to transfer, which the ones whose content differs are added to
+
+    Returns:
+        (tuple): The relative paths whose content matched, and the ones that couldn't be hashed remotely
+    """
+    same, skipped = [], []
+    remote_hashes = _remote_hashes(client, session, remote_dir, paths) if paths else {}
+    for path in paths:
+        if path not in remote_hashes:
+            skipped.append(path)
+        elif remote_hashes[path] == _local_hash(os.path.join(local_dir, *path.split("/"))):
+            same.append(path)
+        else:
+            changed.append(path)
+    return same, skipped
+
+
+def _sync_file(session, local_dir, remote_dir, path, direction, made, copy=True):
+    """ Bring a single file on the destination in line with the source.
+
+    Args:
+        session (paramiko.SFTPClient): The SFTP session
+        local_dir (str): The local directory
+        remote_dir (str): The remote directory
+        path (str): The path of the file relative to both directories
+        direction (str): "get" to mirror remote to local, "put" to mirror local to remote
+        made (set): The remote directories already known to exist
+        copy (bool): Transfer the content, or only carry over the mtime
+    """
+    local_path = os.path.join(local_dir, *path.split("/"))
+    remote_path = posixpath.join(remote_dir, path)
+
+    if direction == "get":
+        mtime = session.stat(remote_path).st_mtime
+        if copy:
+            os.makedirs(os.path.dirname(local_path), exist_ok=True)
+            session.get(remote_path, local_path)
+        os.utime(local_path, (mtime, mtime))
+    else:
+        mtime = os.stat(local_path).st_mtime
+        if copy:
+            _remote_makedirs(session, posixpath.dirname(remote_path), made)
+            session.put(local_path, remote_path)
+        session.utime(remote_path, (mtime, mtime))
+
+
+def sync_dir(client, local_dir, remote_dir, direction="get", checksum=False):
+    """ Mirror a directory tree between the local and remote host, only transferring what changed.
+
+    Files are compared by size and mtime. With checksum enabled, files that only differ in mtime are
+    hashed (all remote files in one batched command) and are only transferred if the content differs.
+    The mtime of every synced file is carried over, so the next sync can skip it.
+
+    NOTE: Files that only exist on the destination are left alone.
+    NOTE: The remote tree is listed and hashed with GNU find and sha256sum. Without them (e.g. on BSD
+          or busybox) the tree is walked, and the files hashed, over SFTP instead, which is slower.
+          Remote directories and files that can't be read are skipped with a warning.
+
+    Args:
+        client (paramiko.SSHClient): The connected client
+        local_dir (str): The local directory
+        remote_dir (str): The remote directory
+        direction (str): "get" to mirror remote to local, "put" to mirror local to remote
+        checksum (bool): Confirm files that only differ in mtime by comparing their hashes
+
+    Returns:
+        (dict): The relative paths that were "transferred", the ones only "touched" to fix mtimes, and
+                the ones "skipped" since the remote copy couldn't be hashed
+    """
+    if direction not in SYNC_DIRECTIONS:
+        raise errors.ssh.SSHError(f"The sync direction '{direction}' is not supported, please use one "
+                                  f"of: {SYNC_DIRECTIONS}")
+
+    made = set()
+    with client.open_sftp() as session:
+        changed, touched, skipped = _changed_files(client, session, local_dir, remote_dir, direction,
+                                                   checksum)
+        for path in changed:
+            _sync_file(session, local_dir, remote_dir, path, direction, made)
+        for path in touched:
+            _sync_file(session, local_dir, remote_dir, path, direction, made, copy=False)
+
+    _LOG.debug("Synced '%s' %s '%s': %s transferred, %s touched, %s skipped", local_dir,
+               "<-" if direction == "get" else "->", remote_dir, len(changed), len(touched),
+               len(skipped))
+    return {"transferred": changed, "touched": touched, "skipped": skipped}
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains a persistent shell session that runs many commands, one after another, in
+    a single remote shell.
+
+    Every command is followed by a unique sentinel on both output streams, which marks where its
+    output ends and carries its exit code. Since it's all the same shell, the working directory,
+    environment variables and anything sourced carry over from one command to the next, and there
+    is no per-command channel setup.
+
+    NOTE: The remote login shell needs to be a POSIX shell (sh, bash, zsh, ...).
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import select
+import shlex
+import time
+import uuid
+
+from epython import channels
+from epython import errors
+from epython import ssh
+from epython.output import CommandResult
+
+
+class SSHShell:
+    """ A long-lived shell on a remote host that commands are run in one after another.
+
+    Example:
+        with SSHShell("host", "user", "pass") as shell:
+            shell.run("cd /opt/app && source env.sh")
+            stdout = shell.run("./setup.sh").check().stdout
+    """
+
+    def __init__(self, host, username, password, port=22, pkey=None, pooled=True, env=None,
+                 encoding="utf-8", jump=None):
+        """ Constructor for the SSHShell
+
+        Args:
+            host (str): The host that is being logged into
+            username (str): The username to use to log into the host
+            password (str): The password for the provided username
+            port (int): The port to connect ssh over
+            pkey (str): The path to the ssh key to use
+            pooled (bool): Whether or not to borrow the connection from the shared ssh connection pool
+            env (dict): Environment variables to export in the shell before any commands are run
+            encoding (str): The encoding of the command output
+            jump (JumpHost|str|list): Tunnel through this jump host, or chain of them (outermost first)
+        """
+        self.host = host
+        self.encoding = encoding
+        self.env = env or {}
+        self.channel = None
+        self._conn = ssh.SSHConnect(host, username, password, port=port, pkey=pkey,
+                                    pool=ssh.SSH_POOL if pooled else None, jump=jump)
+        self._buffers = {channels.STREAM_STDOUT: b"", channels.STREAM_STDERR: b""}
+
+    @property
+    def is_open(self):
+        """ (bool): Whether or not the shell is still running and accepting commands """
+        channel = self.channel
+        return channel is not None and not channel.closed and not channel.exit_status_ready()
+
+    def open(self, timeout=30):
+        """ Start the remote shell.
+
+        A shell is requested without a pty, so the shell doesn't echo commands back or print prompts,
+        and standard error is kept apart from standard out.
+
+        Args:
+            timeout (float): The time to wait for the shell to come up in seconds
+        """
+        client = self._conn.__enter__()  # pylint: disable=C2801
+        try:
+            self.channel = client.get_transport().open_session()
+            self.channel.invoke_shell()
+
+            # Sync up with the shell, dropping anything (like a motd) it printed on the way up
+            self.run(":", timeout=timeout)
+            for name, value in self.env.items():
+                self.run(f"export {name}={shlex.quote(str(value))}", timeout=timeout)
+        except BaseException as exp:
+            self.close(exp)
+            raise
+        return self
+
+    def close(self, exp=None):
+        """ Exit the remote shell and give the connection back.
+
+        Args:
+            exp (Exception): The exception that caused the close, if any (broken connections are not
+                             given back to the pool)
+        """
+        if self.channel is not None:
+            self.channel.close()
+            self.channel = None
+            self._conn.__exit__(type(exp) if exp else None, exp, None)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(exc_value)
+
+    def _receive(self, stream, data, marker):
+        """ Add data read off of the channel to a stream's buffer.
+
+        Returns:
+            (bool): Whether or not the stream's sentinel marker has shown up
+        """
+        self._buffers[stream] += data
+        # Only look at the newly read data (plus room for a marker split across reads)
+        return marker in self._buffers[stream][-(len(data) + len(marker)):]
+
+    def _read_until(self, marker, deadline):
+        """ Read both output streams until each one holds the sentinel marker.
+
+        Args:
+            marker (bytes): The sentinel marker to wait for
+            deadline (float): The time.monotonic() time to give up at (None waits forever)
+        """
+        done = {stream: marker in buffer for stream, buffer in self._buffers.items()}
+        while not all(done.values()):
+            if self.channel.recv_ready():
+                data = self.channel.recv(channels.CHANNEL_READ_SIZE)
+                done[channels.STREAM_STDOUT] = self._receive(channels.STREAM_STDOUT, data, marker)
+            elif self.channel.recv_stderr_ready():
+                data = self.channel.recv_stderr(channels.CHANNEL_READ_SIZE)
+                done[channels.STREAM_STDERR] = self._receive(channels.STREAM_STDERR, data, marker)
+            elif self.channel.exit_status_ready():
+                raise errors.ssh.SSHSessionClosed(f"The shell on '{self.host}' exited with status "
+                                                  f"{self.channel.recv_exit_status()}!")
+            elif deadline is not None and time.monotonic() > deadline:
+                raise errors.ssh.SSHTimeoutError(f"Timed out waiting on a command in the shell on "
+                                                 f"'{self.host}'")
+            else:
+                select.select([self.channel], [], [], 1.0)
+
+    def _take(self, stream, marker):
+        """ Pop the output in front of a stream's sentinel, along with the rest of the sentinel line.
+
+        Args:
+            stream (str): STREAM_STDOUT or STREAM_STDERR
+            marker (bytes): The sentinel marker
+
+        Returns:
+            (tuple): The output (bytes) and whatever followed the marker on its line (bytes)
+        """
+        output, _, rest = self._buffers[stream].partition(marker)
+        line, _, self._buffers[stream] = rest.partition(b"\n")
+        return output, line
+
+    def run(self, cmd, timeout=None, banner=False):
+        """ Run a command in the shell and wait for it to finish.
+
+        The command runs in the shell itself (not a subshell), so things like cd, export and source
+        stick around for the commands that follow. It's given /dev/null as standard in, so it can't
+        swallow the commands that follow it.
+
+        NOTE: A timed out command leaves the shell in an unknown state, so the session is closed.
+
+        Args:
+            cmd (str): The command to run
+            timeout (float): The time to wait for the command in seconds (None waits forever)
+            banner (bool): Whether or not to display the results in an info statement
+
+        Returns:
+            (CommandResult): The RC and output of the command, which unpacks like an (RC, Standard Out,
+                             Standard Error) tuple
+        """
+        if not self.is_open:
+            raise errors.ssh.SSHSessionClosed(f"The shell session on '{self.host}' is not open!")
+
+        token = f"__EPYTHON_{uuid.uuid4().hex}__:"
+        marker = token.encode()
+
+        # eval keeps a syntax error in the command from leaving the shell waiting on more input, and
+        # command keeps that error from making a strict POSIX shell exit
+        sentinels = f"printf '%s%s\\n' '{token}' \"$?\"; printf '%s\\n' '{token}' >&2"
+        self.channel.sendall(f"command eval {shlex.quote(cmd)} < /dev/null\n{sentinels}\n".encode())
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            self._read_until(marker, deadline)
+        except (errors.ssh.SSHError,) + ssh.SSH_BROKEN_CONN_EXCEPTIONS as exp:
+            self.close(exp)
+            raise
+
+        stdout, ret_code = self._take(channels.STREAM_STDOUT, marker)
+        stderr, _ = self._take(channels.STREAM_STDERR, marker)
+
+        ret_code = int(ret_code)
+        ssh._log_results(self.host, cmd, ret_code, stdout, stderr, banner=banner)  # pylint: disable=W0212
+        # The output is only decoded once it's used
+        return CommandResult(ret_code, stdout, stderr, host=self.host, cmd=cmd, encoding=self.encoding)
+
+    def run_many(self, cmds, timeout=None, stop_on_error=False):
+        """ Run a sequence of commands in the shell, one after another.
+
+        Args:
+            cmds (list): The commands to run
+            timeout (float): The time to wait for each command in seconds (None waits forever)
+            stop_on_error (bool): Stop at the first command with a non-zero return code
+
+        Returns:
+            (list): The CommandResult of every command that was run
+        """
+        results = []
+        for cmd in cmds:
+            results.append(self.run(cmd, timeout=timeout))
+            if stop_on_error and not results[-1].ok:
+                break
+        return results
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module contains the per-phase timing breakdown of ssh operations.
+
+    An operation is split into the phases below, so a slow run can be pinned on the network, on sshd
+    (reverse DNS lookups and PAM show up as slow authentication) or on the command itself:
+
+        dns, tcp_connect, tunnel, pool_acquire, key_exchange, authentication, channel_open, command,
+        output_drain, transfer, close
+
+    The key exchange is only timed with paramiko 3.2 or newer, older versions count it as authentication.
+
+    Breakdowns are handed to every registered sink once the operation is done. When no sink is
+    registered and the caller didn't ask for a breakdown, nothing is measured at all.
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+
+import functools
+import time
+from contextlib import contextmanager
+
+import paramiko
+
+from epython.environment import _LOG, EPYTHON_SSH_TIMING_LOG
+
+# The callables that get every finished breakdown
+_SINKS = []
+
+
+class SSHTimings:
+    """ The time spent in each phase of one ssh operation, along with the bytes it moved. """
+
+    enabled = True
+
+    def __init__(self, host=None, operation=None):
+        """ Constructor for the SSHTimings
+
+        Args:
+            host (str): The host the operation ran against
+            operation (str): The name of the operation (e.g. "execute_command")
+        """
+        self.host = host
+        self.operation = operation
+        self.phases = {}
+        self.bytes_transferred = None
+
+    def add(self, name, seconds):
+        """ Add time to a phase (phases hit more than once, like on a retry, add up).
+
+        Args:
+            name (str): The phase
+            seconds (float): The time spent in it
+        """
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name, exclusive=False):
+        """ Context manager that adds the time spent inside of it to a phase.
+
+        Args:
+            name (str): The phase
+            exclusive (bool): Leave out the time that phases nested inside of it already account for
+        """
+        began, accounted = time.perf_counter(), self.total
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - began
+            if exclusive:
+                elapsed -= self.total - accounted
+            self.add(name, elapsed)
+
+    def add_bytes(self, count):
+        """ Count bytes moved by a file operation.
+
+        Args:
+            count (int): The number of bytes
+        """
+        self.bytes_transferred = (self.bytes_transferred or 0) + count
+
+    def transport_factory(self, *args, **kwargs):
+        """ Stand in for paramiko.Transport that times the key exchange (see SSHClient.connect).
+
+        Returns:
+            (paramiko.Transport): The transport
+        """
+        transport = _TimedTransport(*args, **kwargs)
+        transport.timings = self
+        return transport
+
+    @property
+    def total(self):
+        """ (float): The time spent across all of the phases """
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        """ (dict): The breakdown as plain data, for logging or shipping off somewhere """
+        return {"host": self.host, "operation": self.operation, "phases": dict(self.phases),
+                "total": self.total, "bytes_transferred": self.bytes_transferred}
+
+    def __repr__(self):
+        phases = ", ".join(f"{name}={seconds:.4f}" for name, seconds in self.phases.items())
+        return f"SSHTimings({self.operation} on {self.host}: {phases}, bytes={self.bytes_transferred})"
+
+
+class _NullPhase:
+    """ A do-nothing context manager, so disabled timings cost a couple of attribute lookups. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _NoTimings:
+    """ Stands in for SSHTimings when nothing is being measured. """
+
+    enabled = False
+    phases = {}
+    _phase = _NullPhase()
+
+    def add(self, name, seconds):
+        """ Ignore time added to a phase. """
+
+    def phase(self, _name, exclusive=False):  # pylint: disable=W0613
+        """ (_NullPhase): A context manager that doesn't measure anything """
+        return self._phase
+
+    def add_bytes(self, count):
+        """ Ignore bytes moved by a file operation. """
+
+
+NO_TIMINGS = _NoTimings()
+
+
+class _TimedTransport(paramiko.Transport):
+    """ A paramiko.Transport that adds the time spent on the key exchange to its timings. """
+
+    timings = NO_TIMINGS
+
+    def start_client(self, event=None, timeout=None):
+        with self.timings.phase("key_exchange"):
+            return super().start_client(event=event, timeout=timeout)
+
+
+def add_sink(sink):
+    """ Register a callable to be handed every finished SSHTimings.
+
+    Args:
+        sink (func): Called as sink(timings)
+    """
+    if sink not in _SINKS:
+        _SINKS.append(sink)
+
+
+def remove_sink(sink):
+    """ Stop handing finished SSHTimings to a callable.
+
+    Args:
+        sink (func): A sink that was registered with add_sink
+    """
+    if sink in _SINKS:
+        _SINKS.remove(sink)
+
+
+def log_sink(timings):
+    """ A sink that logs each breakdown at debug.
+
+    Args:
+        timings (SSHTimings): The finished breakdown
+    """
+    _LOG.debug("SSH timings for %s on %s: %s (total: %.4fs, bytes: %s)", timings.operation, timings.host,
+               ", ".join(f"{name}={seconds:.4f}s" for name, seconds in timings.phases.items()),
+               timings.total, timings.bytes_transferred)
+
+
+def start(host, operation, timings=None):
+    """ Get what an operation should record its timings into.
+
+    Args:
+        host (str): The host the operation runs against
+        operation (str): The name of the operation
+        timings (SSHTimings): The breakdown the caller asked to have filled in, if any
+
+    Returns:
+        (SSHTimings): The caller's breakdown, a new one when a sink is registered, or NO_TIMINGS
+    """
+    if timings is None:
+        if not _SINKS:
+            return NO_TIMINGS
+        timings = SSHTimings()
+    timings.host = host
+    timings.operation = operation
+    return timings
+
+
+def finish(timings):
+    """ Hand a finished breakdown to every registered sink.
+
+    Args:
+        timings (SSHTimings): The finished breakdown
+    """
+    if not timings.enabled:
+        return
+    for sink in list(_SINKS):
+        # A broken sink must never break the operation it measured
+        # pylint: disable=W0703
+        try:
+            sink(timings)
+        except Exception as exp:
+            _LOG.error("SSH timing sink %s failed due to:\n%s", sink, exp)
+        # pylint: enable=W0703
+
+
+def timed(operation):
+    """ Decorator that times an ssh helper and hands the breakdown to the sinks once it returns.
+
+    The helper must take the host as its first argument and a timings keyword argument, which it gets
+    handed whatever start() picked. Put this outside of any retry handler, so retries add up into one
+    breakdown.
+
+    Args:
+        operation (str): The name of the operation
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(host, *args, timings=None, **kwargs):
+            timings = start(host, operation, timings)
+            try:
+                return func(host, *args, timings=timings, **kwargs)
+            finally:
+                finish(timings)
+        return wrapper
+    return decorator
+
+
+if EPYTHON_SSH_TIMING_LOG:
+    add_sink(log_sink)
@@ -9,3 +9,149 @@ Author:
 Date:
     12/14/20
 """
+import json
+import os
+import select
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _EchoHandler(BaseHTTPRequestHandler):
+    """ Answers every request with the method, the client port and the headers it was sent.
+
+    A path of /slow answers after a second, /status/<code> answers with that status code, /etag answers
+    with an ETag (and a 304 when it's sent back in If-None-Match), and /nostore forbids caching.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _echo(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path.startswith("/slow"):
+            time.sleep(1)
+        status = int(self.path.split("/")[2]) if self.path.startswith("/status/") else 200
+
+        etag = f'"{self.path}"'
+        if self.path.startswith("/etag") and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = json.dumps({"method": self.command, "path": self.path, "port": self.client_address[1],
+                           "headers": dict(self.headers)}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "bogus=cookie; Path=/")
+        if self.path.startswith("/etag"):
+            self.send_header("ETag", etag)
+        if self.path.startswith("/nostore"):
+            self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _echo
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture(scope="session")
+def http_url():
+    """ Fixture that provides the URL of a local keep-alive HTTP server """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _EchoHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+
+    server.shutdown()
+    server.server_close()
+
+
+class _LocalChannel:
+    """ A stand in for paramiko.Channel whose command runs locally, as a subprocess fed over pipes.
+
+    Pipes have a much smaller buffer than a channel window, so a helper that writes all of standard in
+    before reading any output deadlocks against it quickly.
+    """
+
+    def __init__(self, shell="bash"):
+        self.shell = shell
+        self.proc = None
+        self.closed = False
+        self._eof = {"stdout": False, "stderr": False}
+
+    def exec_command(self, cmd):
+        self.proc = subprocess.Popen([self.shell, "-c", cmd], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+
+    def makefile(self, mode):
+        return self.proc.stdin if "w" in mode else self.proc.stdout
+
+    def makefile_stderr(self, *_args):
+        return self.proc.stderr
+
+    def fileno(self):
+        return self.proc.stdout.fileno()
+
+    def send_ready(self):
+        return bool(select.select([], [self.proc.stdin], [], 0)[1])
+
+    def send(self, data):
+        os.set_blocking(self.proc.stdin.fileno(), False)
+        try:
+            return os.write(self.proc.stdin.fileno(), data)
+        except BlockingIOError:
+            return 0
+
+    def shutdown_write(self):
+        if not self.proc.stdin.closed:
+            self.proc.stdin.close()
+
+    def _ready(self, name):
+        return not self._eof[name] and bool(select.select([getattr(self.proc, name)], [], [], 0)[0])
+
+    def _recv(self, name, size):
+        data = os.read(getattr(self.proc, name).fileno(), size)
+        self._eof[name] = not data
+        return data
+
+    def recv_ready(self):
+        return self._ready("stdout")
+
+    def recv_stderr_ready(self):
+        return self._ready("stderr")
+
+    def recv(self, size):
+        return self._recv("stdout", size)
+
+    def recv_stderr(self, size):
+        return self._recv("stderr", size)
+
+    @property
+    def eof_received(self):
+        return all(self._eof.values())
+
+    def recv_exit_status(self):
+        return self.proc.wait()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(scope="session")
+def local_session():
+    """ Fixture that provides a stand in for paramiko.Transport.open_session whose commands run locally.
+
+    Call it with the shell to run the commands with (bash by default).
+    """
+    return _LocalChannel
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Tests around the asyncio flavor of the poke request helpers
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+
+from epython import errors
+from epython import poke
+from epython.poke import aiopoke
+
+
+def _run(coro):
+    """ Run a coroutine to completion on a fresh event loop, closing the loop's shared session after.
+
+    Args:
+        coro (coroutine): The coroutine to run
+
+    Returns:
+        (object): Whatever the coroutine returns
+    """
+    async def run_and_close():
+        try:
+            return await coro
+        finally:
+            await aiopoke.close_default_session()
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(run_and_close())
+    finally:
+        loop.close()
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_requests(http_url):
+    """ Test the async helpers share one pooled session per loop and keep the poke headers
+
+    Steps:
+        1) Send many requests at once with every method through the module helpers
+        2) Validate no more connections were opened than the per host limit
+        3) Validate the poke headers and the response helpers
+    """
+    pytest.importorskip("aiohttp")
+
+    async def send_all():
+        assert aiopoke.default_session() is aiopoke.default_session()
+        calls = [aiopoke.get, aiopoke.post, aiopoke.put, aiopoke.delete] * 10
+        return await asyncio.gather(*(call(f"{http_url}/{idx}", timeout=5)
+                                      for idx, call in enumerate(calls)))
+
+    responses = _run(send_all())
+    bodies = [response.json() for response in responses]
+
+    assert [body["method"] for body in bodies[:4]] == ["GET", "POST", "PUT", "DELETE"]
+    assert len({body["port"] for body in bodies}) <= aiopoke.EPYTHON_REQUEST_POOL_MAXSIZE
+    assert bodies[0]["headers"]["X-Request-ID"] == aiopoke.POKE_HEADERS["X-Request-ID"]
+    assert all(response.ok for response in responses)
+
+    response = _run(aiopoke.get(f"{http_url}/status/404", headers={"X-Bogus": "1"}))
+    assert (response.status_code, response.ok) == (404, False)
+    assert response.json()["headers"]["X-Bogus"] == "1"
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_timeouts(http_url):
+    """ Test timed out attempts are retried without blocking the loop, and cancelling frees connections
+
+    Steps:
+        1) Time out every attempt of a slow request, validate each one was retried
+        2) Validate other work kept running on the loop while the retries waited
+        3) Cancel a slow request on a single connection session and validate the next one goes through
+    """
+    pytest.importorskip("aiohttp")
+
+    async def slow_with_ticks():
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.time())
+                await asyncio.sleep(.05)
+
+        ticker = asyncio.ensure_future(tick())
+        # pylint: disable=W0212
+        send = patch.object(session, "_send", wraps=session._send)
+        # pylint: enable=W0212
+        try:
+            async with session:
+                with send as mock_send, pytest.raises(asyncio.TimeoutError):
+                    await session.get(f"{http_url}/slow", timeout=.2, retries=2, interval=.2)
+                assert mock_send.call_count == 2
+        finally:
+            ticker.cancel()
+        return ticks
+
+    session = aiopoke.AsyncPokeSession(limit_per_host=1)
+    assert len(_run(slow_with_ticks())) > 5, "The retries must not block the event loop"
+
+    async def cancel_then_send():
+        async with session:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(session.get(f"{http_url}/slow", retries=1), .2)
+            return await session.get(http_url, timeout=5)
+
+    assert _run(cancel_then_send()).ok
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_missing_aiohttp():
+    """ Test the async client says how to install aiohttp when it's missing """
+
+    with patch("epython.poke.aiopoke.aiohttp", None), \
+            pytest.raises(errors.poke.PokeException, match="aiohttp"):
+        aiopoke.AsyncPokeSession()
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_default_session_needs_loop():
+    """ Test the shared session is only handed out on a running loop, never on one made up for it """
+
+    with pytest.raises(RuntimeError):
+        aiopoke.default_session()
+    closing = aiopoke.close_default_session()
+    with pytest.raises(RuntimeError):
+        closing.send(None)
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_default_session_cleanup(http_url):
+    """ Test the shared sessions of closed loops aren't kept around
+
+    Steps:
+        1) Send a request through the module helpers on a few loops without closing their sessions
+        2) Validate each new loop's default session drops the ones of the closed loops
+        3) Validate close_default_session drops the last one
+    """
+    pytest.importorskip("aiohttp")
+
+    async def send():
+        return (await aiopoke.get(http_url, timeout=5)).status_code
+
+    for _ in range(3):
+        assert asyncio.run(send()) == 200
+        assert len(aiopoke._DEFAULT_SESSIONS) == 1  # pylint: disable=W0212
+
+    async def check_and_close():
+        aiopoke.default_session()
+        assert len(aiopoke._DEFAULT_SESSIONS) == 1  # pylint: disable=W0212
+        await aiopoke.close_default_session()
+
+    asyncio.run(check_and_close())
+    assert not aiopoke._DEFAULT_SESSIONS  # pylint: disable=W0212
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_aiopoke_circuit_breaker(http_url):
+    """ Test the async session fails fast once the circuit of a failing host opens """
+    pytest.importorskip("aiohttp")
+
+    breaker = poke.CircuitBreaker(failure_threshold=2, cooldown=60)
+
+    async def fail_then_fail_fast():
+        policy = poke.RetryPolicy(retries=5, interval=0)
+        async with aiopoke.AsyncPokeSession(breaker=breaker) as session:
+            with pytest.raises(errors.poke.CircuitOpenException):
+                await session.get(f"{http_url}/status/502", policy=policy)
+            with pytest.raises(errors.poke.CircuitOpenException):
+                await session.get(http_url)
+
+    _run(fail_then_fail_fast())
+    assert breaker.snapshot()[breaker.host(http_url)]["failures"] == 2
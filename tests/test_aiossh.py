@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module is used for testing the asyncio ssh utilities
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import asyncio
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from epython import aiossh
+from epython import errors
+from epython import ssh
+
+
+def _run(coro):
+    """ Run a coroutine to completion on a fresh event loop.
+
+    Args:
+        coro (coroutine): The coroutine to run
+
+    Returns:
+        (object): Whatever the coroutine returns
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+@pytest.fixture(scope="function")
+def fake_connect():
+    """ Fixture that provides a mocked SSHConnect.connect, whose clients are pooled in a fresh pool """
+    pool = ssh.SSHConnectionPool(keepalive=0)
+    with patch("epython.ssh.SSH_POOL", pool), patch("epython.ssh.SSHConnect.connect") as connect:
+        connect.pool = pool
+        yield connect
+
+
+@pytest.fixture(scope="function")
+def idle_pipe():
+    """ Fixture that provides the read end of a pipe nothing is ever written to. """
+    read_fd, write_fd = os.pipe()
+    yield read_fd
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_execute_command(fake_connect):
+    """ Test the async execute_command reads both streams and returns the same tuple as the sync path
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+
+    Steps:
+        1) Mock the connection and the channel output
+        2) Validate the RC, stdout and stderr are returned
+        3) Validate the channel was closed and the connection handed back for reuse
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+
+    stdout_chunks, stderr_chunks = [b"Bogus ", b"STDOUT\n"], [b"Bogus STDERR\n"]
+    channel = MagicMock()
+    channel.recv_ready.side_effect = lambda: bool(stdout_chunks)
+    channel.recv_stderr_ready.side_effect = lambda: bool(stderr_chunks)
+    channel.recv.side_effect = lambda _size: stdout_chunks.pop(0)
+    channel.recv_stderr.side_effect = lambda _size: stderr_chunks.pop(0)
+    channel.exit_status_ready.return_value = True
+    channel.recv_exit_status.return_value = 2
+    fake_connect.return_value.get_transport.return_value.open_session.return_value = channel
+
+    result = _run(aiossh.execute_command(host, username, password, "ls", timeout=5))
+
+    assert result == (2, "Bogus STDOUT", "Bogus STDERR")
+    channel.exec_command.assert_called_with("ls")
+    channel.close.assert_called()
+
+    _run(aiossh.execute_command(host, username, password, "ls", timeout=5))
+    assert fake_connect.call_count == 1
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_execute_command_timeout(fake_connect, idle_pipe):
+    """ Test the async execute_command gives up after the timeout and closes the channel
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+        idle_pipe (int): Fixture that provides a file descriptor that never becomes readable
+    """
+
+    channel = MagicMock()
+    channel.recv_ready.return_value = False
+    channel.recv_stderr_ready.return_value = False
+    channel.exit_status_ready.return_value = False
+    channel.eof_received, channel.closed = False, False
+    channel.fileno.return_value = idle_pipe
+    fake_connect.return_value.get_transport.return_value.open_session.return_value = channel
+
+    with pytest.raises(errors.ssh.SSHTimeoutError):
+        _run(aiossh.execute_command("localhost", "bogus_user", "bogus_pass", "sleep 100", timeout=.2))
+
+    channel.close.assert_called()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_execute_command_pool_contention(fake_connect):
+    """ Test many more concurrent commands than pooled connections all finish
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+
+    Steps:
+        1) Limit the pool to two connections per host, with slow connects
+        2) Run ten times as many commands as there are aiossh threads at once
+        3) Validate every command finished and no more than two connections were ever opened
+    """
+
+    def new_channel():
+        channel = MagicMock()
+        channel.recv_ready.return_value = False
+        channel.recv_stderr_ready.return_value = False
+        channel.eof_received, channel.closed = True, False
+        channel.recv_exit_status.return_value = 0
+        return channel
+
+    def connect():
+        time.sleep(.05)
+        client = MagicMock()
+        client.get_transport.return_value.open_session.side_effect = new_channel
+        return client
+
+    fake_connect.pool.max_per_host = 2
+    fake_connect.side_effect = connect
+
+    async def run_all():
+        calls = [aiossh.execute_command("localhost", "user", "pass", f"echo {idx}")
+                 for idx in range(aiossh.EPYTHON_SSH_MAX_WORKERS * 10)]
+        return await asyncio.wait_for(asyncio.gather(*calls), 30)
+
+    results = _run(run_all())
+
+    assert len(results) == aiossh.EPYTHON_SSH_MAX_WORKERS * 10 and all(result.ok for result in results)
+    assert fake_connect.call_count == 2
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_remote_file_exists(fake_connect):
+    """ Test the async remote_file_exists quotes the path, like the blocking one
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+    """
+
+    channel = MagicMock()
+    channel.recv_ready.return_value = False
+    channel.recv_stderr_ready.return_value = False
+    channel.eof_received, channel.closed = True, False
+    channel.recv_exit_status.return_value = 1
+    fake_connect.return_value.get_transport.return_value.open_session.return_value = channel
+
+    assert not _run(aiossh.remote_file_exists("localhost", "user", "pass", "/tmp/a b; rm -rf ~"))
+    channel.exec_command.assert_called_with("[[ -e '/tmp/a b; rm -rf ~' ]]")
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_wait_for_ssh():
+    """ Test the async wait for ssh helper method """
+
+    fqdn = "127.0.0.1"
+    state = {"running": True, "calls": 0}
+
+    async def fake_ssh_running(*_args, **_kwargs):
+        state["calls"] += 1
+        return state["running"]
+
+    with patch("epython.aiossh.ssh_running", new=fake_ssh_running):
+        # Test happy path
+        _run(aiossh.wait_for_ssh(fqdn, timeout=.1, interval=0))
+        assert state["calls"] == 1
+
+        # Test sad path
+        state["running"] = False
+        with pytest.raises(errors.ssh.SSHTimeoutError):
+            _run(aiossh.wait_for_ssh(fqdn, timeout=.1, interval=0))
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_execute_command_late_output(fake_connect):
+    """ Test output arriving after the exit status is read, on a loop that can't watch the channel
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+
+    Steps:
+        1) Mock a channel whose exit status is ready before its output and EOF arrive
+        2) Make the event loop refuse to watch file descriptors, like the Windows proactor loop
+        3) Validate the channel was polled and all of the output read
+    """
+
+    pending = [b"late ", b"output"]
+    stdout_chunks = []
+    channel = MagicMock()
+    channel.recv_ready.side_effect = lambda: bool(stdout_chunks)
+    channel.recv_stderr_ready.return_value = False
+    channel.recv.side_effect = lambda _size: stdout_chunks.pop(0)
+    channel.exit_status_ready.return_value = True
+    channel.recv_exit_status.return_value = 0
+    channel.eof_received, channel.closed = False, False
+
+    def add_reader(*_args):
+        # Every poll hands out the next piece of output, then the EOF
+        if pending:
+            stdout_chunks.append(pending.pop(0))
+        else:
+            channel.eof_received = True
+        raise NotImplementedError
+
+    fake_connect.return_value.get_transport.return_value.open_session.return_value = channel
+    with patch("asyncio.selector_events.BaseSelectorEventLoop.add_reader", side_effect=add_reader):
+        result = _run(aiossh.execute_command("localhost", "bogus_user", "bogus_pass", "ls", timeout=5))
+
+    assert result == (0, "late output", "")
+
+
+class _FakeSCPClient:
+    """ A stand in for scp.SCPClient whose transfers report progress until they're told to stop. """
+
+    clients = []
+
+    def __init__(self, _transport, progress=None):
+        self.progress = progress
+        self.channel = MagicMock()
+        self.stopped = None
+        self.clients.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def _transfer(self, name, chunks):
+        self.stopped = False
+        try:
+            for sent in range(chunks):
+                self.progress(name, chunks, sent)
+                time.sleep(.01)
+        finally:
+            self.stopped = True
+        return name
+
+    def get(self, remote_file, local_path=""):
+        """ Download, the short way when the local path is 'local' """
+        return self._transfer(remote_file, 3 if local_path == "local" else 1000)
+
+    def put(self, local_file, remote_path="."):
+        """ Upload, the short way when the remote path is 'remote' """
+        return self._transfer(local_file, 3 if remote_path == "remote" else 1000)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_async_get_put(fake_connect):
+    """ Test the async transfers borrow a connection, and a timeout stops the transfer itself
+
+    Args:
+        fake_connect (MagicMock): Fixture that provides the mocked connect
+
+    Steps:
+        1) Validate a get and a put run to completion and hand the connection back
+        2) Time out a long transfer
+        3) Validate the transfer was stopped, and the channel closed, before the connection went back
+    """
+
+    with patch("epython.aiossh.SCPClient", _FakeSCPClient):
+        assert _run(aiossh.get("localhost", "user", "pass", "remote", "local")) == "remote"
+        assert _run(aiossh.put("localhost", "user", "pass", "local", "remote")) == "local"
+        assert fake_connect.call_count == 1, "The connection should have been handed back and reused"
+
+        exits = []
+
+        def release(*_args, **_kwargs):
+            exits.append(_FakeSCPClient.clients[-1].stopped)
+
+        with patch.object(fake_connect.pool, "release", side_effect=release):
+            with pytest.raises(errors.ssh.SSHTimeoutError):
+                _run(aiossh.get("localhost", "user", "pass", "huge", "elsewhere", timeout=.1))
+
+        _FakeSCPClient.clients[-1].channel.close.assert_called()
+        assert exits == [True], "The connection must only go back once the transfer stopped"
@@ -9,6 +9,9 @@ Author:
 Date:
     01/5/20
 """
+import socket
+import threading
+import time
 from unittest.mock import patch, MagicMock
 import pytest
 
@@ -116,3 +119,74 @@ def test_wait_for_invalid_port_state():
 
     with pytest.raises(errors.network.EInvalidPortState):
         network.wait_for_port_state(host, port, invalid_state)
+
+
+@pytest.fixture(scope="function")
+def local_ports():
+    """ Fixture that provides a banner-sending port, a silent port and a closed port on localhost """
+
+    # is_port_listening changes the default socket timeout, so be explicit about blocking
+    banner_server = socket.socket()
+    banner_server.settimeout(None)
+    banner_server.bind(("127.0.0.1", 0))
+    banner_server.listen(8)
+
+    # Accepts connections (from the backlog) but never says anything
+    silent_server = socket.socket()
+    silent_server.bind(("127.0.0.1", 0))
+    silent_server.listen(8)
+
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    def serve():
+        while True:
+            try:
+                conn, _ = banner_server.accept()
+            except OSError:
+                return
+            # Split the banner up to make sure partial reads are handled
+            conn.settimeout(None)
+            try:
+                conn.sendall(b"Welcome!\r\nSSH-2.0-")
+                time.sleep(.05)
+                conn.sendall(b"Bogus_1.0\r\n")
+            except OSError:
+                pass
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield banner_server.getsockname()[1], silent_server.getsockname()[1], closed_port
+
+    banner_server.close()
+    silent_server.close()
+
+
+@pytest.mark.L1
+def test_wait_for_ports_listening(local_ports):
+    """ Test many ports are watched at once and reported as they become ready
+
+    Steps:
+        1) Wait on a banner port, a silent port and a closed port without a banner check
+        2) Validate the open ports are ready and the closed one is a straggler
+        3) Wait again with a banner check and validate the silent port is now a straggler
+    """
+
+    banner_port, silent_port, closed_port = local_ports
+    targets = [("127.0.0.1", banner_port), ("127.0.0.1", silent_port), ("localhost", closed_port)]
+
+    ready = []
+    start = time.monotonic()
+    stragglers = network.wait_for_ports_listening(targets, timeout=1, interval=.1, callback=ready.append)
+    assert sorted(ready) == sorted(targets[:2])
+    assert stragglers == [targets[2]]
+    assert time.monotonic() - start < 2, "The ports should have been watched at the same time"
+
+    stragglers = network.wait_for_ports_listening(targets, timeout=1, interval=.1, connect_timeout=.3,
+                                                  banner=b"SSH-2.0-")
+    assert stragglers == targets[1:]
+
+    assert network.banner_matches(b"hello\nSSH-1.99-x", (b"SSH-2.0-", b"SSH-1.99-"))
+    assert not network.banner_matches(b"SSH-2", b"SSH-2.0-")
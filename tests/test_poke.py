@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    Tests around the poke sessions and request helpers
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import email.utils
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+import requests
+
+from epython import errors
+from epython import poke
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_session_keepalive(http_url):
+    """ Test a session reuses one kept-alive connection for sequential requests
+
+    Steps:
+        1) Send requests with every method over one session
+        2) Validate they all came in over the same connection
+        3) Validate the poke headers were sent and no cookies were kept
+    """
+
+    with poke.PokeSession() as session:
+        responses = [session.get(http_url), session.post(http_url, data="{}"), session.put(http_url),
+                     session.delete(http_url)]
+        bodies = [response.json() for response in responses]
+
+        assert [body["method"] for body in bodies] == ["GET", "POST", "PUT", "DELETE"]
+        assert len({body["port"] for body in bodies}) == 1, "Every request should reuse the connection"
+        assert bodies[0]["headers"]["X-Request-ID"] == poke.POKE_HEADERS["X-Request-ID"]
+        assert "Cookie" not in bodies[-1]["headers"]
+
+    with poke.PokeSession(headers={"X-Bogus": "1"}, cookies=True) as session:
+        session.get(http_url)
+        headers = session.get(http_url).json()["headers"]
+        assert headers["X-Bogus"] == "1" and headers["Cookie"] == "bogus=cookie"
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_default_session(http_url):
+    """ Test the module helpers share the default session across threads
+
+    Steps:
+        1) Send requests from several threads through the module helpers
+        2) Validate they never needed more connections than there were threads
+        3) Validate a session can be handed to the helpers
+    """
+
+    assert poke.default_session() is poke.default_session()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        ports = set(executor.map(lambda _: poke.get(http_url).json()["port"], range(40)))
+    assert len(ports) <= 4
+
+    with poke.PokeSession(pool_maxsize=1, pool_block=True) as session:
+        ports = {poke.get(http_url, session=session).json()["port"] for _ in range(5)}
+        assert len(ports) == 1
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_batch(http_url):
+    """ Test batches keep their order, cap the requests in flight and report failures per request
+
+    Steps:
+        1) Gather a batch mixing every kind of spec, a bad spec and an unreachable URL
+        2) Validate the results line up with the specs and only the broken ones failed
+        3) Stream a large batch as it completes and validate the concurrency limit was kept
+    """
+
+    specs = [f"{http_url}/1", ("DELETE", f"{http_url}/2"), ("POST", http_url, {"data": "{}"}),
+             {"method": "PUT", "url": f"{http_url}/3"}, {"bogus": "spec"}, "http://127.0.0.1:1/closed"]
+    results = poke.gather(specs, max_workers=3, retries=1, interval=0, timeout=5)
+
+    assert [result.index for result in results] == list(range(len(specs)))
+    assert [result.method for result in results[:4]] == ["GET", "DELETE", "POST", "PUT"]
+    assert all(result.ok for result in results[:4])
+    assert results[0].response.json()["method"] == "GET"
+    assert isinstance(results[4].exception, errors.poke.PokeException) and not results[4].ok
+    assert results[5].exception is not None and results[5].response is None
+
+    in_flight, peak, lock = [0], [0], threading.Lock()
+    session = poke.PokeSession()
+    send = session.request
+
+    def counting_request(*args, **kwargs):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        try:
+            return send(*args, **kwargs)
+        finally:
+            with lock:
+                in_flight[0] -= 1
+
+    with session, patch.object(session, "request", side_effect=counting_request):
+        specs = (f"{http_url}/{idx}" for idx in range(200))
+        indexes = [result.index for result in poke.map(specs, max_workers=4, ordered=False,
+                                                       session=session)]
+
+    assert sorted(indexes) == list(range(200))
+    assert peak[0] <= 4
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_cache(http_url):
+    """ Test cached GETs are served locally while fresh, and revalidated with their ETag once stale
+
+    Steps:
+        1) Get the same URL twice through a cache, validate only the first one was sent
+        2) Validate different params or headers are cached apart, and no-store responses aren't cached
+        3) Let the entries go stale, validate a 304 serves the cached response again
+        4) Validate the least recently used entries are evicted past maxsize
+    """
+
+    session = poke.PokeSession()
+    cache = poke.ResponseCache(maxsize=3, ttl=60)
+    send = session.request
+
+    with session, patch.object(session, "request", side_effect=send) as mock_request:
+        first = poke.get(f"{http_url}/etag/1", session=session, cache=cache)
+        assert poke.get(f"{http_url}/etag/1", session=session, cache=cache) is first
+        assert (mock_request.call_count, cache.hits, cache.misses) == (1, 1, 1)
+
+        poke.get(f"{http_url}/etag/1", params={"id": 1}, session=session, cache=cache)
+        poke.get(f"{http_url}/etag/1", headers={"Accept": "text/plain"}, session=session, cache=cache)
+        poke.get(f"{http_url}/nostore", session=session, cache=cache)
+        poke.get(f"{http_url}/nostore", session=session, cache=cache)
+        assert (mock_request.call_count, len(cache)) == (5, 3)
+
+        cache.ttl = 0
+        cache.clear()
+        first = poke.get(f"{http_url}/etag/1", session=session, cache=cache)
+        assert poke.get(f"{http_url}/etag/1", session=session, cache=cache) is first
+        assert mock_request.call_args[1]["headers"]["If-None-Match"] == '"/etag/1"'
+        assert (first.status_code, cache.revalidated) == (200, 1)
+
+        for idx in range(5):
+            poke.get(f"{http_url}/{idx}", session=session, cache=cache)
+        assert len(cache) == 3
+        poke.get(f"{http_url}/etag/1", session=session, cache=cache)
+        assert "If-None-Match" not in mock_request.call_args[1]["headers"], "The entry should be evicted"
+
+    assert poke.default_cache() is poke.default_cache()
+
+
+def _response(status, **headers):
+    """ Build a requests.Response with a status and headers """
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response.raw = io.BytesIO()
+    return response
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_retry_policy():
+    """ Test retries follow the method, the status code and the Retry-After of the server
+
+    Steps:
+        1) Validate a GET is only retried on the retry statuses when given a policy, waiting as long as
+           Retry-After asked, and each retried response was closed first
+        2) Validate a POST is only retried when the server turned it away, or when it has a key
+        3) Validate a POST that never reached the server is retried
+        4) Validate the waits back off, and a too long Retry-After isn't waited for
+    """
+
+    date = email.utils.format_datetime(datetime.now(timezone.utc) + timedelta(seconds=30), usegmt=True)
+    policy = poke.RetryPolicy(retries=5, interval=1)
+    with patch("epython.poke.eprequests.requests.Session.request") as mock_request, \
+            patch("epython.poke.retry.time.sleep") as mock_sleep:
+        mock_request.return_value = _response(503)
+        assert poke.get("http://bogus", retries=5, interval=1).status_code == 503
+        assert mock_request.call_count == 1 and not mock_sleep.called
+
+        mock_request.reset_mock(return_value=True)
+        retried = [_response(503, **{"Retry-After": "7"}), _response(429, **{"Retry-After": date})]
+        mock_request.side_effect = retried + [_response(200)]
+        with patch.object(requests.Response, "close", autospec=True) as mock_close:
+            assert poke.get("http://bogus", policy=policy).status_code == 200
+        assert [call[0][0] for call in mock_close.call_args_list] == retried
+        assert mock_sleep.call_args_list[0][0][0] == 7 and 25 < mock_sleep.call_args_list[1][0][0] <= 30
+
+        mock_request.reset_mock(side_effect=True)
+        mock_request.side_effect = [_response(502), _response(429), _response(201)]
+        assert poke.post("http://bogus", policy=policy).status_code == 502
+        assert poke.post("http://bogus", policy=policy).status_code == 201
+        assert mock_request.call_count == 3
+
+        mock_request.reset_mock(side_effect=True)
+        mock_request.side_effect = [requests.exceptions.ReadTimeout()] * 2 + [_response(201)]
+        assert poke.post("http://bogus", idempotency_key=True, interval=0).status_code == 201
+        keys = {call[1]["headers"]["Idempotency-Key"] for call in mock_request.call_args_list}
+        assert mock_request.call_count == 3 and len(keys) == 1
+
+        mock_sleep.reset_mock()
+        mock_request.reset_mock(side_effect=True)
+        mock_request.side_effect = [_response(504)] * 4 + [_response(503, **{"Retry-After": "600"})]
+        policy = poke.RetryPolicy(retries=10, interval=1, backoff=2, max_interval=3)
+        assert poke.delete("http://bogus", policy=policy).status_code == 503
+        assert [call[0][0] for call in mock_sleep.call_args_list] == [1, 2, 3, 3]
+
+    with patch("epython.poke.retry.time.sleep"), \
+            patch("epython.poke.eprequests.requests.Session.request",
+                  side_effect=poke.default_session().session.request) as mock_request:
+        with pytest.raises(requests.exceptions.ConnectionError):
+            poke.post("http://127.0.0.1:1/closed", retries=3, interval=0)
+        assert mock_request.call_count == 3
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_circuit_breaker(http_url):
+    """ Test the circuit of a failing host opens, fails fast, then probes the host once cooled down
+
+    Steps:
+        1) Fail requests to a host until its circuit opens, and validate the retries stopped with it
+        2) Validate requests to that host now fail fast, without being sent, and other hosts still work
+        3) Validate a failed probe opens the circuit again, and a good one closes it
+    """
+
+    breaker = poke.CircuitBreaker(failure_threshold=3, cooldown=.5)
+    with poke.PokeSession(breaker=breaker) as session, \
+            patch.object(session.session, "request", wraps=session.session.request) as mock_request:
+        with pytest.raises(errors.poke.CircuitOpenException) as exp:
+            session.get(f"{http_url}/status/503", policy=poke.RetryPolicy(retries=10, interval=0))
+        assert mock_request.call_count == 3
+        assert exp.value.host == breaker.host(http_url) and 0 < exp.value.retry_in <= .5
+
+        with pytest.raises(errors.poke.CircuitOpenException):
+            session.get(http_url, retries=1)
+        assert mock_request.call_count == 3
+        with pytest.raises(requests.exceptions.ConnectionError):
+            session.get("http://127.0.0.1:1/closed", retries=1)
+        assert breaker.state(http_url) == "open" and breaker.state("http://127.0.0.1:1") == "closed"
+
+        time.sleep(.5)
+        assert session.get(f"{http_url}/status/504", retries=1).status_code == 504
+        assert breaker.snapshot()[breaker.host(http_url)]["trips"] == 2
+
+        time.sleep(.5)
+        assert session.get(http_url, retries=1).ok
+        assert breaker.snapshot()[breaker.host(http_url)] == {"state": "closed", "failures": 0,
+                                                              "trips": 2, "retry_in": 0.0}
+
+    with poke.PokeSession(breaker=False) as session:
+        assert session.breaker is None
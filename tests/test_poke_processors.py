@@ -9,9 +9,17 @@ Author:
 Date:
     4/15/21
 """
+import json
+import re
+from unittest.mock import patch
 
+import pytest
 from requests import Response
-from epython.poke.processors import PokeResponse
+
+from epython import errors
+from epython import poke
+from epython.poke.batch import RequestResult
+from epython.poke.processors import PokeResponse, ResponseValidator, iter_json
 
 
 def test_poke_response():
@@ -22,3 +30,153 @@ def test_poke_response():
 
     for key, val in rsp.__dict__.items():
         poke_rsp.__dict__[key] == val
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_iter_json():
+    """ Test JSON bodies are walked an item at a time, however the chunks split them
+
+    Steps:
+        1) Walk an array, an object and a nested path, split into chunks of every size
+        2) Validate malformed bodies raise with the position of the problem
+    """
+
+    doc = {"count": 3, "results": [{"a": 1e5, "b": "é\\\"", "c": [True, None]}, -12.5e-3, "s" * 100],
+           "next": None}
+    body = json.dumps(doc, indent=2).encode()
+
+    for size in (1, 3, 64, len(body)):
+        chunks = [body[idx:idx + size] for idx in range(0, len(body), size)]
+        assert list(iter_json(chunks)) == list(doc.items())
+        assert list(iter_json(chunks, path=["results"])) == doc["results"]
+        assert list(iter_json(chunks, path=["results", 0, "c"])) == [True, None]
+
+        with pytest.raises(errors.poke.JsonProcessorException, match="not found"):
+            list(iter_json(chunks, path=["bogus"]))
+
+    malformed = ((b'[1, 2, x]', 7, 1, 8), (b'[1,\n  2,\n  tru]', 11, 3, 3), (b'{"a" 1}', 5, 1, 6),
+                 (b'[1] 2', 4, 1, 5), (b'[1, 2', 5, 1, 6))
+    for body, position, line, column in malformed:
+        with pytest.raises(errors.poke.JsonProcessorException) as exp:
+            list(iter_json(body[idx:idx + 2] for idx in range(0, len(body), 2)))
+        assert (exp.value.position, exp.value.line, exp.value.column) == (position, line, column)
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_poke_response_iter_json(http_url):
+    """ Test a streamed response body can be walked with PokeResponse.iter_json """
+
+    response = PokeResponse(poke.get(http_url, stream=True))
+    headers = dict(response.iter_json(path=["headers"], chunk_size=8))
+    assert headers["X-Request-ID"] == poke.POKE_HEADERS["X-Request-ID"]
+
+
+def _response(status, body, headers=None):
+    """ Build a requests.Response with a JSON body """
+    response = Response()
+    response.status_code = status
+    response.url = "http://bogus/api"
+    response.headers.update(headers or {"Content-Type": "application/json"})
+    # pylint: disable=W0212
+    response._content = body if isinstance(body, bytes) else json.dumps(body).encode()
+    # pylint: enable=W0212
+    return response
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_response_validator():
+    """ Test a validator reports every failure of a response in one pass
+
+    Steps:
+        1) Validate a response that passes every kind of check
+        2) Validate a response that breaks all of them, and validate each failure was reported
+        3) Validate check() raises with every failure
+    """
+
+    validator = ResponseValidator(
+        status=(200, 201), headers={"Content-Type": re.compile("json"), "ETag": True, "X-Bogus": False},
+        json={"count": int, "results.*.id": lambda value: value > 0, "results.0.name": "a"},
+        schema={"type": "object", "required": ["count"],
+                "properties": {"results": {"type": "array", "maxItems": 1, "items": {
+                    "type": "object", "additionalProperties": False,
+                    "properties": {"id": {"type": "integer"}, "name": {"type": "string",
+                                                                       "pattern": "^[a-z]+$"}}}}}})
+
+    good = _response(200, {"count": 1, "results": [{"id": 1, "name": "a"}]},
+                     {"Content-Type": "application/json", "ETag": '"1"'})
+    assert PokeResponse(good).validate(validator).check().ok
+
+    bad = _response(500, {"results": [{"id": 1, "name": "b"}, {"id": "2", "name": "C", "z": 1}]},
+                    {"Content-Type": "text/html", "X-Bogus": "1"})
+    result = validator.validate(bad)
+    assert result.failures == [
+        "status: expected [200, 201], got 500",
+        "header 'Content-Type': expected to match 'json', got 'text/html'",
+        "header 'ETag': expected it to be there",
+        "header 'X-Bogus': expected it to be absent",
+        "json 'count': $.count is missing",
+        "json $.results[1].id: expected to pass '<lambda>', got '2'",
+        "json $.results[0].name: expected 'a', got 'b'",
+        "schema $: missing required key 'count'",
+        "schema $.results: 2 breaks maxItems 1",
+        "schema $.results[1].id: expected type integer, got str",
+        "schema $.results[1].name: 'C' doesn't match '^[a-z]+$'",
+        "schema $.results[1]: unexpected keys ['z']",
+    ]
+
+    with pytest.raises(errors.poke.ResponseValidationException) as exp:
+        result.check()
+    assert exp.value.failures == result.failures
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_response_validator_json_paths():
+    """ Test JSON paths find string keys that look like indexes, and report every member missing a key
+
+    Steps:
+        1) Validate a digit segment finds the same string key of an object
+        2) Validate each member a wildcard path is missing from is reported, not just the first
+    """
+
+    validator = ResponseValidator(json={"m.0": 1, "results.*.id": int})
+
+    assert validator.validate(_response(200, {"m": {"0": 1}, "results": [{"id": 1}]})).ok
+    result = validator.validate(_response(200, {"m": {"0": 2}, "results": [{"id": 1}, {}, {"x": 1}]}))
+    assert result.failures == [
+        "json $.m.0: expected 1, got 2",
+        "json 'results.*.id': $.results[1].id is missing",
+        "json 'results.*.id': $.results[2].id is missing",
+    ]
+
+
+@pytest.mark.L1
+@pytest.mark.test_poke
+def test_response_validator_batch():
+    """ Test a whole batch is validated at once, including requests that never got a response
+
+    Steps:
+        1) Validate a batch mixing good responses, bad ones and failed requests
+        2) Validate the results line up with the batch and match validating one at a time
+        3) Validate identical bodies were only checked once
+    """
+
+    validator = ResponseValidator(status=200, json={"id": int}, schema={"required": ["id"]})
+    batch = [_response(200, {"id": 1}), _response(404, {"id": 1}), _response(200, b"<html>"),
+             RequestResult(3, "GET", "http://bogus", exception=OSError("refused")),
+             _response(200, {"id": 1}),
+             RequestResult(5, "GET", "http://bogus", response=_response(200, {"id": "1"}))]
+
+    with patch.object(validator, "_body_failures",
+                      wraps=validator._body_failures) as mock_body:  # pylint: disable=W0212
+        results = validator.validate_many(batch)
+    assert mock_body.call_count == 3
+
+    assert [result.ok for result in results] == [True, False, False, False, True, False]
+    assert results[3].failures == ["request: failed with OSError('refused')"]
+    assert results[2].failures[0].startswith("body: expected JSON")
+    for idx in (0, 1, 2, 4):
+        assert results[idx].failures == validator.validate(batch[idx]).failures
@@ -10,14 +10,16 @@ Date:
     12/8/20
 """
 
-from unittest.mock import MagicMock, Mock, patch
+import asyncio
+from unittest.mock import Mock, patch
 
 import pytest
+import requests
 
 from epython import poke
 
 from epython.errors.ssh import SSHError
-from epython.handlers import basic_retry_handler, CallbackHandler
+from epython.handlers import async_retry_handler, basic_retry_handler, CallbackHandler
 
 
 class DummyCallbackHandler(CallbackHandler):
@@ -156,6 +158,42 @@ def test_exception_callback():
                                                                     "retries"
 
 
+@pytest.mark.L1
+@pytest.mark.test_retry_handler
+def test_async_retry_handler():
+    """Test the async retry handler retries a coroutine and uses the callbacks like the basic one.
+
+    Steps:
+        1) Wrap a coroutine that fails twice with an SSHError and then succeeds
+        2) Validate the result is returned after the retries
+        3) Validate a coroutine that always fails raises the last exception after all retries
+    """
+
+    test_callback = DummyCallbackHandler()
+    test_callback.run_after_exception = Mock()
+    test_callback.run_after_function = Mock()
+    func = Mock(side_effect=[SSHError(), SSHError(), "Functional Success"])
+
+    async def flaky():
+        return func()
+
+    loop = asyncio.new_event_loop()
+    try:
+        wrapped = async_retry_handler((SSHError,), retries=3, interval=0, callback=test_callback)(flaky)
+        assert loop.run_until_complete(wrapped()) == "Functional Success"
+        assert func.call_count == 3
+        assert test_callback.run_after_exception.call_count == 2
+        assert test_callback.run_after_function.call_count == 1
+
+        func.reset_mock(side_effect=True)
+        func.side_effect = SSHError()
+        with pytest.raises(SSHError):
+            loop.run_until_complete(wrapped())
+        assert func.call_count == 3
+    finally:
+        loop.close()
+
+
 @pytest.mark.L1
 @pytest.mark.test_requests_handler
 @pytest.mark.parametrize("test_exception", poke.COMMON_REQUEST_EXCEPTIONS)
@@ -171,7 +209,7 @@ def test_requests_retry_handler(test_exception):
            handler that retries on ConnectionError
         3) Validate that the wrapped function fails with an ConnectionError exception
         4) Validate that the wrapped function was called the same number of times the decorator had
-           retries for
+           retries for (a POST is only retried when it never reached the server)
     """
 
     # Test URL
@@ -183,25 +221,15 @@ def test_requests_retry_handler(test_exception):
     # We don't need to wait before retrying for this test
     interval = 0
 
-    # Test GET, POST, PUT, DELETE
-    with patch("epython.poke.eprequests.requests") as patched_requests:
-        patched_requests.get = MagicMock(side_effect=test_exception())
-        patched_requests.post = MagicMock(side_effect=test_exception())
-        patched_requests.put = MagicMock(side_effect=test_exception())
-        patched_requests.delete = MagicMock(side_effect=test_exception())
-
-        with pytest.raises(test_exception):
-            poke.get(test_url, retries=retries, interval=interval)
-        assert patched_requests.get.call_count == retries
-
-        with pytest.raises(test_exception):
-            poke.post(test_url, retries=retries, interval=interval)
-        assert patched_requests.get.call_count == retries
-
-        with pytest.raises(test_exception):
-            poke.put(test_url, retries=retries, interval=interval)
-        assert patched_requests.get.call_count == retries
-
-        with pytest.raises(test_exception):
-            poke.delete(test_url, retries=retries, interval=interval)
-        assert patched_requests.get.call_count == retries
+    # Test GET, POST, PUT, DELETE (all of them go through the shared session)
+    with patch("epython.poke.eprequests.requests.Session.request") as patched_request:
+        patched_request.side_effect = test_exception()
+
+        for method, func in (("GET", poke.get), ("POST", poke.post), ("PUT", poke.put),
+                             ("DELETE", poke.delete)):
+            patched_request.reset_mock()
+            with pytest.raises(test_exception):
+                func(test_url, retries=retries, interval=interval)
+            never_sent = issubclass(test_exception, requests.exceptions.ConnectTimeout)
+            assert patched_request.call_count == (retries if method != "POST" or never_sent else 1)
+            assert patched_request.call_args[0][0] == method
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module is used for testing the sftp transfer engine
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import os
+import shutil
+import time
+from unittest.mock import MagicMock, patch
+
+import paramiko
+import pytest
+
+from epython import errors
+from epython import sftp
+from epython import ssh
+
+
+class FakeSFTPFile:
+    """ Stand-in for paramiko.SFTPFile that is backed by a local file. """
+
+    def __init__(self, path, mode, stats):
+        self._file = open(path, mode)
+        self._stats = stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def seek(self, offset):
+        self._file.seek(offset)
+
+    def prefetch(self, _size=None):
+        self._stats["prefetch"] += 1
+
+    def set_pipelined(self, _pipelined=True):
+        self._stats["pipelined"] += 1
+
+    def read(self, size):
+        data = self._file.read(size)
+        self._stats["read"] += len(data)
+        return data
+
+    def readv(self, chunks):
+        for offset, length in chunks:
+            if self._stats["fail_at"] is not None and offset >= self._stats["fail_at"]:
+                raise EOFError("Bogus dropped connection")
+            self._file.seek(offset)
+            data = self._file.read(length)
+            self._stats["read"] += len(data)
+            yield data
+
+    def write(self, data):
+        self._file.write(data)
+
+
+class FakeSFTP:
+    """ Stand-in for paramiko.SFTPClient that works on the local filesystem. """
+
+    def __init__(self, stats):
+        self._stats = stats
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def stat(self, path):
+        return os.stat(path)
+
+    def listdir_attr(self, path):
+        return [paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name)
+                for name in os.listdir(path)]
+
+    def open(self, path, mode):
+        if path in self._stats["unreadable"]:
+            raise PermissionError(13, "Permission denied", path)
+        return FakeSFTPFile(path, mode, self._stats)
+
+    def get(self, remotepath, localpath):
+        self._stats["get"].append(remotepath)
+        shutil.copyfile(remotepath, localpath)
+
+    def put(self, localpath, remotepath):
+        self._stats["put"].append(remotepath)
+        shutil.copyfile(localpath, remotepath)
+
+    def mkdir(self, path):
+        os.mkdir(path)
+
+    def utime(self, path, times):
+        os.utime(path, times)
+
+
+@pytest.fixture(scope="function")
+def fake_client(local_session):
+    """ Fixture that provides a mocked ssh client whose SFTP sessions work on the local filesystem. """
+    stats = {"read": 0, "prefetch": 0, "pipelined": 0, "fail_at": None, "get": [], "put": [],
+             "unreadable": set()}
+    client = MagicMock()
+    client.open_sftp.side_effect = lambda: FakeSFTP(stats)
+    client.get_transport.return_value.open_session.side_effect = local_session
+    client.stats = stats
+    return client
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_sftp_download(fake_client, tmp_path):
+    """ Test sequential and parallel downloads produce an identical copy and report progress
+
+    Steps:
+        1) Download a small file sequentially and validate it was prefetched
+        2) Download a file in parallel ranges and validate the content
+        3) Validate progress was reported up to the full size
+    """
+
+    remote = tmp_path / "remote.bin"
+    remote.write_bytes(os.urandom(100000))
+    local_dir = tmp_path / "local"
+    local_dir.mkdir()
+
+    local = sftp.download(fake_client, str(remote), str(local_dir), chunk_size=4096)
+    assert local == str(local_dir / "remote.bin")
+    assert (local_dir / "remote.bin").read_bytes() == remote.read_bytes()
+    assert fake_client.stats["prefetch"] == 1
+
+    progress = []
+    local = sftp.download(fake_client, str(remote), str(tmp_path / "parallel.bin"), chunk_size=4096,
+                          max_workers=3, parallel_threshold=0,
+                          progress=lambda done, total, rate: progress.append((done, total)))
+    assert (tmp_path / "parallel.bin").read_bytes() == remote.read_bytes()
+    assert fake_client.open_sftp.call_count == 1 + 1 + 3, "Each range should use its own SFTP channel"
+    assert progress[-1] == (100000, 100000)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_sftp_download_resume(fake_client, tmp_path):
+    """ Test an interrupted parallel download keeps only its unbroken prefix and resumes from it
+
+    Steps:
+        1) Fail a parallel download part of the way through
+        2) Validate the partial local file holds no holes
+        3) Resume and validate only the missing bytes are fetched
+    """
+
+    content = os.urandom(90000)
+    remote = tmp_path / "remote.bin"
+    remote.write_bytes(content)
+    local = tmp_path / "local.bin"
+
+    fake_client.stats["fail_at"] = 40000
+    with pytest.raises(EOFError):
+        sftp.download(fake_client, str(remote), str(local), chunk_size=1000, max_workers=3,
+                      parallel_threshold=0)
+
+    partial = local.read_bytes()
+    assert len(partial) == 30000 + 10000, "Only the contiguous prefix should have been kept"
+    assert content.startswith(partial)
+
+    fake_client.stats["fail_at"] = None
+    fake_client.stats["read"] = 0
+    sftp.download(fake_client, str(remote), str(local), chunk_size=1000, resume=True)
+    assert local.read_bytes() == content
+    assert fake_client.stats["read"] == len(content) - len(partial)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_sftp_upload(fake_client, tmp_path):
+    """ Test uploads are pipelined, land in remote directories and resume from a partial remote file """
+
+    content = os.urandom(50000)
+    local = tmp_path / "local.bin"
+    local.write_bytes(content)
+    remote_dir = tmp_path / "remote"
+    remote_dir.mkdir()
+
+    remote = sftp.upload(fake_client, str(local), str(remote_dir).encode(), chunk_size=4096)
+    assert remote == str(remote_dir / "local.bin")
+    assert (remote_dir / "local.bin").read_bytes() == content
+    assert fake_client.stats["pipelined"] == 1
+
+    partial = tmp_path / "partial.bin"
+    partial.write_bytes(content[:12345])
+    sftp.upload(fake_client, str(local), str(partial), resume=True)
+    assert partial.read_bytes() == content
+
+    partial.write_bytes(content + b"extra")
+    with pytest.raises(errors.ssh.SSHError):
+        sftp.upload(fake_client, str(local), str(partial), resume=True)
+
+
+def _write_tree(root, files):
+    """ Write a mapping of relative path to content under a directory. """
+    for path, content in files.items():
+        full_path = root / path
+        full_path.parent.mkdir(parents=True, exist_ok=True)
+        full_path.write_bytes(content)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_sync_dir(fake_client, tmp_path):
+    """ Test directory sync in both directions only transfers what changed
+
+    Steps:
+        1) Sync a remote tree with odd file names to an empty local directory
+        2) Validate a second sync transfers nothing
+        3) Change one file and touch another, validate only the changed one is transferred with checksums
+        4) Sync local changes back to the remote side
+    """
+
+    remote, local = tmp_path / "remote", tmp_path / "local"
+    _write_tree(remote, {"a.log": b"a" * 100, "sub dir/b'q\"uote.log": b"b" * 10, "sub dir/deep/c.log": b"c"})
+
+    result = sftp.sync_dir(fake_client, str(local), str(remote), direction="get")
+    assert sorted(result["transferred"]) == ["a.log", "sub dir/b'q\"uote.log", "sub dir/deep/c.log"]
+    assert (local / "sub dir" / "deep" / "c.log").read_bytes() == b"c"
+
+    fake_client.stats["get"].clear()
+    assert sftp.sync_dir(fake_client, str(local), str(remote)) == {"transferred": [], "touched": [],
+                                                                   "skipped": []}
+    assert not fake_client.stats["get"]
+
+    # Same size and content but a new mtime, and a real change that keeps the size
+    future = time.time() + 100
+    os.utime(remote / "a.log", (future, future))
+    (remote / "sub dir" / "deep" / "c.log").write_bytes(b"C")
+    os.utime(remote / "sub dir" / "deep" / "c.log", (future, future))
+
+    result = sftp.sync_dir(fake_client, str(local), str(remote), checksum=True)
+    assert result == {"transferred": ["sub dir/deep/c.log"], "touched": ["a.log"], "skipped": []}
+    assert (local / "sub dir" / "deep" / "c.log").read_bytes() == b"C"
+    assert int(os.stat(local / "a.log").st_mtime) == int(future)
+
+    # Push a new local file back up
+    _write_tree(local, {"new/d.log": b"d"})
+    result = sftp.sync_dir(fake_client, str(local), str(remote), direction="put")
+    assert result == {"transferred": ["new/d.log"], "touched": [], "skipped": []}
+    assert (remote / "new" / "d.log").read_bytes() == b"d"
+
+    with pytest.raises(errors.ssh.SSHError):
+        sftp.sync_dir(fake_client, str(local), str(remote), direction="sideways")
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_sync_dir_without_gnu_tools(fake_client, tmp_path):
+    """ Test directory sync falls back to SFTP when the remote lacks GNU find and sha256sum
+
+    Steps:
+        1) Make the GNU tool probes fail and sync a remote tree to an empty local directory
+        2) Touch two files, one of which can't be read, and sync again with checksums
+        3) Validate the readable one was hashed over SFTP and the unreadable one skipped
+        4) Validate a batched hash still returns what it could when a file can't be hashed
+    """
+
+    remote, local = tmp_path / "remote", tmp_path / "local"
+    _write_tree(remote, {"a.log": b"a" * 100, "sub dir/b.log": b"b", "sub dir/deep/c.log": b"c"})
+    os.symlink("a.log", str(remote / "link.log"))
+
+    with patch("epython.sftp.GNU_FIND_PROBE", "false"), patch("epython.sftp.GNU_HASH_PROBE", "false"):
+        result = sftp.sync_dir(fake_client, str(local), str(remote))
+        assert result == {"transferred": ["a.log", "sub dir/b.log", "sub dir/deep/c.log"], "touched": [],
+                          "skipped": []}
+
+        future = time.time() + 100
+        for path in ("a.log", "sub dir/b.log"):
+            os.utime(remote / path, (future, future))
+        fake_client.stats["unreadable"].add(str(remote / "sub dir" / "b.log"))
+
+        result = sftp.sync_dir(fake_client, str(local), str(remote), checksum=True)
+        assert result == {"transferred": [], "touched": ["a.log"], "skipped": ["sub dir/b.log"]}
+
+    with fake_client.open_sftp() as session:
+        hashes = sftp._remote_hashes(fake_client, session, str(remote), ["a.log", "gone.log"])
+    assert list(hashes) == ["a.log"]
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_get_put_sftp_mode():
+    """ Test ssh.get and ssh.put hand off to the sftp engine when asked to """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh, \
+            patch("epython.ssh.sftp.download", return_value="local") as mock_download, \
+            patch("epython.ssh.sftp.upload", return_value="remote") as mock_upload:
+        client = mock_ssh.return_value.__enter__.return_value
+
+        assert ssh.get(host, username, password, "remote", "local", mode="sftp", resume=True) == "local"
+        mock_download.assert_called_with(client, "remote", "local", resume=True)
+
+        assert ssh.put(host, username, password, "local", "remote", mode="sftp", chunk_size=10) == "remote"
+        mock_upload.assert_called_with(client, "local", "remote", chunk_size=10)
+
+        with pytest.raises(errors.ssh.SSHError):
+            ssh.get(host, username, password, "remote", "local", mode="ftp")
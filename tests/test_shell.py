@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module is used for testing the persistent shell session
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import os
+import select
+import subprocess
+from unittest.mock import patch
+
+import pytest
+
+from epython import errors
+from epython import shell
+
+# select.select is patched while a session runs, so hold onto the real one
+_SELECT = select.select
+
+
+class FakeShellChannel:
+    """ Stand-in for a paramiko.Channel whose shell is a local bash process. """
+
+    def __init__(self):
+        self.proc = None
+        self.closed = False
+        self._buffers = {}
+
+    def invoke_shell(self):
+        # Say something on the way up, like a motd would
+        self.proc = subprocess.Popen(["bash", "-c", "echo 'Welcome!'; exec bash"], stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._buffers = {self.proc.stdout: b"", self.proc.stderr: b""}
+
+    def fds(self):
+        return [self.proc.stdout, self.proc.stderr]
+
+    def _ready(self, pipe):
+        if not self._buffers[pipe] and _SELECT([pipe], [], [], 0)[0]:
+            self._buffers[pipe] = os.read(pipe.fileno(), 65536)
+        return bool(self._buffers[pipe])
+
+    def _recv(self, pipe):
+        data, self._buffers[pipe] = self._buffers[pipe], b""
+        return data
+
+    def recv_ready(self):
+        return self._ready(self.proc.stdout)
+
+    def recv_stderr_ready(self):
+        return self._ready(self.proc.stderr)
+
+    def recv(self, _size):
+        return self._recv(self.proc.stdout)
+
+    def recv_stderr(self, _size):
+        return self._recv(self.proc.stderr)
+
+    def exit_status_ready(self):
+        return self.proc.poll() is not None
+
+    def recv_exit_status(self):
+        return self.proc.wait()
+
+    def sendall(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def close(self):
+        self.closed = True
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+@pytest.fixture(scope="function")
+def fake_shell():
+    """ Fixture that provides an SSHShell whose remote shell is a local bash process. """
+
+    channel = FakeShellChannel()
+
+    def fake_select(rlist, wlist, xlist, timeout):
+        # Wait on both of the local shell's output pipes in place of the channel
+        return _SELECT(rlist[0].fds(), wlist, xlist, timeout)
+
+    with patch("epython.shell.ssh.SSHConnect") as mock_ssh, patch("epython.shell.select.select", fake_select):
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+        transport.open_session.return_value = channel
+        yield shell.SSHShell("localhost", "bogus_user", "bogus_pass", pooled=False, env={"GREETING": "hi there"})
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_shell_session(fake_shell, tmp_path):
+    """ Test commands run one after another in the same shell
+
+    Steps:
+        1) Open the session and validate the startup chatter isn't part of the first command
+        2) Validate the working directory and environment carry over between commands
+        3) Validate standard error, return codes and output without a trailing newline
+        4) Validate syntax errors and commands that read standard in don't break the session
+        5) Validate the results work like the ones of execute_command
+    """
+
+    with fake_shell as session:
+        assert session.run("echo $GREETING") == (0, "hi there", "")
+
+        session.run(f"cd {tmp_path}")
+        session.run("export COLOR=blue; touch marker")
+        assert session.run("pwd") == (0, str(tmp_path), "")
+        assert session.run("echo $COLOR; ls") == (0, "blue\nmarker", "")
+
+        assert session.run("printf 'no newline'; echo oops >&2; false") == (1, "no newline", "oops")
+        rc, _, stderr = session.run("if then fi")
+        assert rc != 0 and "syntax error" in stderr
+
+        results = session.run_many(["cat", "echo still here", "exit_code() { return 4; }; exit_code",
+                                    "echo skipped"], stop_on_error=True)
+        assert results == [(0, "", ""), (0, "still here", ""), (4, "", "")]
+
+        result = session.run("printf 'a\\nb\\n'; echo oops >&2; false")
+        assert not result.ok and list(result.lines()) == ["a", "b"] and result.host == session.host
+        with pytest.raises(errors.ssh.SSHCommandError, match="oops"):
+            result.check()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_shell_session_closed(fake_shell):
+    """ Test the session reports a shell that went away and refuses to run more commands """
+
+    with fake_shell as session:
+        with pytest.raises(errors.ssh.SSHSessionClosed):
+            session.run("exit 3")
+        assert not session.is_open
+
+        with pytest.raises(errors.ssh.SSHSessionClosed):
+            session.run("echo hello")
@@ -9,14 +9,19 @@ Author:
 Date:
     12/14/20
 """
+import logging
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock, patch
 
 import paramiko
 import pytest
 
+from epython import channels
 from epython import environment
 from epython import errors
+from epython import output
 from epython import ssh
 
 
@@ -89,6 +94,36 @@ def rsa_key():
         pass
 
 
+@pytest.fixture(scope="module")
+def ed25519_key():
+    """ Fixture that generates an ed25519 key and returns the path to the file. """
+    path = "/tmp/ssh_host_ed25519_key"
+    cmd = f"ssh-keygen -t ed25519 -f {path} -N '' -q <<< y >/dev/null"
+    os.system(f"bash -c \"{cmd}\"")
+    yield path
+
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
+@pytest.fixture(scope="module")
+def pem_rsa_key():
+    """ Fixture that generates an rsa key in the legacy PEM format and returns the path to the file. """
+    path = "/tmp/ssh_host_pem_rsa_key"
+    cmd = f"ssh-keygen -t rsa -m PEM -f {path} -N '' -q <<< y >/dev/null"
+    os.system(f"bash -c \"{cmd}\"")
+    yield path
+
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception:
+        pass
+
+
 @pytest.mark.L1
 @pytest.mark.test_ssh
 def test_ssh_connect_object(rsa_key):
@@ -141,6 +176,60 @@ def test_ecdsa_ssh_key(ecdsa_key):
     assert isinstance(_ssh_conn.pkey, paramiko.ecdsakey.ECDSAKey), "The SSH key is not an ECDSA Key!"
 
 
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_key_detection(rsa_key, ecdsa_key, ed25519_key, pem_rsa_key):
+    """ Test the key type is picked from the key header without any failed parses
+
+    Steps:
+        1) Load keys of every type in both the OpenSSH and PEM formats
+        2) Validate the right paramiko key class was picked
+        3) Validate only the detected key class was used to parse the key
+    """
+
+    expected = {rsa_key: paramiko.RSAKey, ecdsa_key: paramiko.ECDSAKey,
+                ed25519_key: paramiko.Ed25519Key, pem_rsa_key: paramiko.RSAKey}
+
+    for path, key_class in expected.items():
+        assert ssh._detect_key_class(path) is key_class, f"Wrong key type detected for {path}"
+        assert isinstance(ssh.load_private_key(path), key_class)
+
+    # An ECDSA key must not pay for a failed RSA parse anymore
+    ssh._KEY_CACHE.clear()
+    with patch("paramiko.RSAKey.from_private_key_file") as mock_rsa:
+        ssh.load_private_key(ecdsa_key)
+        mock_rsa.assert_not_called()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_key_cache(ecdsa_key):
+    """ Test parsed keys are cached per path and re-read when the file changes
+
+    Steps:
+        1) Create several SSHConnect objects with the same key
+        2) Validate the key file was only parsed once
+        3) Touch the key and validate it gets parsed again
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+
+    ssh._KEY_CACHE.clear()
+    parse_ecdsa = paramiko.ECDSAKey.from_private_key_file
+    with patch("paramiko.ECDSAKey.from_private_key_file", wraps=parse_ecdsa) as mock_parse:
+        conns = [ssh.SSHConnect(host, username, password, pkey=ecdsa_key) for _ in range(10)]
+        assert mock_parse.call_count == 1
+        assert all(conn.pkey is conns[0].pkey for conn in conns)
+
+        stat = os.stat(ecdsa_key)
+        os.utime(ecdsa_key, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        ssh.SSHConnect(host, username, password, pkey=ecdsa_key)
+        assert mock_parse.call_count == 2
+        assert len(ssh._KEY_CACHE) == 1, "The stale key should have been dropped from the cache"
+
+
 @pytest.mark.L1
 @pytest.mark.test_ssh
 def test_error_connecting():
@@ -333,6 +422,14 @@ def test_ssh_running(mock_create_connection):
     # Setup Mock to test happy path
     mock_create_connection.return_value = MagicMock()
     assert ssh.ssh_running(fqdn), "Failed to create a connection!"
+    mock_create_connection.return_value.__exit__.assert_called_once()
+
+    # Setup Mock to test the banner check
+    sock = mock_create_connection.return_value.__enter__.return_value
+    sock.recv.side_effect = [b"SSH-2.0-Open", b"SSH_7.4\r\n"]
+    assert ssh.ssh_running(fqdn, check_banner=True), "Failed to read the banner!"
+    sock.recv.side_effect = [b"not ssh\r\n", b""]
+    assert not ssh.ssh_running(fqdn, check_banner=True), "Found a banner that wasn't sent!"
 
     # Setup Mock to test sad path
     mock_create_connection.side_effect = Exception("Bogus Exception")
@@ -358,6 +455,33 @@ def test_wait_for_ssh(mock_ssh_running):
         ssh.wait_for_ssh(fqdn, timeout=.1, interval=0)
 
 
+@pytest.mark.L1
+@pytest.mark.test_ssh
+@patch('epython.ssh.network.wait_for_ports_listening')
+def test_wait_for_ssh_hosts(mock_wait):
+    """ Test the fleet wait for ssh helper hands every host to the port watcher at once
+
+    Steps:
+        1) Wait on a mix of bare hosts and (host, port) pairs with the banner check
+        2) Validate the ready callback and stragglers are given back as the hosts were given
+    """
+
+    def fake_wait(targets, callback=None, **_kwargs):
+        callback(targets[0])
+        return targets[1:]
+
+    mock_wait.side_effect = fake_wait
+    ready = []
+    stragglers = ssh.wait_for_ssh_hosts(["host1", ("host2", 2222)], timeout=1, check_banner=True,
+                                        callback=ready.append)
+
+    assert ready == ["host1"]
+    assert stragglers == [("host2", 2222)]
+    targets = mock_wait.call_args[0][0]
+    assert targets == [("host1", 22), ("host2", 2222)]
+    assert mock_wait.call_args[1]["banner"] == ssh.SSH_BANNER_PREFIXES
+
+
 @pytest.mark.L1
 @pytest.mark.test_ssh
 def test_ssh_scp():
@@ -446,9 +570,545 @@ def test_remote_file_exists(ssh_zero_retry):
         # Test happy path
         mock_execute.return_value = happy_path_rc, "Bogus STDOUT", "Bogus STDERR"
         assert ssh.remote_file_exists(host, username, password, test_remote_file)
-        mock_execute.assert_called_with(host, username, password, expected_cmd, pkey=None)
+        mock_execute.assert_called_with(host, username, password, expected_cmd, port=22, pkey=None,
+                                        pooled=True, jump=None)
 
         # Test negative path
         mock_execute.return_value = negative_path_rc, "Bogus STDOUT", "Bogus STDERR"
         assert not ssh.remote_file_exists(host, username, password, test_remote_file)
-        mock_execute.assert_called_with(host, username, password, expected_cmd, pkey=None)
+        mock_execute.assert_called_with(host, username, password, expected_cmd, port=22, pkey=None,
+                                        pooled=True, jump=None)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_pool_reuse():
+    """ Test that the ssh connection pool hands back the same live connection for a key
+
+    Steps:
+        1) Acquire and release a client for a key
+        2) Validate the second acquire reuses the client without connecting again
+        3) Validate a dead client is transparently replaced with a new connection
+    """
+
+    pool = ssh.SSHConnectionPool(max_per_host=1, keepalive=0)
+    key = ("localhost", 22, "bogus_user", None)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    client = pool.acquire(key, factory)
+    pool.release(key, client)
+    assert pool.acquire(key, factory) is client
+    assert factory.call_count == 1
+
+    # Kill the transport and make sure the pool reconnects
+    pool.release(key, client)
+    client.get_transport.return_value.send_ignore.side_effect = EOFError("Bogus dead socket")
+    new_client = pool.acquire(key, factory)
+    assert new_client is not client
+    assert factory.call_count == 2
+    client.close.assert_called()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_pool_limits():
+    """ Test the per host limit, idle eviction and discarding of broken connections
+
+    Steps:
+        1) Exhaust the per host limit and validate the next acquire times out
+        2) Discard a client and validate it is closed instead of pooled
+        3) Validate idle clients are evicted after the idle timeout, and closed outside of the pool lock
+    """
+
+    pool = ssh.SSHConnectionPool(max_per_host=1, idle_timeout=0, keepalive=0, acquire_timeout=.1)
+    key = ("localhost", 22, "bogus_user", None)
+    factory = MagicMock(side_effect=lambda: MagicMock())
+
+    client = pool.acquire(key, factory)
+    with pytest.raises(errors.ssh.SSHTimeoutError):
+        pool.acquire(key, factory)
+
+    pool.release(key, client, discard=True)
+    client.close.assert_called()
+
+    client = pool.acquire(key, factory)
+    pool.release(key, client)
+    locked = []
+    client.close.side_effect = lambda: locked.append(pool._cond._is_owned())  # pylint: disable=W0212
+    pool.acquire(key, factory)
+    assert factory.call_count == 3, "The idle client should have been evicted!"
+    assert locked == [False], "The evicted client should have been closed outside of the lock!"
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_connect_pooled():
+    """ Test that SSHConnect borrows from and returns to a pool when one is provided """
+
+    pool = MagicMock()
+    conn = ssh.SSHConnect("localhost", "bogus_user", "bogus_pass", pool=pool)
+
+    with conn as client:
+        assert client is pool.acquire.return_value
+    assert pool.release.call_args[0] == (conn.pool_key, client)
+    assert pool.release.call_args[1]["discard"] is False
+
+    with pytest.raises(EOFError):
+        with conn as client:
+            raise EOFError("Bogus broken connection")
+    assert pool.release.call_args[0] == (conn.pool_key, client)
+    assert pool.release.call_args[1]["discard"] is True
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_execute_on_hosts():
+    """ Test the multi-host fan-out of execute_command
+
+    Steps:
+        1) Mock execute_command so one host fails
+        2) Validate every host has a result and the failing host didn't abort the others
+        3) Validate a per host command mapping runs the right command on each host
+    """
+
+    username = "bogus_user"
+    password = "bogus_pass"
+    hosts = [f"host{idx}" for idx in range(10)]
+
+    def fake_execute(host, _username, _password, cmd, **_kwargs):
+        if host == "host3":
+            raise errors.ssh.SSHError("Bogus connection failure")
+        return 0, f"{host}:{cmd}", ""
+
+    with patch("epython.ssh.execute_command", side_effect=fake_execute) as mock_execute:
+        results = ssh.execute_on_hosts(hosts, username, password, "uptime", max_workers=4)
+
+        assert mock_execute.call_count == len(hosts)
+        assert sorted(results) == sorted(hosts)
+        assert isinstance(results["host3"].exception, errors.ssh.SSHError)
+        assert not results["host3"].ok
+        assert results["host1"].ok
+        assert results["host1"].stdout == "host1:uptime"
+        assert results["host1"].elapsed is not None
+
+        # Run a different command per host and stream the results
+        host_cmds = {"host1": "hostname", "host2": "date"}
+        streamed = list(ssh.iter_execute_on_hosts(host_cmds, username, password))
+        assert sorted(result.stdout for result in streamed) == ["host1:hostname", "host2:date"]
+
+    with pytest.raises(errors.ssh.SSHError):
+        list(ssh.iter_execute_on_hosts(hosts, username, password))
+
+
+def _mock_channel(stdout_chunks, stderr_chunks, rc=0):
+    """ Build a mocked paramiko channel that hands out the provided chunks of output.
+
+    Args:
+        stdout_chunks (list): The bytes chunks to return from recv
+        stderr_chunks (list): The bytes chunks to return from recv_stderr
+        rc (int): The exit status of the mocked command
+
+    Returns:
+        (MagicMock): The mocked channel
+    """
+    stdout_chunks, stderr_chunks = list(stdout_chunks), list(stderr_chunks)
+
+    channel = MagicMock()
+    channel.recv_ready.side_effect = lambda: bool(stdout_chunks)
+    channel.recv_stderr_ready.side_effect = lambda: bool(stderr_chunks)
+    channel.recv.side_effect = lambda _size: stdout_chunks.pop(0)
+    channel.recv_stderr.side_effect = lambda _size: stderr_chunks.pop(0)
+    channel.exit_status_ready.return_value = True
+    channel.recv_exit_status.return_value = rc
+    channel.eof_received, channel.closed = True, False
+    # Take standard in a little at a time, like a channel with a small window
+    channel.stdin = bytearray()
+    channel.send.side_effect = lambda data: channel.stdin.extend(data[:7]) or len(data[:7])
+    # Let tests hand out more output later on
+    channel.stdout_chunks, channel.stderr_chunks = stdout_chunks, stderr_chunks
+    return channel
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_stream_command():
+    """ Test that streamed output is split into tagged lines followed by the return code
+
+    Steps:
+        1) Mock a channel that splits lines and a multi-byte character across chunks
+        2) Validate the lines are reassembled, tagged by stream and followed by the RC
+        3) Validate the callback flavor hands out the same lines and returns the RC
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+    snowman = "\u2603".encode()
+
+    def new_channel():
+        return _mock_channel([b"first li", b"ne\r\nsecond " + snowman[:1], snowman[1:] + b"\nlast"],
+                             [b"oops\n"], rc=3)
+
+    expected = [(ssh.STREAM_STDERR, "oops"), (ssh.STREAM_STDOUT, "first line"),
+                (ssh.STREAM_STDOUT, "second \u2603"), (ssh.STREAM_STDOUT, "last")]
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh:
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+
+        transport.open_session.return_value = new_channel()
+        output = list(ssh.stream_command(host, username, password, "dmesg"))
+        assert output == expected + [(ssh.STREAM_RC, 3)]
+        transport.open_session.return_value.close.assert_called()
+
+        transport.open_session.return_value = new_channel()
+        lines = []
+        rc = ssh.execute_command_streaming(host, username, password, "dmesg",
+                                           lambda stream, line: lines.append((stream, line)))
+        assert rc == 3
+        assert lines == expected
+
+        transport.open_session.return_value = _mock_channel([b"\xff\n"], [])
+        with pytest.raises(errors.ssh.SSHStreamDecodeError):
+            list(ssh.stream_command(host, username, password, "cat /dev/urandom"))
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_stream_command_late_output():
+    """ Test output that arrives after the exit status is still read, up until the EOF
+
+    Steps:
+        1) Mock a channel whose exit status is ready before the rest of its output and its EOF arrive
+        2) Validate every line was read before the RC
+    """
+
+    late = [b"late li", b"ne\n"]
+    channel = _mock_channel([b"early\n"], [], rc=0)
+    channel.eof_received = False
+
+    def output_arrives(_channel, timeout=1.0):
+        if late:
+            channel.stdout_chunks.append(late.pop(0))
+        else:
+            channel.eof_received = True
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh, \
+            patch("epython.channels.wait_for_channel", side_effect=output_arrives):
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+        transport.open_session.return_value = channel
+
+        output = list(ssh.stream_command("localhost", "bogus_user", "bogus_pass", "dmesg"))
+        assert output == [(ssh.STREAM_STDOUT, "early"), (ssh.STREAM_STDOUT, "late line"),
+                          (ssh.STREAM_RC, 0)]
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_execute_commands():
+    """ Test that a batch of commands runs over one connection and keeps submission order
+
+    Steps:
+        1) Mock a transport that hands out a channel per command, turning one channel down once
+        2) Validate a single connection was opened for the whole batch, and only the one channel retried
+        3) Validate the results come back in the order the commands were given
+        4) Validate a failing command is reported in its result without re-running the others
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+    cmds = [f"echo {idx}" for idx in range(20)]
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh:
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+
+        def open_session():
+            channel = MagicMock()
+
+            # Give each channel the output of the command that gets executed on it
+            def exec_command(cmd):
+                if cmd == "broken":
+                    raise paramiko.SSHException("Channel closed")
+                idx = int(cmd.split()[-1])
+                output = _mock_channel([f"{idx}\n".encode()], [b"warn"] if idx % 2 else [], rc=idx % 3)
+                channel.recv_ready.side_effect = output.recv_ready
+                channel.recv_stderr_ready.side_effect = output.recv_stderr_ready
+                channel.recv.side_effect = output.recv
+                channel.recv_stderr.side_effect = output.recv_stderr
+                channel.recv_exit_status.return_value = idx % 3
+
+            channel.exec_command.side_effect = exec_command
+            return channel
+
+        # The server turns one channel down, as it would past its MaxSessions
+        refusals = [paramiko.ChannelException(1, "Administratively prohibited")]
+
+        def open_session_or_refuse():
+            if refusals:
+                raise refusals.pop()
+            return open_session()
+
+        transport.open_session.side_effect = open_session_or_refuse
+
+        with patch("epython.handlers.time.sleep"):
+            results = ssh.execute_commands(host, username, password, cmds, max_channels=4)
+
+        assert mock_ssh.call_count == 1
+        assert transport.open_session.call_count == len(cmds) + 1
+        assert [(result.cmd, result.rc, result.stdout, result.stderr) for result in results] == \
+            [(cmd, idx % 3, str(idx), "warn" if idx % 2 else "") for idx, cmd in enumerate(cmds)]
+        assert all(result.exception is None for result in results)
+        assert ssh.execute_commands(host, username, password, []) == []
+
+        results = ssh.execute_commands(host, username, password, ["echo 1", "broken", "echo 2"])
+        assert mock_ssh.call_count == 2, "A failing command must not re-run the batch"
+        assert isinstance(results[1].exception, paramiko.SSHException)
+        assert not results[1].ok
+        assert [result.stdout for result in results] == ["1", None, "2"]
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_remote_files_stat():
+    """ Test many paths are checked in one round trip without any shell quoting
+
+    Steps:
+        1) Mock a channel that returns stat records for two of three paths
+        2) Validate the paths were sent NUL delimited on standard in
+        3) Validate existing and missing paths are reported correctly
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+    paths = ["/var/log/messages", "/tmp/it's a \"dir\"", "/does/not/exist"]
+
+    channel = _mock_channel([b"/var/log/messages\x0012\x001700000000\x00regular file\x00",
+                             b"/tmp/it's a \"dir\"\x004096\x001700000001\x00directory\x00"], [])
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh:
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+        transport.open_session.return_value = channel
+
+        results = ssh.remote_files_stat(host, username, password, paths)
+
+        assert mock_ssh.call_count == 1
+        assert channel.stdin == "\0".join(paths).encode() + b"\0"
+        channel.shutdown_write.assert_called_once()
+        assert results == {
+            "/var/log/messages": {"exists": True, "size": 12, "mtime": 1700000000, "type": "file"},
+            "/tmp/it's a \"dir\"": {"exists": True, "size": 4096, "mtime": 1700000001,
+                                     "type": "directory"},
+            "/does/not/exist": {"exists": False, "size": None, "mtime": None, "type": None},
+        }
+        assert ssh.remote_files_stat(host, username, password, []) == {}
+
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_collect_channel_large_stdin(local_session):
+    """ Test standard in much bigger than the channel can buffer is fed while the output is drained
+
+    Args:
+        local_session (func): Fixture that provides channels whose commands run locally
+
+    Steps:
+        1) Feed a few megabytes to a command that echoes them back as it reads them
+        2) Validate it all came back, instead of both ends waiting on each other
+    """
+
+    transport = MagicMock()
+    transport.open_session.side_effect = local_session
+    data = os.urandom(4 * 1024 * 1024)
+
+    ret_code, stdout, stderr = channels.collect_channel(transport, "cat; echo done >&2", data)
+
+    assert (ret_code, stdout, stderr) == (0, data, b"done\n")
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_execute_command_capture_limit(caplog):
+    """ Test that captured output spills to disk past the limit and only a preview is logged
+
+    Steps:
+        1) Mock a channel whose stdout is bigger than the capture limit
+        2) Validate stdout spilled to disk and stderr stayed in memory
+        3) Validate the output can be read, iterated and memory mapped
+        4) Validate the log message only carries a truncated preview
+        5) Validate a limit of 0 (or less) writes straight to disk
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+    chunks = [f"line {idx}\n".encode() * 1000 for idx in range(10)]
+    full_output = b"".join(chunks)
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh:
+        transport = mock_ssh.return_value.__enter__.return_value.get_transport.return_value
+        transport.open_session.return_value = _mock_channel(chunks, [b"warn\n"], rc=1)
+
+        with caplog.at_level(logging.DEBUG, logger="epython"):
+            result = ssh.execute_command(host, username, password, "chatty", capture_limit=1024)
+            rc, stdout, stderr = result
+
+    with stdout, stderr:
+        assert rc == 1
+        assert len(stdout) == len(full_output)
+        assert stdout.spilled and not stderr.spilled
+        assert stdout.read() == full_output
+        assert stderr.text() == "warn"
+        assert isinstance(result, output.CommandResult) and result.captured
+        assert result.stdout is stdout and result.text("stderr") == "warn"
+        assert list(result.lines("stderr")) == ["warn"]
+        assert list(stdout)[-1] == b"line 9\n"
+
+        mapped = stdout.mmap()
+        assert mapped.find(b"line 9") == full_output.find(b"line 9")
+        mapped.close()
+
+    log_text = "".join(record.getMessage() for record in caplog.records)
+    assert "more bytes]" in log_text
+    assert len(log_text) < len(full_output)
+
+    # Without any memory to spare the output lands on disk right away, instead of spooling forever
+    for max_memory in (0, -1):
+        with output.CapturedOutput(max_memory) as captured:
+            captured.write(b"spilled")
+            assert captured.spilled
+            assert not isinstance(captured._file, tempfile.SpooledTemporaryFile)  # pylint: disable=W0212
+            mapped = captured.mmap()
+            assert mapped[:] == b"spilled"
+            mapped.close()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_execute_command_result():
+    """ Test execute_command hands back raw output that is only decoded when it's used
+
+    Steps:
+        1) Run a command whose stdout isn't valid UTF-8
+        2) Validate the raw bytes and return code are available without decoding
+        3) Validate decoding with a lenient policy, line iteration and check()
+        4) Validate the result still unpacks and compares like the old tuple
+    """
+
+    host = "localhost"
+    username = "bogus_user"
+    password = "bogus_pass"
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh:
+        stdout, stderr = MagicMock(), MagicMock()
+        stdout.channel.recv_exit_status.return_value = 2
+        stdout.read.return_value = b"first\n\xff second\n"
+        stderr.read.return_value = b" oops \n"
+        mock_ssh.return_value.__enter__.return_value.exec_command.return_value = [None, stdout, stderr]
+
+        result = ssh.execute_command(host, username, password, "bogus_cmd")
+
+    assert (result.rc, result.raw_stdout, result.ok) == (2, b"first\n\xff second\n", False)
+    with pytest.raises(errors.ssh.SSHStreamDecodeError):
+        _rc, _stdout, _stderr = result
+    with pytest.raises(errors.ssh.SSHStreamDecodeError):
+        list(result.lines())
+
+    assert result.text(decode_errors="replace") == "first\n� second"
+    assert result.text("stdout", encoding="latin-1").endswith("\xff second")
+    assert result.stderr == "oops"
+
+    with pytest.raises(errors.ssh.SSHCommandError) as exp:
+        result.check()
+    assert exp.value.result is result and "oops" in str(exp.value)
+
+    result = output.CommandResult(0, b"a\r\nb\n", b"", encoding="utf-8", decode_errors="replace")
+    assert list(result.lines()) == ["a", "b"]
+    assert list(result.lines(keepends=True)) == ["a\r\n", "b\n"]
+    assert result.check() is result
+    assert result == (0, "a\r\nb", "") and result[1] == "a\r\nb" and len(result) == 3
+    rc, out, err = result
+    assert (rc, out, err) == (0, "a\r\nb", "")
+    assert hash(result) == hash((0, "a\r\nb", "")) and result in {(0, "a\r\nb", "")}
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_jump_chain():
+    """ Test the supported ways of giving jump hosts all become a chain of JumpHosts """
+
+    assert ssh.jump_chain(None) == ()
+
+    chain = ssh.jump_chain("ops@bastion:2222, lab@inner")
+    assert [hop.key for hop in chain] == [("bastion", 2222, "ops", None), ("inner", 22, "lab", None)]
+
+    hop = ssh.JumpHost("bastion", "ops", password="secret")
+    assert ssh.jump_chain(hop) == (hop,)
+    assert ssh.jump_chain([hop, "lab@inner"])[0] is hop
+
+    with pytest.raises(errors.ssh.SSHError):
+        ssh.jump_chain("bastion")
+
+    direct = ssh.SSHConnect("target", "user", "pass")
+    tunneled = ssh.SSHConnect("target", "user", "pass", jump=hop)
+    assert direct.pool_key != tunneled.pool_key, "Different routes must not share pooled connections"
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_jump_host_connections():
+    """ Test targets are tunneled through one shared connection per jump host
+
+    Steps:
+        1) Connect to many targets at once through a chain of two jump hosts
+        2) Validate each jump host was only logged into once
+        3) Validate every target connected over a direct-tcpip channel from the last jump host
+        4) Validate a jump host that can't reach the target raises an SSHError
+    """
+
+    clients = []
+
+    def new_client():
+        client = MagicMock()
+        # Built up front, a mock creates its return_value lazily and that isn't thread safe
+        client.get_transport.return_value.open_channel.return_value = MagicMock()
+        clients.append(client)
+        return client
+
+    bastions = ssh.SSHBastions(keepalive=0)
+    with patch("epython.ssh.paramiko.SSHClient", side_effect=new_client), \
+            patch("epython.ssh.SSH_BASTIONS", bastions):
+        jump = "ops@outer,ops@inner:2222"
+        targets = [f"target{idx}" for idx in range(20)]
+        with ThreadPoolExecutor(max_workers=10) as executor:
+            futures = [executor.submit(ssh.SSHConnect(host, "user", "pass", jump=jump).connect)
+                       for host in targets]
+        for future in futures:
+            future.result()
+
+        hosts = [client.connect.call_args[0][0] for client in clients]
+        assert hosts.count("outer") == 1
+        assert hosts.count("inner") == 1
+        assert sorted(host for host in hosts if host.startswith("target")) == sorted(targets)
+
+        outer, inner = (clients[hosts.index(name)] for name in ("outer", "inner"))
+        assert outer.connect.call_args[1]["sock"] is None
+        outer_transport = outer.get_transport.return_value
+        assert inner.connect.call_args[1]["sock"] is outer_transport.open_channel.return_value
+        outer_transport.open_channel.assert_called_once_with("direct-tcpip", ("inner", 2222),
+                                                             ("127.0.0.1", 0))
+
+        inner_transport = inner.get_transport.return_value
+        # Every thread is joined by now, call_args_list (unlike call_count) is appended to atomically
+        tunneled = [call[0][1][0] for call in inner_transport.open_channel.call_args_list]
+        assert sorted(tunneled) == sorted(targets)
+        for client in clients:
+            if client not in (outer, inner):
+                assert client.connect.call_args[1]["sock"] is inner_transport.open_channel.return_value
+
+        inner_transport.open_channel.side_effect = paramiko.ChannelException(2, "Connect failed")
+        with pytest.raises(errors.ssh.SSHError, match="failed to reach"):
+            ssh.SSHConnect("unreachable", "user", "pass", jump=jump).connect()
+
+        bastions.close_all()
+        outer.close.assert_called()
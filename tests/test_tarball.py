@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module is used for testing the streaming tarball transfers
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from epython import errors
+from epython import ssh
+from epython import tarball
+
+
+@pytest.fixture(scope="function")
+def fake_client(local_session):
+    """ Fixture that provides a mocked ssh client whose channels run commands locally. """
+    client = MagicMock()
+    client.get_transport.return_value.open_session.side_effect = local_session
+    return client
+
+
+@pytest.fixture(scope="function")
+def sh_client(local_session):
+    """ Fixture that provides a mocked ssh client whose channels run commands locally with a plain sh. """
+    client = MagicMock()
+    client.get_transport.return_value.open_session.side_effect = lambda: local_session("sh")
+    return client
+
+
+@pytest.fixture(scope="function")
+def remote_tree(tmp_path):
+    """ Fixture that provides a directory tree of small log files to download """
+    remote = tmp_path / "remote"
+    for path, content in {"app.log": "app", "app.log.1": "old", "debug/trace.log": "trace" * 1000,
+                          "debug/core.dump": "core", "it's odd/a b.log": "odd"}.items():
+        (remote / path).parent.mkdir(parents=True, exist_ok=True)
+        (remote / path).write_text(content)
+    os.symlink("app.log", str(remote / "latest.log"))
+    return remote
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_download_dir(fake_client, remote_tree, tmp_path, compression):
+    """ Test a remote tree is streamed and unpacked, with and without compression
+
+    Steps:
+        1) Download the whole tree and validate the files and symlinks
+        2) Download with include and exclude globs and validate only the matching files came over
+    """
+
+    local = tmp_path / "local"
+    files = tarball.download_dir(fake_client, str(remote_tree), str(local), compression=compression)
+
+    assert sorted(files) == ["app.log", "app.log.1", "debug/core.dump", "debug/trace.log", "it's odd/a b.log",
+                             "latest.log"]
+    assert (local / "debug" / "trace.log").read_text() == "trace" * 1000
+    assert os.readlink(str(local / "latest.log")) == "app.log"
+
+    local = tmp_path / "filtered"
+    files = tarball.download_dir(fake_client, str(remote_tree), str(local), compression=compression,
+                                 include=["*.log", "debug/*"], exclude="latest*")
+    assert sorted(files) == ["app.log", "debug/core.dump", "debug/trace.log", "it's odd/a b.log"]
+    assert not (local / "app.log.1").exists()
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_download_dir_posix_sh(sh_client, remote_tree, tmp_path):
+    """ Test a tree is streamed down when the remote login shell has no pipefail (e.g. dash) """
+
+    files = tarball.download_dir(sh_client, str(remote_tree), str(tmp_path / "local"))
+    assert "debug/trace.log" in files
+    assert (tmp_path / "local" / "debug" / "trace.log").read_text() == "trace" * 1000
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_download_dir_errors(fake_client, tmp_path):
+    """ Test remote failures and bad options are reported
+
+    Steps:
+        1) Validate a missing remote directory raises with the remote error
+        2) Validate an unknown compression is refused
+        3) Validate zstd is refused when the zstandard package is missing
+    """
+
+    with pytest.raises(errors.ssh.SSHError, match="rc: 1"):
+        tarball.download_dir(fake_client, str(tmp_path / "missing"), str(tmp_path / "local"))
+
+    with pytest.raises(errors.ssh.SSHError):
+        tarball.download_dir(fake_client, str(tmp_path), str(tmp_path / "local"), compression="rar")
+
+    with patch("epython.tarball.zstandard", None), pytest.raises(errors.ssh.SSHError, match="zstandard"):
+        tarball.download_dir(fake_client, str(tmp_path), str(tmp_path / "local"), compression="zstd")
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_download_dir_zstd(fake_client, remote_tree, tmp_path):
+    """ Test a tree is streamed both ways with zstd compression """
+
+    pytest.importorskip("zstandard")
+    local = tmp_path / "local"
+    files = tarball.download_dir(fake_client, str(remote_tree), str(local), compression="zstd")
+    assert "debug/trace.log" in files
+    assert (local / "debug" / "trace.log").read_text() == "trace" * 1000
+
+    files = tarball.upload_dir(fake_client, str(local), str(tmp_path / "uploaded"), compression="zstd")
+    assert "debug/trace.log" in files
+    assert (tmp_path / "uploaded" / "debug" / "trace.log").read_text() == "trace" * 1000
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_upload_dir(fake_client, remote_tree, tmp_path, compression):
+    """ Test a local tree is streamed into a remote tar, keeping modes and symlinks
+
+    Steps:
+        1) Upload the whole tree and validate the files, modes and symlinks
+        2) Upload with include and exclude globs and validate only the matching files went over
+        3) Validate the remote file count check catches files that didn't make it
+    """
+
+    local = remote_tree
+    os.chmod(str(local / "app.log"), 0o750)
+
+    remote = tmp_path / "uploaded"
+    files = tarball.upload_dir(fake_client, str(local), str(remote).encode(), compression=compression)
+
+    assert sorted(files) == ["app.log", "app.log.1", "debug/core.dump", "debug/trace.log", "it's odd/a b.log",
+                             "latest.log"]
+    assert (remote / "debug" / "trace.log").read_text() == "trace" * 1000
+    assert os.stat(str(remote / "app.log")).st_mode & 0o777 == 0o750
+    assert os.readlink(str(remote / "latest.log")) == "app.log"
+
+    remote = tmp_path / "filtered"
+    files = tarball.upload_dir(fake_client, str(local), str(remote), compression=compression,
+                               include=["*.log", "debug/*"], exclude="latest*")
+    assert sorted(files) == ["app.log", "debug/core.dump", "debug/trace.log", "it's odd/a b.log"]
+    assert sorted(os.listdir(str(remote))) == ["app.log", "debug", "it's odd"]
+
+    with patch("epython.tarball._count_remote_files", return_value=3):
+        with pytest.raises(errors.ssh.SSHError, match="Only 3 of the 4 files"):
+            tarball.upload_dir(fake_client, str(local), str(remote), compression=compression,
+                               include=["*.log", "debug/*"], exclude="latest*")
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_upload_dir_posix_sh(sh_client, remote_tree, tmp_path):
+    """ Test a tree is streamed up when the remote login shell has no pipefail (e.g. dash) """
+
+    files = tarball.upload_dir(sh_client, str(remote_tree), str(tmp_path / "uploaded"))
+    assert "debug/trace.log" in files
+    assert (tmp_path / "uploaded" / "debug" / "trace.log").read_text() == "trace" * 1000
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_upload_dir_remote_failure(fake_client, tmp_path):
+    """ Test a remote side that can't unpack the stream is reported """
+
+    (tmp_path / "file").write_text("I'm in the way")
+    with pytest.raises(errors.ssh.SSHError, match="rc: 1"):
+        tarball.upload_dir(fake_client, str(tmp_path / "file"), str(tmp_path / "file" / "sub"))
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_tarball_stderr_flood(fake_client, remote_tree, tmp_path):
+    """ Test a remote side writing lots of warnings doesn't stall either stream
+
+    Steps:
+        1) Write far more to standard error than a pipe holds ahead of every remote command
+        2) Validate a tree still streams down and back up
+    """
+
+    flood = "yes 'tar: warning' | head -c 1000000 >&2; "
+    with patch("epython.tarball.PIPEFAIL_PREFIX", flood + tarball.PIPEFAIL_PREFIX):
+        files = tarball.download_dir(fake_client, str(remote_tree), str(tmp_path / "local"))
+        assert "it's odd/a b.log" in files
+        files = tarball.upload_dir(fake_client, str(tmp_path / "local"), str(tmp_path / "uploaded"))
+        assert "it's odd/a b.log" in files
+    assert (tmp_path / "uploaded" / "debug" / "trace.log").read_text() == "trace" * 1000
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_get_put_tar_mode():
+    """ Test ssh.get and ssh.put hand off to the tarball transfers when asked to """
+
+    with patch("epython.ssh.SSHConnect") as mock_ssh, \
+            patch("epython.ssh.tarball.download_dir", return_value=["a.log"]) as mock_download, \
+            patch("epython.ssh.tarball.upload_dir", return_value=["b.log"]) as mock_upload:
+        client = mock_ssh.return_value.__enter__.return_value
+
+        assert ssh.get("localhost", "bogus_user", "bogus_pass", "/var/log", "logs", mode="tar",
+                       include=["*.log"]) == ["a.log"]
+        mock_download.assert_called_with(client, "/var/log", "logs", include=["*.log"])
+
+        assert ssh.put("localhost", "bogus_user", "bogus_pass", "fixtures", "/tmp", mode="tar",
+                       compression=None) == ["b.log"]
+        mock_upload.assert_called_with(client, "fixtures", "/tmp", compression=None)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Description:
+    This module is used for testing the ssh timing breakdowns
+
+Author:
+    Ray Gomez
+
+Date:
+    10/17/26
+"""
+import socket
+import time
+from unittest.mock import MagicMock, patch
+
+import paramiko
+import pytest
+
+from epython import ssh
+from epython import timing
+
+
+@pytest.fixture(scope="function")
+def sink():
+    """ Fixture that registers a sink collecting every finished breakdown """
+    collected = []
+    timing.add_sink(collected.append)
+    yield collected
+    timing.remove_sink(collected.append)
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_ssh_timings():
+    """ Test phases add up, exclusive phases leave out nested ones and disabled timings record nothing
+
+    Steps:
+        1) Time a phase with another one nested in it, exclusively
+        2) Validate the bytes and the plain data form
+        3) Validate nothing is measured when no sink is registered
+    """
+
+    timings = timing.SSHTimings("bogus_host", "bogus_op")
+    with timings.phase("outer", exclusive=True):
+        with timings.phase("inner"):
+            time.sleep(.05)
+    timings.add("inner", 1)
+
+    assert timings.phases["inner"] > 1.05
+    assert timings.phases["outer"] < .05, "The nested phase shouldn't be counted twice"
+
+    timings.add_bytes(10)
+    timings.add_bytes(5)
+    data = timings.as_dict()
+    assert data["bytes_transferred"] == 15
+    assert data["total"] == pytest.approx(sum(data["phases"].values()))
+    assert "bogus_op on bogus_host" in repr(timings)
+
+    assert timing.start("bogus_host", "bogus_op") is timing.NO_TIMINGS
+    with timing.NO_TIMINGS.phase("bogus"):
+        timing.NO_TIMINGS.add_bytes(10)
+    assert not timing.NO_TIMINGS.phases
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_timing_sinks(sink):
+    """ Test finished breakdowns reach the sinks, and a broken sink doesn't break the operation """
+
+    broken = MagicMock(side_effect=ValueError("Bogus sink failure"))
+    timing.add_sink(broken)
+    try:
+        timings = timing.start("bogus_host", "bogus_op")
+        assert timings.enabled and timings.operation == "bogus_op"
+        timing.finish(timings)
+    finally:
+        timing.remove_sink(broken)
+
+    assert sink == [timings]
+    assert broken.call_count == 1
+
+    # The caller's own breakdown is filled in, and nothing is handed on when it is disabled
+    mine = timing.SSHTimings()
+    assert timing.start("bogus_host", "bogus_op", mine) is mine
+    timing.finish(timing.NO_TIMINGS)
+    assert sink == [timings]
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_key_exchange_timing():
+    """ Test the transport handed to paramiko times the key exchange """
+
+    timings = timing.SSHTimings()
+    left, right = socket.socketpair()
+    try:
+        with patch("paramiko.Transport.start_client", side_effect=lambda **_: time.sleep(.05)):
+            transport = timings.transport_factory(left)
+            assert isinstance(transport, paramiko.Transport)
+            transport.start_client(timeout=1)
+    finally:
+        left.close()
+        right.close()
+
+    assert timings.phases["key_exchange"] >= .05
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_execute_command_timing(sink):
+    """ Test execute_command records every phase of a fresh connection
+
+    Steps:
+        1) Run a command against a listening local port with a mocked paramiko client
+        2) Validate the connection was resolved and connected by us with a timed transport
+        3) Validate every phase was recorded and handed to the sink
+    """
+
+    # Connects land in the backlog, which is all that's needed
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    port = server.getsockname()[1]
+
+    with patch("epython.ssh.paramiko.SSHClient") as mock_client:
+        client = mock_client.return_value
+        client.connect.side_effect = lambda *args, **kwargs: time.sleep(.05)
+        stdout = MagicMock()
+        stdout.channel.recv_exit_status.return_value = 0
+        stdout.read.return_value = b"bogus_output"
+        client.exec_command.return_value = (MagicMock(), stdout, MagicMock(**{"read.return_value": b""}))
+
+        try:
+            ret = ssh.execute_command("127.0.0.1", "bogus_user", "bogus_pass", "bogus_cmd", port=port,
+                                      pooled=False)
+        finally:
+            server.close()
+            client.connect.call_args[1]["sock"].close()
+
+    assert ret == (0, "bogus_output", "")
+    connect_kwargs = client.connect.call_args[1]
+    assert connect_kwargs["sock"].family == socket.AF_INET
+    assert connect_kwargs["transport_factory"].__self__ is sink[0]
+
+    timings = sink[0]
+    assert (timings.host, timings.operation) == ("127.0.0.1", "execute_command")
+    assert set(timings.phases) == {"dns", "tcp_connect", "authentication", "channel_open", "command",
+                                   "output_drain", "close"}
+    assert timings.phases["authentication"] >= .05
+    assert timings.bytes_transferred is None
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_key_exchange_timing_unsupported():
+    """ Test connects still work with a paramiko too old to take a transport_factory """
+
+    # Takes the same arguments as the connect of paramiko < 3.2 that SSHConnect passes
+    def old_connect(hostname, port=22, username=None, password=None, pkey=None, sock=None):
+        return hostname, port, username, password, pkey, sock
+
+    timings = timing.SSHTimings()
+    with patch("epython.ssh._TIMED_KEY_EXCHANGE", False), \
+            patch("epython.ssh.paramiko.SSHClient") as mock_client:
+        mock_client.return_value.connect.side_effect = old_connect
+        conn = ssh.SSHConnect("bogus_host", "bogus_user", "bogus_pass", timings=timings)
+        conn.connect(sock=MagicMock())
+
+    assert mock_client.return_value.connect.called
+    assert "authentication" in timings.phases and "key_exchange" not in timings.phases
+
+
+@pytest.mark.L1
+@pytest.mark.test_ssh
+def test_transfer_timing(tmp_path):
+    """ Test the scp transfers count the bytes they move into a caller's breakdown """
+
+    local_file = tmp_path / "bogus_file"
+    local_file.write_bytes(b"x" * 1000)
+
+    with patch("epython.ssh.SSHConnect"), patch("epython.ssh.SCPClient") as mock_scp:
+        def fake_put(*_):
+            progress = mock_scp.call_args[1]["progress"]
+            for sent in (0, 600, 1000):
+                progress(b"bogus_file", 1000, sent)
+        mock_scp.return_value.__enter__.return_value.put.side_effect = fake_put
+
+        timings = timing.SSHTimings()
+        ssh.put("bogus_host", "bogus_user", "bogus_pass", str(local_file), "remote_path", timings=timings)
+        assert (timings.operation, timings.bytes_transferred) == ("put", 1000)
+        assert "transfer" in timings.phases
+
+        # Nothing is measured (or reported to scp) unless asked for
+        mock_scp.return_value.__enter__.return_value.put.side_effect = None
+        ssh.put("bogus_host", "bogus_user", "bogus_pass", str(local_file), "remote_path")
+        assert mock_scp.call_args[1]["progress"] is None